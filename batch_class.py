@@ -0,0 +1,162 @@
+"""Module for running many report jobs against one loaded dataset."""
+
+import csv
+import json
+
+from except_class import InputError
+from report_class import AnalysisReport
+
+try:
+    import yaml  # Optional: only needed for YAML job files
+except ImportError:
+    yaml = None
+
+# Fields of a job and their default values ('genes', 'threshold' and 'number' are required)
+JOB_DEFAULTS = {"output": "screen", "format": "text"}
+
+
+def read_jobs(path):
+    """
+    Read a job file and returns its list of job specifications.
+
+    A JSON file holds a list of objects (or {"jobs": [...]}), a YAML file
+    the same structure and a CSV file one job per row with a header naming
+    the fields. Every job has 'genes' (a list or a comma-separated string),
+    'threshold' and 'number', and optionally 'output' (a file path, default
+    'screen') and 'format' ('text', 'tsv' or 'jsonl').
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as job_file:
+            if path.endswith('.csv'):
+                jobs = list(csv.DictReader(job_file))
+            elif path.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise InputError("YAML job files need the PyYAML package")
+                jobs = yaml.safe_load(job_file)
+            else:
+                jobs = json.load(job_file)
+    except FileNotFoundError:
+        raise InputError(f"Job file {path} not found")
+    except ValueError as error:
+        raise InputError(f"Job file {path} is not valid: {error}") from error
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs")
+    if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+        raise InputError(f"Job file {path} must hold a list of jobs")
+    return jobs
+
+
+def parse_job(spec, number, gene_index):
+    """Validate one job specification and returns it with typed values and defaults."""
+    missing = [field for field in ("genes", "threshold", "number") if field not in spec]
+    if missing:
+        raise InputError(f"Job {number} misses {', '.join(missing)}")
+    genes = spec["genes"]
+    if isinstance(genes, str):
+        genes = genes.split(',')
+    genes = [str(name).strip() for name in genes if str(name).strip()]
+    try:
+        threshold = float(spec["threshold"])
+        top_number = int(spec["number"])
+    except (TypeError, ValueError) as error:
+        raise InputError(f"Job {number}: {error}") from error
+    job = {**JOB_DEFAULTS, **{key: value for key, value in spec.items() if value}}
+    job.update(genes=genes, threshold=threshold, number=top_number)
+
+    # Same checks as the command line
+    if not genes:
+        raise InputError(f"Job {number}: no gene names provided")
+    if threshold < 0:
+        raise InputError(f"Job {number}: threshold must be non-negative")
+    if top_number <= 0:
+        raise InputError(f"Job {number}: number must be positive")
+    if job["format"] not in ('text', 'tsv', 'jsonl'):
+        raise InputError(f"Job {number}: format must be 'text', 'tsv' or 'jsonl'")
+    unknown = [name for name in genes if name not in gene_index]
+    if unknown:
+        raise InputError(f"Job {number}: gene {unknown[0]} not found")
+    return job
+
+
+def select_genes(data_dict, genes):
+    """Return the title entry of a result dictionary followed by the entries of genes."""
+    items = iter(data_dict.items())
+    title = next(items)
+    return dict([title] + [(gene_name, data_dict[gene_name]) for gene_name in genes])
+
+
+class BatchRunner:
+    """
+    Run a list of report jobs against one StatisticalAnalysis.
+
+    Before any report is written, the jobs are planned together: every
+    per-gene statistic is computed once for the union of the requested
+    genes, the top differential genes once for the largest 'number' (a
+    smaller top-N is its prefix), the threshold query once per distinct
+    threshold and the sample lists and minima/maxima once. Each job then
+    writes its full report from these shared results, so the cost grows
+    with the number of distinct computations and not with the number of jobs.
+    """
+
+    def __init__(self, statistical_analysis):
+        """Initialize with the analysis object of the loaded dataset."""
+        self.statistical_analysis = statistical_analysis
+        self.expression_obj = statistical_analysis.expression_obj
+
+    def plan(self, jobs):
+        """Return the distinct genes, top-N size and thresholds needed by the jobs."""
+        genes = list(dict.fromkeys(name for job in jobs for name in job["genes"]))
+        thresholds = list(dict.fromkeys(job["threshold"] for job in jobs))
+        return genes, max(job["number"] for job in jobs), thresholds
+
+    def compute(self, jobs):
+        """Compute every statistic needed by the jobs once and returns them in a dictionary."""
+        analysis = self.statistical_analysis
+        expression_obj = self.expression_obj
+        genes, top_number, thresholds = self.plan(jobs)
+        list_gene_name = expression_obj.return_list_gene_name(expression_obj.dict_gene_hcc)
+        dict_var, dict_std_dev = analysis.calculate_standard_deviation_variance(genes)
+        dict_min_sample, dict_max_sample = analysis.sample_min_max()
+        return {
+            "samples": expression_obj.return_list_sample(expression_obj.dict_sample),
+            "genes": list_gene_name,
+            "mean": analysis.calculate_mean(genes),
+            "median": analysis.calculate_median(genes),
+            "variance": dict_var,
+            "std": dict_std_dev,
+            "differential": analysis.calculate_differential(genes),
+            "top": analysis.compare_differential_numbers(list_gene_name, top_number),
+            "threshold": {threshold: analysis.get_high_threshold(threshold)
+                          for threshold in thresholds},
+            "min": dict_min_sample,
+            "max": dict_max_sample,
+        }
+
+    def job_sections(self, job, results):
+        """Return the data of the report sections of one job, taken from the shared results."""
+        top = results["top"]
+        return [
+            results["samples"],
+            results["genes"],
+            select_genes(results["mean"], job["genes"]),
+            select_genes(results["median"], job["genes"]),
+            select_genes(results["variance"], job["genes"]),
+            select_genes(results["std"], job["genes"]),
+            select_genes(results["differential"], job["genes"]),
+            dict(list(top.items())[:job["number"] + 1]),
+            results["threshold"][job["threshold"]],
+            results["min"],
+            results["max"],
+        ]
+
+    def run(self, job_specs):
+        """Validate the jobs, compute the shared statistics and write one report per job."""
+        gene_index = self.expression_obj.gene_index
+        jobs = [parse_job(spec, number, gene_index)
+                for number, spec in enumerate(job_specs, start=1)]
+        if not jobs:
+            return
+        results = self.compute(jobs)
+        for job in jobs:
+            with AnalysisReport(destination=job["output"], output_format=job["format"]) as report:
+                report.generate_sections(self.job_sections(job, results))
@@ -0,0 +1,272 @@
+"""Module for benchmarking the analysis pipeline on synthetic expression data."""
+
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from cache_class import BinaryCache
+from except_class import InputError
+from expression_class import GeneExpressionData
+from final_main import split_options
+from report_class import AnalysisReport
+from statistical_class import StatisticalAnalysis
+
+# Data set sizes (genes, samples); 'medium' is the size of the liver cancer data
+SIZES = {
+    "small": (1000, 100),
+    "medium": (22277, 357),
+    "large": (50000, 10000),
+}
+
+
+def write_synthetic_csv(path, n_genes, n_samples, hcc_fraction=0.5, other_fraction=0.0,
+                        seed=0):
+    """
+    Write a deterministic expression CSV in the 'sample,type,gene...' layout
+    and returns its path.
+
+    hcc_fraction of the samples are 'HCC', other_fraction have the type
+    'other' and the rest are 'normal', in a shuffled order. Values are
+    log-scale expressions around a per-gene base level; one gene in ten is
+    shifted up or down in HCC so differential rankings are not flat. The
+    same arguments always give the same file.
+    """
+    if not 0 <= hcc_fraction <= 1 or not 0 <= other_fraction <= 1 - hcc_fraction:
+        raise ValueError("Sample type fractions must lie between 0 and 1 and sum to at most 1")
+    rng = random.Random(seed)
+    n_hcc = round(n_samples * hcc_fraction)
+    n_other = round(n_samples * other_fraction)
+    sample_types = ['HCC'] * n_hcc + ['other'] * n_other + ['normal'] * (
+        n_samples - n_hcc - n_other)
+    rng.shuffle(sample_types)
+    base = [rng.uniform(3.0, 12.0) for _ in range(n_genes)]
+    shift = [rng.choice((-1.5, 1.5)) if rng.random() < 0.1 else 0.0 for _ in range(n_genes)]
+    with open(path, 'w', encoding='utf-8') as csv_file:
+        csv_file.write("samples,type," + ",".join(f"{col}_at" for col in range(n_genes)) + "\n")
+        for row, gene_type in enumerate(sample_types):
+            levels = ([level + delta for level, delta in zip(base, shift)]
+                      if gene_type == 'HCC' else base)
+            values = ",".join(f"{rng.gauss(level, 0.5):.4f}" for level in levels)
+            csv_file.write(f"GSM{row},{gene_type},{values}\n")
+    return path
+
+
+def measure(function, trace_memory):
+    """
+    Run function and returns its result with its wall time, CPU time and,
+    when trace_memory is set, its peak traced memory in bytes.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        result = function()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, {"wall_s": wall, "cpu_s": cpu, "peak_bytes": peak}
+
+
+class Benchmark:
+    """
+    Time and memory-profile every stage of the analysis pipeline on one
+    data file.
+
+    The stages follow final_main: parsing the CSV, loading it again from the
+    binary cache, the per-gene statistics, the genome-wide differential
+    ranking, the threshold query, the per-sample minimum/maximum and writing
+    the report. Each stage runs once for timing and, unless trace_memory is
+    off, once more under tracemalloc for its peak memory, so the tracing
+    overhead does not distort the timings.
+    """
+
+    def __init__(self, data_path, genes, threshold=10.0, number=10, trace_memory=True):
+        """Initialize with the data file, the desired genes and the query parameters."""
+        self.data_path = data_path
+        self.genes = list(genes)
+        self.threshold = threshold
+        self.number = number
+        self.trace_memory = trace_memory
+
+    def stages(self, work_dir):
+        """Return the (name, function) pipeline stages; each function takes the shared state."""
+        report_path = os.path.join(work_dir, "report.txt")
+        # The sidecar goes to work_dir, so a cache next to the data file is left alone
+        cache = BinaryCache(self.data_path, cache_path=os.path.join(work_dir, "data.gecache"))
+
+        def load_csv(state):
+            state["data"] = GeneExpressionData(self.data_path, use_cache=False)
+            state["analysis"] = StatisticalAnalysis(state["data"])
+            return state["data"].load_stats["rows"]
+
+        def write_cache(state):
+            data = state["data"]
+            cache.save(data.gene_names, data.sample_ids, data.sample_types, data.matrix)
+            return os.path.getsize(cache.cache_path)
+
+        def load_cache(state):
+            gene_names, sample_ids, sample_types, matrix = cache.load()
+            return len(GeneExpressionData.from_matrix(
+                matrix, gene_names, sample_ids, sample_types).sample_ids)
+
+        def gene_statistics(state):
+            analysis = state["analysis"]
+            analysis.calculate_mean(self.genes)
+            analysis.calculate_median(self.genes)
+            analysis.calculate_standard_deviation_variance(self.genes)
+            analysis.calculate_differential(self.genes)
+            return len(self.genes)
+
+        def differential_ranking(state):
+            state["top"] = state["analysis"].compare_differential_numbers(
+                state["data"].gene_names, self.number)
+            return len(state["data"].gene_names)
+
+        def threshold_query(state):
+            state["threshold"] = state["analysis"].get_high_threshold(self.threshold)
+            return len(state["threshold"]) - 1
+
+        def sample_min_max(state):
+            state["min"], state["max"] = state["analysis"].sample_min_max()
+            return len(state["data"].sample_ids)
+
+        def write_report(state):
+            data = state["data"]
+            with AnalysisReport(report_path) as report:
+                report.generate_report("Top differential genes", state["top"], "End")
+                report.generate_report("Genes above the threshold", state["threshold"], "End")
+                report.generate_report("Minimum expression", state["min"], "End")
+                report.generate_report("Maximum expression", state["max"], "End")
+                report.generate_report("Gene names", data.gene_names, "End")
+            return os.path.getsize(report_path)
+
+        return [
+            ("load_csv", load_csv),
+            ("write_cache", write_cache),
+            ("load_cache", load_cache),
+            ("gene_statistics", gene_statistics),
+            ("differential_ranking", differential_ranking),
+            ("threshold_query", threshold_query),
+            ("sample_min_max", sample_min_max),
+            ("write_report", write_report),
+        ]
+
+    def run_pass(self, trace_memory):
+        """Run every stage once and returns a dictionary of stage name to measurements."""
+        results = {}
+        state = {}
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name, stage in self.stages(work_dir):
+                items, results[name] = measure(lambda stage=stage: stage(state), trace_memory)
+                results[name]["items"] = items
+        return results
+
+    def run(self):
+        """Run the benchmark and returns the result document."""
+        stages = self.run_pass(trace_memory=False)
+        if self.trace_memory:
+            for name, measured in self.run_pass(trace_memory=True).items():
+                stages[name]["peak_bytes"] = measured["peak_bytes"]
+        return {
+            "data_path": self.data_path,
+            "data_bytes": os.path.getsize(self.data_path),
+            "genes": self.genes,
+            "threshold": self.threshold,
+            "number": self.number,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "stages": stages,
+        }
+
+
+def compare_results(previous, current, tolerance=0.2):
+    """
+    Compare two result documents stage by stage and returns a list of
+    (stage, previous wall time, current wall time, ratio, regression flag);
+    a stage regresses when it is more than tolerance slower.
+    """
+    comparison = []
+    for name, measured in current["stages"].items():
+        if name not in previous["stages"]:
+            continue
+        before = previous["stages"][name]["wall_s"]
+        after = measured["wall_s"]
+        ratio = after / before if before else float('inf')
+        comparison.append((name, before, after, ratio, ratio > 1 + tolerance))
+    return comparison
+
+
+def main():
+    """
+    Generate a synthetic data set (unless --data is given), benchmark it
+    and write the results as JSON.
+    Options:
+    --size S: 'small', 'medium' or 'large' (default 'small'), or
+    --genes N and --samples M for any size
+    --hcc-fraction F, --other-fraction F: sample type mix (default 0.5, 0)
+    --seed N: generator seed (default 0)
+    --data PATH: benchmark an existing CSV instead of generating one
+    --output PATH: JSON result file (default: printed on stdout)
+    --compare PATH: earlier JSON result to compare against
+    --tolerance F: slow-down that counts as a regression (default 0.2, 20%)
+    --no-memory: skip the tracemalloc pass
+    """
+    try:
+        arguments, options = split_options(sys.argv[1:], flags=('no-memory',))
+        if arguments:
+            raise InputError(f"Unexpected argument {arguments[0]}")
+        if options.get('size', 'small') not in SIZES:
+            raise InputError(f"Size must be one of {', '.join(SIZES)}")
+        n_genes, n_samples = SIZES[options.get('size', 'small')]
+        n_genes = int(options.get('genes', n_genes))
+        n_samples = int(options.get('samples', n_samples))
+        if n_genes <= 0 or n_samples <= 0:
+            raise InputError("Genes and samples must be positive")
+
+        tolerance = float(options.get('tolerance', 0.2))
+        generator = None
+        with tempfile.TemporaryDirectory() as work_dir:
+            data_path = options.get('data')
+            if data_path is None:
+                generator = {
+                    "genes": n_genes,
+                    "samples": n_samples,
+                    "hcc_fraction": float(options.get('hcc-fraction', 0.5)),
+                    "other_fraction": float(options.get('other-fraction', 0.0)),
+                    "seed": int(options.get('seed', 0)),
+                }
+                data_path = write_synthetic_csv(
+                    os.path.join(work_dir, "synthetic.csv"), n_genes, n_samples,
+                    generator["hcc_fraction"], generator["other_fraction"], generator["seed"])
+            genes = GeneExpressionData(data_path, mode='stream').gene_names[:5]
+            results = Benchmark(data_path, genes, trace_memory='no-memory' not in options).run()
+            results["generator"] = generator
+
+        document = json.dumps(results, indent=2)
+        if 'output' in options:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(document + "\n")
+        else:
+            print(document)
+        if 'compare' in options:
+            with open(options['compare'], 'r', encoding='utf-8') as previous_file:
+                previous = json.load(previous_file)
+            for name, before, after, ratio, regression in compare_results(
+                    previous, results, tolerance):
+                flag = "  REGRESSION" if regression else ""
+                print(f"{name:22} {before:9.3f} s -> {after:9.3f} s  x{ratio:.2f}{flag}",
+                      file=sys.stderr)
+    except (InputError, ValueError) as error:
+        print(f"Input Error: {error}")
+
+
+if __name__ == "__main__":
+    main()
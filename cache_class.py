@@ -0,0 +1,130 @@
+"""Module for the binary on-disk cache of parsed gene expression data."""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b'GECACHE1'  # First bytes of every cache file
+VERSION = 2  # Bumped whenever the layout below or the saved sample profiles change
+HEADER_SIZE = struct.Struct('<Q')  # Length of the JSON header that follows MAGIC
+
+
+class BinaryCache:
+    """
+    Binary sidecar of a parsed expression CSV.
+
+    The sidecar stores MAGIC, the length of a JSON header, the header itself
+    (gene names, sample IDs, sample types, the per-sample profiles and the
+    key of the source file) and then the raw samples x genes matrix, aligned to 8 bytes so it can be
+    memory-mapped. The key is the size, mtime and content hash of the CSV;
+    any difference makes the sidecar stale and it is rebuilt on the next load.
+    The typecode is part of the default sidecar name, so float64 and float32
+    loads of the same CSV keep separate sidecars instead of replacing each other.
+    """
+
+    def __init__(self, source_path, typecode='d', cache_path=None):
+        """Initialize with the CSV path, the matrix typecode and optionally the sidecar path."""
+        self.source_path = source_path
+        self.typecode = typecode
+        self.cache_path = cache_path or f"{source_path}.{typecode}.gecache"
+        self.sample_profiles = None  # Per-sample profiles of the last load, if saved
+
+    def source_stat(self):
+        """Return the size and mtime of the source file."""
+        stat = os.stat(self.source_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def source_hash(self):
+        """Return the BLAKE2 content hash of the source file."""
+        with open(self.source_path, 'rb') as source_file:
+            return hashlib.file_digest(source_file, 'blake2b').hexdigest()
+
+    def read_header(self, cache_file):
+        """Read the JSON header and return it, or None if the file is not a cache."""
+        if cache_file.read(len(MAGIC)) != MAGIC:
+            return None
+        raw_size = cache_file.read(HEADER_SIZE.size)
+        if len(raw_size) != HEADER_SIZE.size:
+            return None
+        (size,) = HEADER_SIZE.unpack(raw_size)
+        try:
+            return json.loads(cache_file.read(size))
+        except ValueError:
+            return None
+
+    def load(self):
+        """
+        Load the cached dataset if it is still valid for the source file.
+
+        Returns gene names, sample IDs, sample types and the matrix as a
+        read-only memoryview over a memory map of the sidecar, or None when
+        the sidecar is missing, stale or was written with another typecode.
+        The saved sample profiles are kept in sample_profiles.
+        """
+        typecode = self.typecode
+        key = self.source_stat()  # Raises FileNotFoundError for a missing CSV
+        try:
+            cache_file = open(self.cache_path, 'rb')
+        except OSError:
+            return None
+        with cache_file:
+            header = self.read_header(cache_file)
+            if (header is None
+                    or header.get("version") != VERSION
+                    or header["typecode"] != typecode
+                    or header["byteorder"] != sys.byteorder
+                    or header["size"] != key["size"]
+                    or header["mtime_ns"] != key["mtime_ns"]
+                    or header["hash"] != self.source_hash()):
+                return None
+
+            n_bytes = header["n_values"] * array(typecode).itemsize
+            if not n_bytes:
+                matrix = array(typecode)
+            else:
+                mapped = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+                matrix = memoryview(mapped)[header["offset"]:header["offset"] + n_bytes]
+                matrix = matrix.cast(typecode)
+        self.sample_profiles = header.get("sample_profiles")
+        return header["gene_names"], header["sample_ids"], header["sample_types"], matrix
+
+    def save(self, gene_names, sample_ids, sample_types, matrix, sample_profiles=None):
+        """
+        Write the dataset, with the sample profiles when given, to the
+        sidecar, replacing any previous version atomically.
+        """
+        header = {
+            "version": VERSION,
+            "typecode": matrix.typecode if isinstance(matrix, array) else matrix.format,
+            "byteorder": sys.byteorder,
+            **self.source_stat(),
+            "hash": self.source_hash(),
+            "n_values": len(matrix),
+            "gene_names": list(gene_names),
+            "sample_ids": list(sample_ids),
+            "sample_types": list(sample_types),
+            "sample_profiles": sample_profiles,
+            "offset": 0,
+        }
+        # The offset is part of the header, so encode twice to fix its own length
+        encoded = json.dumps(header).encode('utf-8')
+        start = len(MAGIC) + HEADER_SIZE.size
+        header["offset"] = -(-(start + len(encoded) + 32) // 8) * 8
+        encoded = json.dumps(header).encode('utf-8')
+        encoded += b' ' * (header["offset"] - start - len(encoded))
+
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as cache_file:
+                cache_file.write(MAGIC)
+                cache_file.write(HEADER_SIZE.pack(len(encoded)))
+                cache_file.write(encoded)
+                cache_file.write(matrix)
+            os.replace(temp_path, self.cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,58 @@
+"""Module for the correlation helpers of the gene co-expression search."""
+
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+from itertools import repeat
+from operator import add, mul, sub
+
+try:
+    from math import sumprod  # Python 3.12 and later
+except ImportError:
+    def sumprod(p, q):
+        """Return the sum of the products of two equally long sequences."""
+        return sum(map(mul, p, q))
+
+# Correlation methods of StatisticalAnalysis.coexpression
+COEXPRESSION_METHODS = ('pearson', 'spearman')
+
+# Number of gene columns decoded at a time; memory is about samples x BLOCK_SIZE values
+BLOCK_SIZE = 1024
+
+
+def rank_transform(values):
+    """
+    Return values replaced by twice their average rank minus one, so tied
+    values share a rank. A constant shift and scale of the ranks does not
+    change a correlation, which saves the division.
+    """
+    pooled = sorted(values)
+    return list(map(add, map(bisect_left, repeat(pooled), values),
+                    map(bisect_right, repeat(pooled), values)))
+
+
+def unit_vector(values):
+    """
+    Return values centred on their mean and scaled to unit length, or None
+    for constant values; the Pearson correlation of two such vectors is
+    their dot product.
+    """
+    if not values:
+        return None
+    mean = sum(values) / len(values)
+    centred = list(map(sub, values, repeat(mean)))
+    norm = math.sqrt(sumprod(centred, centred))
+    if norm == 0.0:
+        return None
+    return list(map(mul, centred, repeat(1.0 / norm)))
+
+
+def push_partner(heap, k, entry):
+    """
+    Keep the k largest (strength, -column, correlation) entries seen so far
+    in a min-heap; a stronger entry replaces the weakest one.
+    """
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
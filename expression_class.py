@@ -1,19 +1,317 @@
 """Module for handling gene expression data processing."""
 
-from collections import defaultdict
+import math
+import os
+import threading
+import time
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, repeat
+
+from cache_class import BinaryCache
+from shard_class import is_compressed, open_shard, resolve_shards
+
+# Size hint in bytes for each block of lines read by the loader
+CHUNK_SIZE = 1 << 22
+
+# Quantiles of a sample profile, estimated from at most PROFILE_SAMPLE_SIZE values of the row
+PROFILE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+PROFILE_SAMPLE_SIZE = 1024
+
+
+def parse_header(line):
+    """Return the gene names of a header row, skipping the first 2 columns (sample, type)."""
+    return [key.strip() for key in line.split(',')[2:]]
+
+
+def iter_expression_rows(stream, n_genes, typecode='d', chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Yield (sample ID, sample type, array of values) for every data row of a
+    stream positioned after its header, reading blocks of about chunk_size bytes.
+    The size of every block read is added to progress["bytes"] when given.
+    """
+    while True:
+        lines = stream.readlines(chunk_size)
+        if not lines:
+            return
+        if progress is not None:
+            progress["bytes"] += sum(map(len, lines))
+        for line in lines:
+            if not line.strip():
+                continue
+            sample, gene_type, values = line.split(',', 2)
+            row = array(typecode, map(float, values.split(',')))
+            if len(row) != n_genes:
+                raise ValueError(f"Sample {sample} has {len(row)} values, expected {n_genes}")
+            yield sample, gene_type, row
+
+
+def profile_row(row):
+    """
+    Return the QC profile of one sample row as a dictionary: its minimum,
+    maximum and mean over the values present and its number of missing
+    (NaN) values, which are exact (NaN when every value is missing), and
+    the PROFILE_QUANTILES estimated from evenly spaced values of the row
+    (every value when it has at most PROFILE_SAMPLE_SIZE of them).
+    """
+    if not len(row):
+        return {"min": math.nan, "max": math.nan, "mean": math.nan, "missing": 0,
+                "quantiles": []}
+    total = sum(row)
+    missing = 0
+    minimum, maximum = min(row), max(row)
+    if math.isnan(total):
+        missing = sum(map(math.isnan, row))
+        present = [value for value in row if not math.isnan(value)]
+        total = sum(present)
+        minimum = min(present, default=math.nan)
+        maximum = max(present, default=math.nan)
+    step = -(-len(row) // PROFILE_SAMPLE_SIZE)
+    spread = sorted(value for value in row[::step] if not math.isnan(value))
+    return {
+        "min": minimum,
+        "max": maximum,
+        "mean": total / (len(row) - missing) if len(row) > missing else math.nan,
+        "missing": missing,
+        "quantiles": [spread[int(fraction * (len(spread) - 1))]
+                      for fraction in PROFILE_QUANTILES] if spread else [],
+    }
+
+
+def load_statistics(rows, n_bytes, seconds, source):
+    """Return the load statistics dictionary: rows, bytes, seconds, rows/s, MB/s and source."""
+    return {
+        "rows": rows,
+        "bytes": n_bytes,
+        "seconds": seconds,
+        "rows_per_s": rows / seconds if seconds else 0.0,
+        "mb_per_s": n_bytes / 1e6 / seconds if seconds else 0.0,
+        "source": source,
+    }
+
+
+def read_expression_stream(stream, typecode='d', chunk_size=CHUNK_SIZE):
+    """
+    Parse an expression CSV stream in one pass and return its contents.
+
+    Rows come from iter_expression_rows and are appended straight into one
+    typed array, so no per-gene lists are built; the profile_row of each
+    row is taken while it is at hand. Returns gene names, sample IDs,
+    sample types, the samples x genes matrix, the load_statistics and the
+    list of sample profiles.
+    """
+    start = time.perf_counter()
+    # Get header row with gene names
+    header = stream.readline()
+    gene_names = parse_header(header)
+    progress = {"bytes": len(header)}
+
+    matrix = array(typecode)
+    sample_ids = []
+    sample_types = []
+    sample_profiles = []
+    for sample, gene_type, row in iter_expression_rows(
+            stream, len(gene_names), typecode, chunk_size, progress):
+        matrix.extend(row)
+        sample_ids.append(sample)
+        sample_types.append(gene_type)
+        sample_profiles.append(profile_row(row))
+
+    stats = load_statistics(len(sample_ids), progress["bytes"],
+                            time.perf_counter() - start, "csv")
+    return gene_names, sample_ids, sample_types, matrix, stats, sample_profiles
+
+
+def parse_shard(path, typecode='d'):
+    """Parse one shard, decompressed on the fly by open_shard, with read_expression_stream."""
+    with open_shard(path) as shard_file:
+        return read_expression_stream(shard_file, typecode)
+
+
+def read_shards(paths, typecode='d', workers=1):
+    """
+    Parse the shard files of a data set and merge them in the order of
+    paths, so the samples keep the same order whatever the worker count.
+
+    With workers > 1 the shards are decompressed and parsed in that many
+    processes, and each parsed shard is appended as soon as it is its turn.
+    Every shard must have the gene columns of the first one. Returns the
+    same values as read_expression_stream.
+    """
+    start = time.perf_counter()
+    pool = None
+    if workers > 1 and len(paths) > 1:
+        pool = ProcessPoolExecutor(min(workers, len(paths)))
+        shards = pool.map(parse_shard, paths, repeat(typecode))
+    else:
+        shards = map(parse_shard, paths, repeat(typecode))
+    try:
+        n_bytes = 0
+        for number, (path, shard) in enumerate(zip(paths, shards)):
+            keys, ids, types, shard_matrix, stats, profiles = shard
+            if not number:
+                gene_names, matrix = keys, shard_matrix
+                sample_ids, sample_types, sample_profiles = ids, types, profiles
+            elif keys != gene_names:
+                raise ValueError(f"The gene columns of {path} differ from {paths[0]}")
+            else:
+                matrix.extend(shard_matrix)
+                sample_ids.extend(ids)
+                sample_types.extend(types)
+                sample_profiles.extend(profiles)
+            n_bytes += stats["bytes"]
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    stats = load_statistics(len(sample_ids), n_bytes, time.perf_counter() - start,
+                            "csv" if len(paths) == 1 else "shards")
+    return gene_names, sample_ids, sample_types, matrix, stats, sample_profiles
+
+
+class GeneColumnView(Mapping):
+    """
+    Read-only view mapping gene names to the expression values of one sample type.
+
+    Values are not stored in the view; every lookup slices the gene column
+    out of the shared expression matrix and keeps the rows selected by the mask.
+    """
+
+    def __init__(self, expression_obj, mask):
+        """Initialize with the owning data object and a 0/1 mask over its samples."""
+        self.expression_obj = expression_obj
+        self.mask = mask
+        self.size = sum(mask)
+
+    def __getitem__(self, gene_name):
+        """
+        Return the list of expression values of the gene for the masked
+        samples; an unknown gene raises ValueError like the statistics methods.
+        """
+        if gene_name not in self.expression_obj.gene_index:
+            raise ValueError(f"Gene {gene_name} not found")
+        if not self.size:
+            raise KeyError(gene_name)
+        column = self.expression_obj.gene_column(gene_name)
+        return list(compress(column, self.mask))
+
+    def __contains__(self, gene_name):
+        """Check whether the gene has values in this view."""
+        return bool(self.size) and gene_name in self.expression_obj.gene_index
+
+    def __iter__(self):
+        """Iterate over gene names in file order."""
+        if not self.size:
+            return iter(())
+        return iter(self.expression_obj.gene_names)
+
+    def __len__(self):
+        """Return the number of genes in the view."""
+        return len(self.expression_obj.gene_names) if self.size else 0
+
+
+class SampleView(Mapping):
+    """Read-only view mapping sample IDs to [sample type, list of expression values]."""
+
+    def __init__(self, expression_obj):
+        """Initialize with the owning data object."""
+        self.expression_obj = expression_obj
+
+    def __getitem__(self, sample):
+        """Return the sample type and its row of expression values."""
+        row = self.expression_obj.sample_index[sample]
+        return [self.expression_obj.sample_types[row],
+                self.expression_obj.sample_row(row).tolist()]
+
+    def __contains__(self, sample):
+        """Check whether the sample ID exists."""
+        return sample in self.expression_obj.sample_index
+
+    def __iter__(self):
+        """Iterate over sample IDs in file order."""
+        return iter(self.expression_obj.sample_index)
+
+    def __len__(self):
+        """Return the number of samples."""
+        return len(self.expression_obj.sample_index)
 
 
 class GeneExpressionData:
-    """Class for handling gene expression data from liver cancer samples."""
+    """
+    Class for handling gene expression data from liver cancer samples.
+
+    All expression values are kept in one contiguous samples x genes matrix
+    (row-major ``array``, float64 by default or float32 with typecode 'f').
+    ``gene_index`` maps a gene name to its column. Every distinct sample
+    type is a group: ``group_names`` lists them in order of appearance and
+    ``group_index`` holds the group number of every row. ``hcc_mask`` and
+    ``normal_mask`` mark the rows of the 'HCC' and 'normal' groups. ``dict_gene_hcc``,
+    ``dict_gene_normal`` and ``dict_sample`` are views over that matrix.
+    With use_cache the parsed matrix is also kept in a binary sidecar next
+    to the CSV and later runs memory-map it instead of parsing the text.
+
+    The path may also name several shards of one data set (see
+    resolve_shards): a directory, a glob pattern or a list of files, each
+    possibly compressed with gzip, bzip2, xz or zstd. Shards are
+    decompressed while they are read and parsed in ``workers`` processes,
+    their gene columns must match, and their samples are merged in shard
+    order. Only a single file gets a binary sidecar, and the lazy mode
+    needs a single uncompressed file: otherwise it loads the whole matrix.
 
-    def __init__(self, path: str):
-        """Initialize with file path."""
+    mode 'memory' loads the whole matrix. mode 'stream' only reads the gene
+    names; the rows are then consumed one at a time through iter_rows(), for
+    files that do not fit in memory. mode 'lazy' reads the sample IDs and
+    types and the byte offset of every row, and converts values only when
+    they are asked for: gene columns are decoded on demand and cached
+    (decode_columns reads several genes in one pass) and sample rows are
+    parsed from their offset. The full matrix is only parsed when a
+    genome-wide method first uses ``matrix``; a valid binary cache is used
+    directly instead. Decoding and loading hold a lock, so concurrent
+    server threads parse the file once.
+    """
+
+    def __init__(self, path, typecode: str = 'd', use_cache: bool = True,
+                 mode: str = 'memory', workers: int = 1):
+        """
+        Initialize with the data source (None for an empty dataset), typecode,
+        cache use, mode and the number of processes parsing shards.
+        """
+        if mode not in ('memory', 'stream', 'lazy'):
+            raise ValueError(f"Unknown mode {mode}")
         self.path = path
-        self.dict_gene_hcc = self.load_data()[0]
-        self.dict_gene_normal = self.load_data()[1]
-        self.dict_sample = self.load_data()[2]
+        self.shards = resolve_shards(path) if path is not None else []
+        # Only one uncompressed file can be indexed by byte offset (lazy mode)
+        self.plain_file = len(self.shards) == 1 and not is_compressed(self.shards[0])
+        self.workers = workers
+        self.typecode = typecode
+        self.use_cache = use_cache
+        self.mode = mode
+        self.gene_names = []  # Gene names in column order
+        self.gene_index = {}  # Gene name -> column
+        self.sample_ids = []  # Sample IDs in row order
+        self.sample_types = []  # Sample type label of each row
+        self.sample_index = {}  # Sample ID -> row
+        self.group_names = []  # Distinct sample types in order of appearance
+        self.group_index = array('I')  # Position in group_names of the type of each row
+        self.matrix = array(typecode)
+        self.hcc_mask = b''
+        self.normal_mask = b''
+        self.load_stats = None  # Rows, bytes and throughput of the last load
+        self.sample_profiles = None  # profile_row of every row, None until known
+        self.data_version = 0  # Incremented whenever set_matrix installs new data
+        self.row_offsets = None  # Byte offset of every row while the matrix is not loaded
+        self.column_cache = {}  # Gene name -> decoded column, used while row_offsets is set
+        # Serializes decoding and loading the matrix of a lazy data set across server threads
+        self.lazy_lock = threading.RLock()
+        if path is None:
+            # Empty dataset, filled later through set_matrix (see from_matrix)
+            self.set_matrix(array(typecode), [], [], [])
+        elif mode == 'stream':
+            self.set_matrix(array(typecode), self.read_gene_names(), [], [])
+        else:
+            self.dict_gene_hcc, self.dict_gene_normal, self.dict_sample = self.load_data()
 
-    def load_data(self):
+    def load_data(self, reload=False):
         """
         Load expression data from file and returns 3 dictionaries.
 
@@ -22,41 +320,301 @@ class GeneExpressionData:
         These dictionaries are categorized based on their type.
         The third dictionary contains samples as keys and
         a list of lists of their expression values.
+        The dictionaries are views over the expression matrix, and the file
+        is parsed only once: later calls return the same views unless
+        reload is True. In lazy mode without a valid cache only the rows
+        are indexed (see index_rows).
         """
+        if self.load_stats is not None and not reload:
+            return self.dict_gene_hcc, self.dict_gene_normal, self.dict_sample
+        single = len(self.shards) == 1
+        cache = BinaryCache(self.shards[0], self.typecode) if self.use_cache and single else None
         try:
-            # Initialize dictionaries
-            dict_sample = {} # Dictionary to hold sample information
-            dict_gene_hcc = defaultdict(list) # Dictionary for HCC gene expressions
-            dict_gene_normal = defaultdict(list) # Dictionary for normal gene expressions
-
-            # Read and parse file
-            with open(self.path, 'r', encoding='utf-8') as liver_file:
-                # Get header row with gene names
-                line1 = liver_file.readline()
-                keys = line1.split(',')
-                # Skip first 2 columns (sample, type)
-                keys = [key.strip() for key in keys[2:]]
-
-                # Process each data row
+            start = time.perf_counter()
+            cached = cache.load() if cache else None
+            if cached is not None:
+                keys, sample_ids, sample_types, matrix = cached
+                sample_profiles = cache.sample_profiles
+                stats = load_statistics(len(sample_ids), os.path.getsize(cache.cache_path),
+                                        time.perf_counter() - start, "cache")
+            elif self.mode == 'lazy' and self.plain_file:
+                return self.index_rows()
+            else:
+                # Read and parse every shard in a single pass
+                (keys, sample_ids, sample_types, matrix, stats,
+                 sample_profiles) = read_shards(self.shards, self.typecode, self.workers)
+        except FileNotFoundError:
+            raise FileNotFoundError("There is not any file.")
+
+        if cache and cached is None:
+            try:
+                cache.save(keys, sample_ids, sample_types, matrix, sample_profiles)
+            except OSError:
+                pass  # The cache is only a speed-up, e.g. the folder may be read-only
+        self.load_stats = stats
+        self.set_matrix(matrix, keys, sample_ids, sample_types, sample_profiles)
+        return self.dict_gene_hcc, self.dict_gene_normal, self.dict_sample
+
+    def index_rows(self):
+        """
+        Read the gene names, sample IDs, sample types and row byte offsets
+        of the file without converting any value, and returns the 3 views.
+        """
+        start = time.perf_counter()
+        row_offsets = array('q')
+        sample_ids = []
+        sample_types = []
+        try:
+            liver_file = open(self.shards[0], 'rb')
+        except FileNotFoundError:
+            raise FileNotFoundError("There is not any file.")
+        with liver_file:
+            header = liver_file.readline()
+            offset = len(header)
+            for line in liver_file:
+                if line.strip():
+                    sample, gene_type = line.split(b',', 2)[:2]
+                    row_offsets.append(offset)
+                    sample_ids.append(sample.decode('utf-8'))
+                    sample_types.append(gene_type.decode('utf-8'))
+                offset += len(line)
+        self.load_stats = load_statistics(len(sample_ids), offset,
+                                          time.perf_counter() - start, "index")
+        self.set_labels(parse_header(header.decode('utf-8')), sample_ids, sample_types)
+        self.row_offsets = row_offsets
+        # Without a matrix attribute, __getattr__ parses the file on first use
+        vars(self).pop('matrix', None)
+        return self.dict_gene_hcc, self.dict_gene_normal, self.dict_sample
+
+    def decode_columns(self, gene_names):
+        """
+        Decode the columns of the given genes in one pass over the rows of a
+        lazy data set and keep them in column_cache. Each line is only split
+        up to the last requested column. Does nothing once the matrix is loaded.
+        An unknown gene raises ValueError.
+        """
+        for gene_name in gene_names:
+            if gene_name not in self.gene_index:
+                raise ValueError(f"Gene {gene_name} not found")
+        with self.lazy_lock:
+            if self.row_offsets is None:
+                return
+            missing = list(dict.fromkeys(gene_name for gene_name in gene_names
+                                         if gene_name not in self.column_cache))
+            if not missing:
+                return
+            fields = [self.gene_index[gene_name] + 2 for gene_name in missing]
+            max_split = max(fields) + 1
+            columns = [array(self.typecode) for _ in missing]
+            with open(self.shards[0], 'rb') as liver_file:
+                liver_file.readline()
                 for line in liver_file:
-                    words = line.split(',') # Split each line by commas
-                    sample = words[0]  # Sample Id
-                    gene_type = words[1]  # HCC or normal
-                    # Expression values
-                    items = [float(value) for value in words[2:]]
-                    # Store sample info
-                    dict_sample[sample] = [gene_type, items]
-
-                    # Store expressions by type
-                    for col, item in enumerate(items):
-                        if gene_type == 'HCC':
-                            dict_gene_hcc[keys[col]].append(item)
-                        if gene_type == 'normal':
-                            dict_gene_normal[keys[col]].append(item)
-            return dict_gene_hcc, dict_gene_normal, dict_sample
+                    if not line.strip():
+                        continue
+                    values = line.split(b',', max_split)
+                    if len(values) < max_split:
+                        raise ValueError(
+                            f"Sample {values[0].decode('utf-8')} has too few values")
+                    for column, field in zip(columns, fields):
+                        column.append(float(values[field]))
+            self.column_cache.update(zip(missing, columns))
+
+    def load_matrix(self):
+        """
+        Parse the whole file of a lazy data set into the matrix, keeping its
+        labels, and write the binary cache for later runs. A thread that
+        waited for another one loading it finds the matrix there and returns.
+        """
+        with self.lazy_lock:
+            if self.row_offsets is None:
+                return
+            with open(self.shards[0], 'r', encoding='utf-8') as liver_file:
+                _, _, _, matrix, _, sample_profiles = read_expression_stream(
+                    liver_file, self.typecode)
+            if self.use_cache:
+                try:
+                    BinaryCache(self.shards[0], self.typecode).save(
+                        self.gene_names, self.sample_ids, self.sample_types, matrix,
+                        sample_profiles)
+                except OSError:
+                    pass  # The cache is only a speed-up
+            self.matrix = matrix
+            self.sample_profiles = sample_profiles
+            self.row_offsets = None
+            self.column_cache = {}
+
+    def __getattr__(self, name):
+        """Load the matrix of a lazy data set on its first use."""
+        # Only called for missing attributes; 'matrix' is missing until load_matrix
+        if name == 'matrix' and self.__dict__.get('row_offsets') is not None:
+            self.load_matrix()
+            return self.matrix
+        raise AttributeError(f"{type(self).__name__} object has no attribute {name}")
+
+    def describe_load(self):
+        """Return a one-line description of the last load and its throughput."""
+        stats = self.load_stats
+        return (f"Loaded {stats['rows']} rows ({stats['bytes'] / 1e6:.1f} MB) from "
+                f"{stats['source']} in {stats['seconds']:.3f} s: "
+                f"{stats['rows_per_s']:.0f} rows/s, {stats['mb_per_s']:.1f} MB/s")
+
+    @classmethod
+    def from_matrix(cls, matrix, gene_names, sample_ids, sample_types):
+        """Create a data object around an already built samples x genes matrix."""
+        typecode = matrix.typecode if isinstance(matrix, array) else matrix.format
+        expression_obj = cls(None, typecode=typecode, use_cache=False)
+        expression_obj.set_matrix(matrix, gene_names, sample_ids, sample_types)
+        return expression_obj
+
+    def read_gene_names(self):
+        """Read only the header row of the first shard and returns the list of gene names."""
+        try:
+            with open_shard(self.shards[0]) as liver_file:
+                return parse_header(liver_file.readline())
         except FileNotFoundError:
             raise FileNotFoundError("There is not any file.")
 
+    def iter_rows(self):
+        """
+        Yield (sample ID, sample type, array of expression values) for each
+        row of the shards, in order, without keeping earlier rows in memory.
+        """
+        gene_names = None
+        for path in self.shards:
+            try:
+                liver_file = open_shard(path)
+            except FileNotFoundError:
+                raise FileNotFoundError("There is not any file.")
+            with liver_file:
+                keys = parse_header(liver_file.readline())
+                if gene_names is None:
+                    gene_names = keys
+                elif keys != gene_names:
+                    raise ValueError(f"The gene columns of {path} differ from {self.shards[0]}")
+                yield from iter_expression_rows(liver_file, len(keys), self.typecode)
+
+    def append_samples(self, path):
+        """
+        Append the samples of another CSV with the same gene columns to the
+        matrix and returns the new (sample ID, sample type, row) triples.
+
+        The rows of the file are parsed once and added at the end of the
+        matrix, so the cost grows with the new rows. A memory-mapped cache
+        is copied into an array first. An empty dataset takes the gene names
+        of the file. Increments data_version like set_matrix.
+        """
+        if self.mode == 'stream':
+            raise ValueError("Samples cannot be appended to a streamed data set")
+        try:
+            sample_file = open_shard(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Sample file {path} not found")
+        with sample_file:
+            gene_names = parse_header(sample_file.readline())
+            if self.gene_names and gene_names != self.gene_names:
+                raise ValueError(f"The gene columns of {path} differ from the data set")
+            rows = list(iter_expression_rows(sample_file, len(gene_names), self.typecode))
+        matrix = self.matrix
+        if not isinstance(matrix, array):
+            matrix = array(self.typecode)
+            matrix.frombytes(self.matrix.cast('B'))
+        for _, _, row in rows:
+            matrix.extend(row)
+        sample_profiles = None
+        if self.sample_profiles is not None:
+            sample_profiles = self.sample_profiles + [profile_row(row) for _, _, row in rows]
+        self.set_matrix(matrix, gene_names,
+                        self.sample_ids + [sample for sample, _, _ in rows],
+                        self.sample_types + [gene_type for _, gene_type, _ in rows],
+                        sample_profiles)
+        return rows
+
+    def set_matrix(self, matrix, gene_names, sample_ids, sample_types, sample_profiles=None):
+        """
+        Install a samples x genes matrix with its labels and rebuild the views.
+        Increments data_version so results derived from older data are rebuilt.
+        sample_profiles are the profiles of the rows when already known.
+        """
+        self.matrix = matrix
+        self.row_offsets = None
+        self.set_labels(gene_names, sample_ids, sample_types)
+        self.sample_profiles = sample_profiles
+
+    def set_labels(self, gene_names, sample_ids, sample_types):
+        """Install the gene names, sample IDs and sample types and rebuild the views."""
+        self.data_version += 1
+        self.column_cache = {}
+        self.sample_profiles = None
+        self.gene_names = list(gene_names)
+        self.gene_index = {gene: col for col, gene in enumerate(self.gene_names)}
+        self.sample_ids = list(sample_ids)
+        self.sample_types = list(sample_types)
+        # A repeated sample ID keeps its first position and its last row
+        self.sample_index = {}
+        for row, sample in enumerate(self.sample_ids):
+            self.sample_index[sample] = row
+        group_numbers = {}
+        for gene_type in self.sample_types:
+            group_numbers.setdefault(gene_type, len(group_numbers))
+        self.group_names = list(group_numbers)
+        self.group_index = array('I', map(group_numbers.__getitem__, self.sample_types))
+        self.hcc_mask = self.group_mask('HCC')
+        self.normal_mask = self.group_mask('normal')
+        self.dict_gene_hcc = GeneColumnView(self, self.hcc_mask)
+        self.dict_gene_normal = GeneColumnView(self, self.normal_mask)
+        self.dict_sample = SampleView(self)
+
+    def group_mask(self, group_name):
+        """Return the mask of the rows of a sample type; all zeros when it has no rows."""
+        if group_name not in self.group_names:
+            return bytes(len(self.sample_types))
+        number = self.group_names.index(group_name)
+        return bytes(group == number for group in self.group_index)
+
+    def gene_column(self, gene_name):
+        """Return the expression values of a gene for every sample, in row order."""
+        if gene_name not in self.gene_index:
+            raise ValueError(f"Gene {gene_name} not found")
+        col = self.gene_index[gene_name]
+        if self.row_offsets is not None:
+            with self.lazy_lock:
+                # The matrix may have been loaded while this thread waited
+                if self.row_offsets is not None:
+                    if gene_name not in self.column_cache:
+                        self.decode_columns([gene_name])
+                    return self.column_cache[gene_name]
+        return self.matrix[col::len(self.gene_names)]
+
+    def profile_samples(self):
+        """
+        Return the list of sample profiles (see profile_row) in row order.
+        They are collected while the file is parsed or read from the cache;
+        a lazy data set or one built with from_matrix computes them here once.
+        """
+        if self.sample_profiles is None:
+            if self.row_offsets is not None:
+                rows = (row for _, _, row in self.iter_rows())
+            else:
+                rows = map(self.sample_row, range(len(self.sample_ids)))
+            self.sample_profiles = list(map(profile_row, rows))
+        return self.sample_profiles
+
+    def dict_sample_profile(self):
+        """Return a dictionary mapping sample IDs, in dict_sample order, to their profiles."""
+        profiles = self.profile_samples()
+        return {sample: profiles[row] for sample, row in self.sample_index.items()}
+
+    def sample_row(self, row):
+        """Return the expression values of the sample stored at the given row."""
+        row_offsets = self.row_offsets  # Kept even if another thread loads the matrix
+        if row_offsets is not None:
+            with open(self.shards[0], 'rb') as liver_file:
+                liver_file.seek(row_offsets[row])
+                values = liver_file.readline().split(b',')[2:]
+            return array(self.typecode, map(float, values))
+        n_genes = len(self.gene_names)
+        return self.matrix[row * n_genes:(row + 1) * n_genes]
+
     def return_list_gene_name(self, dict_gene_hcc):
         """Get list of gene names from HCC data and returns list of gene names."""
         return list(dict_gene_hcc.keys())
@@ -87,4 +645,4 @@ class GeneExpressionData:
             value_hcc = self. dict_gene_hcc[gene]
             value_normal = self.dict_gene_normal[gene]
             dict_desired_expression[gene] = value_hcc + value_normal
-        return dict_desired_expression
\ No newline at end of file
+        return dict_desired_expression
@@ -2,30 +2,173 @@
 
 import sys
 from expression_class import GeneExpressionData
+from memo_class import DEFAULT_CACHE_SIZE
 from statistical_class import StatisticalAnalysis
-from report_class import AnalysisReport
+from parallel_class import ParallelAnalysis
+from pipeline_class import AnalysisPipeline
+from report_class import REPORT_HEADERS, AnalysisReport
+from server_class import QueryServer
+from batch_class import BatchRunner, read_jobs
+from profile_class import Profiler
 from except_class import InputError
 
+# Options that take no value; they are set to True when present
+FLAG_OPTIONS = ('verbose', 'no-cache', 'lazy', 'pipeline')
+
+def split_options(argv, flags=FLAG_OPTIONS):
+    """Separate '--name value' options and '--flag' flags from the positional arguments."""
+    arguments = []
+    options = {}
+    items = iter(argv)
+    for item in items:
+        if item[2:] in flags and item.startswith('--'):
+            options[item[2:]] = True
+        elif item.startswith('--'):
+            value = next(items, None)
+            if value is None:
+                raise InputError(f"Option {item} needs a value")
+            options[item[2:]] = value
+        else:
+            arguments.append(item)
+    return arguments, options
+
+def load_expression(path, options, pipeline=None):
+    """
+    Load the data file, or the shards of a directory, glob or comma list
+    parsed by --workers processes, without the binary sidecar with
+    --no-cache and only indexing its rows with --lazy, or with the
+    overlapped stages of a pipeline when given, append the sample files
+    given with --append, and report the load throughput on stderr with
+    --verbose.
+    """
+    if pipeline is not None:
+        gene_expression_obj = pipeline.load()
+    else:
+        gene_expression_obj = GeneExpressionData(
+            path, use_cache=not options.get('no-cache'),
+            mode='lazy' if options.get('lazy') else 'memory',
+            workers=int(options.get('workers', 1)))
+    if 'append' in options:
+        for sample_path in options['append'].split(','):
+            gene_expression_obj.append_samples(sample_path)
+    if options.get('verbose'):
+        print(gene_expression_obj.describe_load(), file=sys.stderr)
+    return gene_expression_obj
+
+def make_analysis(gene_expression_obj, workers, options):
+    """
+    Create the analysis object, spreading genome-wide statistics over
+    processes if requested, with the statistics cache size of --cache-size.
+    """
+    cache_size = int(options.get('cache-size', DEFAULT_CACHE_SIZE))
+    if cache_size < 0:
+        raise InputError("Cache size must not be negative")
+    if workers > 1:
+        return ParallelAnalysis(gene_expression_obj, workers, cache_size)
+    return StatisticalAnalysis(gene_expression_obj, cache_size)
+
+def iter_sections(statistical_analysis, list_sample, list_gene_name, desired_gene_name,
+                  threshold, number):
+    """
+    Compute the data of the report sections, in REPORT_HEADERS order, and
+    yield each one as soon as it is ready.
+    """
+    yield list_sample
+    yield list_gene_name
+    yield statistical_analysis.calculate_mean(desired_gene_name)
+    yield statistical_analysis.calculate_median(desired_gene_name)
+    dict_var, dict_std_dev = statistical_analysis.calculate_standard_deviation_variance(
+        desired_gene_name)
+    yield dict_var
+    yield dict_std_dev
+    # The group means are cached and reused by calculate_differential
+    statistical_analysis.calculate_mean_gene_hcc(desired_gene_name)
+    statistical_analysis.calculate_mean_gene_normal(desired_gene_name)
+    yield statistical_analysis.calculate_differential(desired_gene_name)
+    yield statistical_analysis.compare_differential_numbers(list_gene_name, number)
+    yield statistical_analysis.get_high_threshold(threshold)
+    dict_min_sample, dict_max_sample = statistical_analysis.sample_min_max()
+    yield dict_min_sample
+    yield dict_max_sample
+
+def serve_queries(path, address, workers, options):
+    """Load the data once and answer analysis queries on address until interrupted."""
+    statistical_analysis = make_analysis(load_expression(path, options), workers, options)
+    if workers > 1:
+        # Start the pool before serving, so concurrent first queries share one pool
+        statistical_analysis.start()
+    try:
+        QueryServer(statistical_analysis).serve(address)
+    finally:
+        if workers > 1:
+            statistical_analysis.close()
+
+def run_batch(path, job_path, workers, options):
+    """Load the data once and write the report of every job in the job file."""
+    job_specs = read_jobs(job_path)
+    statistical_analysis = make_analysis(load_expression(path, options), workers, options)
+    try:
+        BatchRunner(statistical_analysis).run(job_specs)
+    finally:
+        if workers > 1:
+            statistical_analysis.close()
+
 def main():
     """
       Main function to handle gene expression analysis workflow.
     Command line arguments:
-    1. path: Path to input data file
+    1. path: Path to input data file, or a directory, glob pattern or
+       comma-separated list of shard files (.csv, .gz, .bz2, .xz, .zst)
     2. output_choice: Output destination ('file_path' or 'screen')
     3. file_path: Path for output file if output_choice is 'file_path'
     4. desired_gene_name: Comma-separated list of gene names
     5. threshold: Expression threshold value
     6. number: Number of top genes to analyze
+    Options:
+    --workers N: Number of processes for parsing shards and for the
+      genome-wide statistics (default 1)
+    --format F: Report format 'text', 'tsv' or 'jsonl' (default 'text');
+      a file_path ending in .gz, .bz2 or .xz is compressed
+    --serve ADDRESS: Keep the data loaded and answer JSON queries on
+      'host:port', 'port' or a Unix socket path; only path is needed
+    --batch JOBS: Write one report per job of a JSON, YAML or CSV job file,
+      loading the data and computing shared statistics once; only path is needed
+    --verbose: Print rows/s and MB/s of the data load on stderr
+    --no-cache: Do not read or write the binary sidecar of the data file
+    --append PATHS: Comma-separated CSV files of further samples with the
+      same gene columns, added after the data file
+    --cache-size N: Maximum number of per-gene results kept in the
+      statistics cache (default 100000, 0 turns it off)
+    --lazy: Index the rows only and decode gene columns on demand; the
+      matrix is parsed when a genome-wide statistic first needs it
+    --pipeline: Parse row chunks in --workers processes while the matrix
+      and group sums are built from the chunks already parsed, and write
+      each report section while the next one is computed
+    --profile PATH: Write a JSON trace of the time, CPU time, peak memory
+      and items of every stage and analysis call to PATH
+    --profile-stage NAME: Also run the stage NAME (e.g. 'report' or
+      'call:compare_differential_numbers') under cProfile, dumped to PATH.prof
     """
     try:
         # Get and validate input parameters
-        path = sys.argv[1]
-        output_choice = sys.argv[2].strip().lower()
-        desired_gene_name = [name.strip() for name in sys.argv[3].split(',')]
-        threshold = float(sys.argv[4])
-        number = int(sys.argv[5])
+        argv, options = split_options(sys.argv[1:])
+        workers = int(options.get('workers', 1))
+        if workers <= 0:
+            raise InputError("Workers must be positive")
+        if 'serve' in options:
+            serve_queries(argv[0], options['serve'], workers, options)
+            return
+        if 'batch' in options:
+            run_batch(argv[0], options['batch'], workers, options)
+            return
+        path = argv[0]
+        output_choice = argv[1].strip().lower()
+        desired_gene_name = [name.strip() for name in argv[2].split(',')]
+        threshold = float(argv[3])
+        number = int(argv[4])
         if output_choice == 'file_path':
-           file_path = sys.argv[6]
+           file_path = argv[5]
+        output_format = options.get('format', 'text')
 
         # Validate input parameters and raise InputError if any issues are found
         if not desired_gene_name:
@@ -36,87 +179,66 @@ def main():
             raise InputError("Number must be positive")
         if output_choice not in ['file_path', 'screen']:
             raise InputError("Output choice must be 'file_path' or 'screen'")
+        if output_format not in ['text', 'tsv', 'jsonl']:
+            raise InputError("Format must be 'text', 'tsv' or 'jsonl'")
+        if options.get('pipeline') and options.get('lazy'):
+            raise InputError("--pipeline and --lazy cannot be combined")
+
+        # Record the stages only with --profile; a disabled profiler does nothing
+        profiler = Profiler(enabled='profile' in options,
+                            cprofile_stage=options.get('profile-stage'),
+                            cprofile_path=f"{options.get('profile')}.prof")
 
         # Initialize Gene Expression Analysis
-        gene_expression_obj = GeneExpressionData(path)
+        pipeline = None
+        if options.get('pipeline'):
+            pipeline = AnalysisPipeline(GeneExpressionData(
+                path, use_cache=not options.get('no-cache'), mode='stream', workers=workers))
+        with profiler.stage("load") as stage:
+            gene_expression_obj = load_expression(path, options, pipeline)
+            # With --lazy, decode all desired genes in one pass over the rows
+            gene_expression_obj.decode_columns(desired_gene_name)
+            stage["items"] = len(gene_expression_obj.sample_ids)
 
-        # Load and process data
-        dict_gene_hcc, dict_gene_normal, dict_sample = gene_expression_obj.load_data()
-        list_gene_name = gene_expression_obj.return_list_gene_name(dict_gene_hcc)
-        list_sample = gene_expression_obj.return_list_sample(dict_sample)
-        expression_sample_dict = gene_expression_obj.expression_sample(dict_sample)
-        dict_desired_expr = gene_expression_obj.find_dict_desired_expression(desired_gene_name)
+        # Process data (the file was parsed once by the constructor)
+        with profiler.stage("prepare"):
+            dict_gene_hcc = gene_expression_obj.dict_gene_hcc
+            dict_sample = gene_expression_obj.dict_sample
+            list_gene_name = gene_expression_obj.return_list_gene_name(dict_gene_hcc)
+            list_sample = gene_expression_obj.return_list_sample(dict_sample)
+            dict_desired_expr = gene_expression_obj.find_dict_desired_expression(
+                desired_gene_name)
 
         # Create an instance of the StatisticalAnalysis class to perform the analysis
-        statistical_analysis = StatisticalAnalysis(gene_expression_obj)
-        mean_dict = statistical_analysis.calculate_mean(desired_gene_name)
-        median_dict = statistical_analysis.calculate_median(desired_gene_name)
-        dict_var, dict_std_dev = statistical_analysis.calculate_standard_deviation_variance(
-            desired_gene_name
-        )
-        mean_dict_hcc = statistical_analysis.calculate_mean_gene_hcc(desired_gene_name)
-        mean_dict_normal = statistical_analysis.calculate_mean_gene_normal(desired_gene_name)
-        dict_differential = statistical_analysis.calculate_differential(desired_gene_name)
-        dict_differential_sorted = statistical_analysis.compare_differential_numbers(
-            list_gene_name, number
-        )
-        dict_top_threshold = statistical_analysis.get_high_threshold(threshold)
-        dict_min_sample, dict_max_sample = statistical_analysis.sample_min_max(
-            expression_sample_dict
-        )
+        statistical_analysis = profiler.instrument(
+            make_analysis(gene_expression_obj, workers, options))
 
         # Create a report object based on the user's output choice
         if output_choice == 'file_path':
-            report_obj = AnalysisReport(destination = file_path)
+            report_obj = AnalysisReport(destination = file_path, output_format=output_format)
         else:
-            report_obj = AnalysisReport(destination ='screen')
-
-        # Prepare the data and headers/footers for the report
-        data = [
-            list_sample,
-            list_gene_name,
-            mean_dict,
-            median_dict,
-            dict_var,
-            dict_std_dev,
-            dict_differential,
-            dict_differential_sorted,
-            dict_top_threshold,
-            dict_min_sample,
-            dict_max_sample
-        ]
-
-        headers = [
-            "List of all sample names:",
-            "List of all gene names:",
-            "Mean dictionary of desired genes:",
-            "Median dictionary of desired genes:",
-            "Variance dictionary of desired genes:",
-            "Standard deviation of desired genes:",
-            "Ratio differential of desired genes:",
-            "Gene names with most expression differential:",
-            "N Gene names above the threshold:",
-            "Minimum expression list for each sample:",
-            "Maximum expression list for each sample:"
-        ]
-
-        footers = [
-            "End of sample names list",
-            "End of gene names list",
-            "End of mean of desired genes",
-            "End of median of desired genes",
-            "End of variance of desired genes",
-            "End of standard deviation of desired genes",
-            "End of differential ratios of desired genes",
-            "End of most differential genes",
-            "End of N genes above thershold",
-            "End of minimum expressions",
-            "End of maximum expressions"
-        ]
-
-        # Generate the report
-        for head, item, footer in zip(headers, data, footers):
-            report_obj.generate_report(head, item, footer)
+            report_obj = AnalysisReport(destination ='screen', output_format=output_format)
+
+        sections = iter_sections(statistical_analysis, list_sample, list_gene_name,
+                                 desired_gene_name, threshold, number)
+        try:
+            if pipeline is not None:
+                # Write each section in the writer thread while the next one is computed
+                pipeline.seed_statistics(statistical_analysis)
+                with profiler.stage("report", len(REPORT_HEADERS)), report_obj:
+                    pipeline.write_sections(report_obj, sections)
+            else:
+                with profiler.stage("statistics", len(list_gene_name)):
+                    data = list(sections)
+                # Generate the report, writing each section to the destination opened once
+                with profiler.stage("report", len(data)), report_obj:
+                    report_obj.generate_sections(data)
+        finally:
+            if workers > 1:
+                statistical_analysis.close()
+        if profiler.enabled:
+            profiler.stop()
+            profiler.write(options['profile'])
 
     # Handle InputError exceptions
     except InputError as e:
@@ -0,0 +1,58 @@
+"""Module for the threshold query index over gene expression values."""
+
+from bisect import bisect_right
+
+
+class ThresholdIndex:
+    """
+    Index answering "which genes have values above T" without a full scan.
+
+    Holds each gene's maximum and the genes ordered by that maximum, so a
+    query finds the genes whose maximum exceeds T with one binary search and
+    skips every other gene. Counts and top values need the values of a gene
+    sorted ascending; these are sorted on first use, only for genes that
+    pass a query, with sort_values (StatisticalAnalysis.sorted_gene_values),
+    and kept for later thresholds.
+    """
+
+    def __init__(self, list_gene_names, maxima, sort_values):
+        """Build the index from gene names, their maxima and a function sorting gene values."""
+        self.gene_names = list(list_gene_names)
+        self.sort_values = sort_values
+        self.sorted_values = {}  # Position -> ascending array, filled on demand
+        self.order_by_max = sorted(range(len(self.gene_names)), key=maxima.__getitem__)
+        self.sorted_max = [maxima[position] for position in self.order_by_max]
+
+    def positions_above(self, threshold):
+        """Return the positions, in gene order, of genes with a value above threshold."""
+        first = bisect_right(self.sorted_max, threshold)
+        return sorted(self.order_by_max[first:])
+
+    def genes_above(self, threshold):
+        """Return the names, in gene order, of genes with a value above threshold."""
+        return [self.gene_names[position] for position in self.positions_above(threshold)]
+
+    def values_at(self, positions):
+        """Return the sorted values of the genes at positions, sorting the missing ones at once."""
+        missing = [position for position in positions if position not in self.sorted_values]
+        if missing:
+            sorted_values = self.sort_values([self.gene_names[position] for position in missing])
+            self.sorted_values.update(zip(missing, sorted_values))
+        return [self.sorted_values[position] for position in positions]
+
+    def counts_above(self, threshold):
+        """Return a dictionary of genes to their number of values above threshold."""
+        positions = self.positions_above(threshold)
+        return {
+            self.gene_names[position]: len(values) - bisect_right(values, threshold)
+            for position, values in zip(positions, self.values_at(positions))
+        }
+
+    def top_values_above(self, threshold, top_k):
+        """Return a dictionary of genes to their top_k highest values above threshold."""
+        dict_top = {}
+        positions = self.positions_above(threshold)
+        for position, values in zip(positions, self.values_at(positions)):
+            first = max(bisect_right(values, threshold), len(values) - top_k)
+            dict_top[self.gene_names[position]] = values[first:].tolist()[::-1]
+        return dict_top
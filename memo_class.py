@@ -0,0 +1,74 @@
+"""Module for the bounded cache of per-gene statistics shared by the analysis methods."""
+
+import threading
+from collections import OrderedDict
+
+# Default number of cached results; each is one number or one list of gene sums
+DEFAULT_CACHE_SIZE = 100000
+
+
+class StatisticsCache:
+    """
+    Least-recently-used cache of statistics keyed by (gene, statistic, group).
+
+    Holds at most max_entries results; storing one more evicts the result
+    used longest ago. The cache belongs to one dataset version: validate()
+    empties it when the data_version it is given differs from the one its
+    results were computed for. A lock makes it safe for server threads.
+    A max_entries of 0 turns caching off.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        """Initialize an empty cache holding at most max_entries results."""
+        if max_entries < 0:
+            raise ValueError("The cache size must not be negative")
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None  # data_version the cached results belong to
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of cached results."""
+        return len(self.entries)
+
+    def validate(self, version):
+        """Drop every result if they were computed for another data_version."""
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+    def lookup(self, key, compute):
+        """
+        Return the cached result of key, marking it as recently used, or
+        compute(), stored before it is returned. Exceptions of compute are
+        passed on and nothing is stored.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+        value = compute()
+        if self.max_entries:
+            with self.lock:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        """Drop every cached result."""
+        with self.lock:
+            self.entries.clear()
+
+    def statistics(self):
+        """Return the size, hits, misses and evictions of the cache."""
+        return {"entries": len(self.entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
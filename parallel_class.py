@@ -0,0 +1,222 @@
+"""Module for gene-sharded statistics on a pool of worker processes."""
+
+import heapq
+import signal
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from multiprocessing import shared_memory
+
+from expression_class import GeneExpressionData
+from memo_class import DEFAULT_CACHE_SIZE
+from resample_class import merge_counts
+from statistical_class import StatisticalAnalysis
+
+# State of a worker process: its shared memory segment and analysis object
+WORKER = {}
+
+
+def attach_worker(name, n_values, typecode, gene_names, sample_ids, sample_types):
+    """Attach a worker to the shared expression matrix and build its analysis object."""
+    # Ctrl-C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shm = shared_memory.SharedMemory(name=name)
+    itemsize = array(typecode).itemsize
+    matrix = shm.buf[:n_values * itemsize].cast(typecode)
+    WORKER["shm"] = shm
+    WORKER["analysis"] = StatisticalAnalysis(
+        GeneExpressionData.from_matrix(matrix, gene_names, sample_ids, sample_types))
+
+
+def run_method(method_name, *args):
+    """Run a StatisticalAnalysis method on the worker's view of the data."""
+    return getattr(WORKER["analysis"], method_name)(*args)
+
+
+class ParallelAnalysis(StatisticalAnalysis):
+    """
+    StatisticalAnalysis that splits gene columns into shards and runs the
+    per-gene work (group sums for fold-changes, gene summaries, threshold
+    filtering, the threshold index and significance tests) on a process pool.
+
+    The expression matrix is copied once into shared memory, so workers read
+    it directly instead of receiving pickled lists. Shard results are merged
+    in shard order, which makes the output identical to the serial methods.
+    """
+
+    def __init__(self, expression_obj, workers, cache_size=DEFAULT_CACHE_SIZE):
+        """Initialize with a gene expression data object, the number of processes and cache size."""
+        super().__init__(expression_obj, cache_size)
+        self.workers = workers
+        self.shm = None
+        self.pool = None
+        self.pool_lock = threading.Lock()  # Server threads may start the pool together
+        self.pool_version = None  # data_version of the matrix copied to shared memory
+
+    def __enter__(self):
+        """Return the analysis object for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Shut down the pool when leaving a with statement."""
+        self.close()
+
+    def start(self):
+        """
+        Copy the matrix into shared memory and start the worker processes,
+        unless they are already running on the current data (a pool started
+        before set_matrix or a reload is replaced). Safe to call from several threads.
+        """
+        with self.pool_lock:
+            if self.pool is not None and self.pool_version != self.expression_obj.data_version:
+                self.stop_pool()
+            if self.pool is None:
+                self.start_pool()
+
+    def start_pool(self):
+        """Create the shared memory segment and the pool; the caller holds pool_lock."""
+        expression_obj = self.expression_obj
+        self.pool_version = expression_obj.data_version
+        matrix = memoryview(expression_obj.matrix)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        self.shm.buf[:matrix.nbytes] = matrix.cast('B')
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=attach_worker,
+            initargs=(self.shm.name, len(matrix), matrix.format, expression_obj.gene_names,
+                      expression_obj.sample_ids, expression_obj.sample_types))
+
+    def close(self):
+        """Stop the worker processes and release the shared memory."""
+        with self.pool_lock:
+            self.stop_pool()
+
+    def stop_pool(self):
+        """Shut down the pool and free the shared memory; the caller holds pool_lock."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def shard_bounds(self, n_items):
+        """Split n_items into contiguous (start, stop) shards, a few per worker."""
+        n_shards = min(n_items, self.workers * 4) or 1
+        bounds = [n_items * shard // n_shards for shard in range(n_shards + 1)]
+        return list(zip(bounds, bounds[1:]))
+
+    def map_shards(self, method_name, make_args, n_items):
+        """
+        Run a method on every shard of n_items and returns the results in
+        shard order; make_args(start, stop) gives the arguments of a shard.
+        """
+        self.start()
+        futures = [
+            self.pool.submit(run_method, method_name, *make_args(start, stop))
+            for start, stop in self.shard_bounds(n_items)
+        ]
+        return [future.result() for future in futures]
+
+    def map_columns(self, method_name, start, stop, *args):
+        """
+        Run a method taking (*args, start, stop) on column shards of the
+        genes start..stop (all genes when stop is None) and returns the
+        concatenated per-gene results.
+        """
+        stop = len(self.expression_obj.gene_names) if stop is None else stop
+        results = []
+        for part in self.map_shards(
+                method_name,
+                lambda first, last: (*args, start + first, start + last),
+                stop - start):
+            results.extend(part)
+        return results
+
+    def group_sums(self, mask, start=0, stop=None):
+        """Sum every gene over the masked samples, one column shard per task."""
+        return self.map_columns('group_sums', start, stop, mask)
+
+    def gene_maxima(self, start=0, stop=None):
+        """Find the maximum of every gene, one column shard per task."""
+        return self.map_columns('gene_maxima', start, stop)
+
+    def welch_tests(self, start=0, stop=None):
+        """Run Welch's t-test of every gene, one column shard per task."""
+        return self.map_columns('welch_tests', start, stop)
+
+    def mann_whitney_tests(self, start=0, stop=None):
+        """Run the Mann-Whitney U test of every gene, one column shard per task."""
+        return self.map_columns('mann_whitney_tests', start, stop)
+
+    def group_moments(self, start=0, stop=None):
+        """Compute the statistics of every sample group, one column shard per task."""
+        stop = len(self.expression_obj.gene_names) if stop is None else stop
+        parts = self.map_shards('group_moments',
+                                lambda first, last: (start + first, start + last),
+                                stop - start)
+        return [(group_parts[0][0],
+                 *(list(chain.from_iterable(part[field] for part in group_parts))
+                   for field in (1, 2, 3)))
+                for group_parts in zip(*parts)]
+
+    def coexpression_partners(self, query_genes, group, method, k, start=0, stop=None):
+        """
+        Find the strongest partners of the query genes with the genes split
+        across workers; the per-shard top-k lists are merged into one.
+        """
+        stop = len(self.expression_obj.gene_names) if stop is None else stop
+        parts = self.map_shards(
+            'coexpression_partners',
+            lambda first, last: (query_genes, group, method, k, start + first, start + last),
+            stop - start)
+        return [heapq.nlargest(k, chain.from_iterable(part[number] for part in parts))
+                for number in range(len(query_genes))]
+
+    def replicate_counts(self, kind, seed, first, last, number, observed):
+        """
+        Run the resampling replicates first..last split across workers; the
+        per-gene counts of every replicate range are added up, so the result
+        equals the serial one.
+        """
+        return merge_counts(self.map_shards(
+            'replicate_counts',
+            lambda start, stop: (kind, seed, first + start, first + stop, number, observed),
+            last - first))
+
+    def summarize_genes(self, desired_gene=None):
+        """Calculate the gene summary table with the genes split across workers."""
+        if desired_gene is None:
+            desired_gene = self.expression_obj.gene_names
+        desired_gene = list(desired_gene)
+        summary = {}
+        for part in self.map_shards(
+                'summarize_genes',
+                lambda first, last: (desired_gene[first:last],),
+                len(desired_gene)):
+            summary.update(part)
+        return summary
+
+    def genes_above_threshold(self, threshold, list_gene_names):
+        """Filter the listed genes by threshold with the genes split across workers."""
+        list_gene_names = list(list_gene_names)
+        dict_above_threshold = {}
+        for part in self.map_shards(
+                'genes_above_threshold',
+                lambda first, last: (threshold, list_gene_names[first:last]),
+                len(list_gene_names)):
+            dict_above_threshold.update(part)
+        return dict_above_threshold
+
+    def sorted_gene_values(self, list_gene_names):
+        """Sort the values of the listed genes with the genes split across workers."""
+        list_gene_names = list(list_gene_names)
+        sorted_values = []
+        for part in self.map_shards(
+                'sorted_gene_values',
+                lambda first, last: (list_gene_names[first:last],),
+                len(list_gene_names)):
+            sorted_values.extend(part)
+        return sorted_values
@@ -0,0 +1,318 @@
+"""Module for running the analysis as overlapped parse, compute and report stages."""
+
+import io
+import os
+import queue
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from operator import add
+
+from cache_class import BinaryCache
+from expression_class import (
+    CHUNK_SIZE, iter_expression_rows, load_statistics, parse_header, parse_shard, profile_row)
+from report_class import REPORT_FOOTERS, REPORT_HEADERS
+from shard_class import is_compressed
+
+# Number of parsed chunks or report sections a stage may hold before its producer waits
+PIPELINE_DEPTH = 8
+
+# Size in bytes of the row ranges an uncompressed shard is split into for the parse workers
+PIPELINE_CHUNK_BYTES = CHUNK_SIZE
+
+# Seconds between two checks of the stop flag by a producer waiting on a full queue
+POLL_SECONDS = 0.1
+
+
+def available_cpus():
+    """Return the number of CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run_inline(function, *args):
+    """Run function(*args) at once and returns a finished Future holding its result."""
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def parse_range(path, start, stop, n_genes, typecode='d'):
+    """
+    Parse the rows stored in bytes start..stop of an uncompressed shard,
+    which begin and end on line boundaries. Runs in a parse worker and
+    returns the sample IDs, sample types, rows as one array, their
+    profile_row profiles and the number of bytes read.
+    """
+    with open(path, 'rb') as shard_file:
+        shard_file.seek(start)
+        text = shard_file.read(stop - start).decode('utf-8')
+    matrix = array(typecode)
+    sample_ids = []
+    sample_types = []
+    sample_profiles = []
+    for sample, gene_type, row in iter_expression_rows(io.StringIO(text), n_genes, typecode):
+        matrix.extend(row)
+        sample_ids.append(sample)
+        sample_types.append(gene_type)
+        sample_profiles.append(profile_row(row))
+    return sample_ids, sample_types, matrix, sample_profiles, stop - start
+
+
+def parse_compressed(path, gene_names, typecode='d'):
+    """
+    Parse a whole compressed shard, which cannot be split by byte ranges,
+    in a parse worker and returns the same values as parse_range.
+    """
+    keys, sample_ids, sample_types, matrix, stats, sample_profiles = parse_shard(path, typecode)
+    if keys != gene_names:
+        raise ValueError(f"The gene columns of {path} differ from the first shard")
+    return sample_ids, sample_types, matrix, sample_profiles, stats["bytes"]
+
+
+def row_ranges(path, chunk_bytes=PIPELINE_CHUNK_BYTES):
+    """
+    Return the header line of an uncompressed shard and the (start, stop)
+    byte ranges of about chunk_bytes its rows are split into, each ending
+    at the end of a line.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as shard_file:
+        header = shard_file.readline().decode('utf-8')
+        start = shard_file.tell()
+        while start < size:
+            shard_file.seek(min(start + chunk_bytes, size))
+            if shard_file.tell() < size:
+                shard_file.readline()
+            stop = shard_file.tell()
+            ranges.append((start, stop))
+            start = stop
+    return header, ranges
+
+
+class StageThread(threading.Thread):
+    """Thread running one pipeline stage; join() raises the exception that stopped it."""
+
+    def __init__(self, target, *args):
+        """Initialize a daemon thread calling target(*args)."""
+        super().__init__(daemon=True)
+        self.target = target
+        self.args = args
+        self.error = None
+
+    def run(self):
+        """Run the stage and keep its exception for join()."""
+        try:
+            self.target(*self.args)
+        except BaseException as error:
+            self.error = error
+
+    def join(self, timeout=None):
+        """Wait for the stage to finish and raise its exception, if any."""
+        super().join(timeout)
+        if self.error is not None:
+            raise self.error
+
+
+def put_item(stage_queue, item, stopped):
+    """
+    Put item on a bounded queue, waiting while it is full, which holds the
+    producer back (backpressure). Returns False without putting it when the
+    consumer has stopped.
+    """
+    while not stopped.is_set():
+        try:
+            stage_queue.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class AnalysisPipeline:
+    """
+    Run the parse, compute and report stages of an analysis concurrently.
+
+    load() splits the shards of a data set opened in 'stream' mode into
+    line-aligned byte ranges of about ``chunk_bytes`` (a compressed
+    shard is one task) and parses them in ``workers`` processes, which also
+    take the sample profiles. The main process appends each parsed chunk
+    to the matrix and folds it into the HCC and normal group sums, in row
+    order, while the workers parse the next chunks. With a single CPU
+    there is nothing to overlap, so the chunks are parsed in the main
+    process without the cost of a pool. write_sections() writes
+    each finished report section in a writer thread while the next one is
+    computed. At most ``depth`` chunks or sections wait between two stages,
+    so a fast stage waits for a slow one instead of filling memory.
+
+    A valid binary sidecar of a single file is used instead of parsing, and
+    a parsed single file gets its sidecar, as in 'memory' mode. The results
+    are the same as a sequential run.
+    """
+
+    def __init__(self, expression_obj, depth=PIPELINE_DEPTH, chunk_bytes=PIPELINE_CHUNK_BYTES):
+        """
+        Initialize with a GeneExpressionData object in 'stream' mode, the
+        queue depth and the size of the parsed byte ranges.
+        """
+        if expression_obj.mode != 'stream':
+            raise ValueError("The pipeline parses a data set opened in 'stream' mode")
+        self.expression_obj = expression_obj
+        self.depth = depth
+        self.chunk_bytes = chunk_bytes
+        self.sums_hcc = None  # Group sums of every gene, folded in while parsing
+        self.sums_normal = None
+        self.data_version = None  # data_version of the data the group sums describe
+
+    def iter_tasks(self):
+        """Yield the (function, *arguments) parse task of every chunk, in sample order."""
+        expression_obj = self.expression_obj
+        gene_names = expression_obj.gene_names
+        for path in expression_obj.shards:
+            if is_compressed(path):
+                yield parse_compressed, path, gene_names, expression_obj.typecode
+                continue
+            header, ranges = row_ranges(path, self.chunk_bytes)
+            if parse_header(header) != gene_names:
+                raise ValueError(
+                    f"The gene columns of {path} differ from {expression_obj.shards[0]}")
+            for start, stop in ranges:
+                yield parse_range, path, start, stop, len(gene_names), expression_obj.typecode
+
+    def load_cache(self):
+        """Install the dataset from a valid sidecar of a single file; returns whether it did."""
+        expression_obj = self.expression_obj
+        if not expression_obj.use_cache or len(expression_obj.shards) != 1:
+            return False
+        start = time.perf_counter()
+        cache = BinaryCache(expression_obj.shards[0], expression_obj.typecode)
+        cached = cache.load()
+        if cached is None:
+            return False
+        keys, sample_ids, sample_types, matrix = cached
+        expression_obj.load_stats = load_statistics(
+            len(sample_ids), os.path.getsize(cache.cache_path),
+            time.perf_counter() - start, "cache")
+        expression_obj.set_matrix(matrix, keys, sample_ids, sample_types, cache.sample_profiles)
+        return True
+
+    def load(self):
+        """
+        Load the data set with the parse workers and the accumulator
+        overlapped and install the matrix in the data object, which can
+        then be used like one loaded in 'memory' mode. Returns the data object.
+        """
+        expression_obj = self.expression_obj
+        try:
+            if self.load_cache():
+                expression_obj.mode = 'memory'
+                return expression_obj
+        except FileNotFoundError:
+            raise FileNotFoundError("There is not any file.")
+        start = time.perf_counter()
+        n_genes = len(expression_obj.gene_names)
+        matrix = array(expression_obj.typecode)
+        sample_ids = []
+        sample_types = []
+        sample_profiles = []
+        sums_hcc = [0.0] * n_genes
+        sums_normal = [0.0] * n_genes
+        n_bytes = 0
+        pending = deque()  # Submitted chunks, in sample order, at most depth of them
+
+        def accumulate(future):
+            nonlocal sums_hcc, sums_normal, n_bytes
+            ids, types, chunk, profiles, chunk_bytes = future.result()
+            matrix.extend(chunk)
+            sample_ids.extend(ids)
+            sample_types.extend(types)
+            sample_profiles.extend(profiles)
+            n_bytes += chunk_bytes
+            # Rows are added in file order, like group_sums would
+            for row, gene_type in enumerate(types):
+                if gene_type == 'HCC':
+                    sums_hcc = list(map(add, sums_hcc, chunk[row * n_genes:(row + 1) * n_genes]))
+                elif gene_type == 'normal':
+                    sums_normal = list(map(add, sums_normal,
+                                           chunk[row * n_genes:(row + 1) * n_genes]))
+
+        pool = None
+        if available_cpus() > 1:
+            pool = ProcessPoolExecutor(max(expression_obj.workers, 1))
+        submit = pool.submit if pool is not None else run_inline
+        try:
+            for function, *args in self.iter_tasks():
+                pending.append(submit(function, *args))
+                if len(pending) >= self.depth:
+                    accumulate(pending.popleft())
+            while pending:
+                accumulate(pending.popleft())
+        except FileNotFoundError:
+            raise FileNotFoundError("There is not any file.")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if expression_obj.use_cache and len(expression_obj.shards) == 1:
+            try:
+                BinaryCache(expression_obj.shards[0], expression_obj.typecode).save(
+                    expression_obj.gene_names, sample_ids, sample_types, matrix,
+                    sample_profiles)
+            except OSError:
+                pass  # The cache is only a speed-up
+        expression_obj.mode = 'memory'
+        expression_obj.load_stats = load_statistics(
+            len(sample_ids), n_bytes, time.perf_counter() - start, "pipeline")
+        expression_obj.set_matrix(matrix, expression_obj.gene_names, sample_ids,
+                                  sample_types, sample_profiles)
+        self.sums_hcc = sums_hcc
+        self.sums_normal = sums_normal
+        self.data_version = expression_obj.data_version
+        return expression_obj
+
+    def seed_statistics(self, statistical_analysis):
+        """
+        Store the group sums folded in while parsing in the statistics cache
+        of an analysis, unless the data was read from the sidecar or changed
+        since (e.g. appended samples).
+        """
+        if self.sums_hcc is None or self.data_version != self.expression_obj.data_version:
+            return
+        statistical_analysis.memo(None, "sums", "HCC", lambda: self.sums_hcc)
+        statistical_analysis.memo(None, "sums", "normal", lambda: self.sums_normal)
+
+    def write_report(self, report_obj, sections, stopped):
+        """Writer stage: write every section taken from sections until None."""
+        try:
+            while True:
+                section = sections.get()
+                if section is None:
+                    return
+                report_obj.generate_report(*section)
+        finally:
+            stopped.set()
+
+    def write_sections(self, report_obj, data):
+        """
+        Compute the sections of a full analysis report from the iterable
+        data, one item per REPORT_HEADERS entry in order, and write each one
+        with report_obj in a writer thread while the next is computed.
+        """
+        sections = queue.Queue(self.depth)
+        stopped = threading.Event()
+        writer = StageThread(self.write_report, report_obj, sections, stopped)
+        writer.start()
+        try:
+            for section in zip(REPORT_HEADERS, data, REPORT_FOOTERS):
+                if not put_item(sections, section, stopped):
+                    break
+        finally:
+            put_item(sections, None, stopped)
+            writer.join()
@@ -0,0 +1,166 @@
+"""Module for per-stage profiling of the analysis pipeline."""
+
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# StatisticalAnalysis methods recorded by Profiler.instrument
+PROFILED_METHODS = (
+    'calculate_mean', 'calculate_median', 'calculate_standard_deviation_variance',
+    'calculate_mean_gene_hcc', 'calculate_mean_gene_normal', 'calculate_differential',
+    'calculate_fold_changes', 'compare_differential_numbers', 'summarize_genes',
+    'significance_tests', 'compare_significance_numbers', 'get_high_threshold',
+    'sample_min_max',
+)
+
+# Context manager of a disabled profiler; reused, so a disabled stage costs one call
+DISABLED_STAGE = nullcontext({})
+
+
+def count_items(value):
+    """Return the number of items of a sized argument or result, or None."""
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Profiler:
+    """
+    Record wall time, CPU time, peak memory and item counts of pipeline
+    stages and of StatisticalAnalysis calls.
+
+    Stages are opened with ``with profiler.stage(name):`` and may nest;
+    instrument() wraps the analysis methods of one object so every call is
+    recorded as a stage named 'call:<method>'. Each finished record is
+    passed to the hooks added with add_hook, and trace() returns all of them
+    as a JSON-ready dictionary. With trace_memory, tracemalloc runs while
+    the profiler is active and peak_bytes is the highest traced memory of
+    the stage above its start. One stage named cprofile_stage can also be
+    run under cProfile (its first run) and dumped to cprofile_path.
+
+    A profiler created with enabled=False records nothing: stage() returns
+    a shared no-op context manager and instrument() leaves the object as it is.
+    """
+
+    def __init__(self, enabled=True, trace_memory=True, cprofile_stage=None,
+                 cprofile_path=None):
+        """Initialize an empty profile."""
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.cprofile_stage = cprofile_stage
+        self.cprofile_path = cprofile_path
+        self.records = []
+        self.hooks = []
+        self.open_stages = []  # Records of the stages currently running, outermost first
+        self.started = time.perf_counter()
+        self.started_tracing = False
+        self.cprofile_done = False  # Only the first run of cprofile_stage is profiled
+
+    def add_hook(self, hook):
+        """Call hook(record) with the record of every stage that finishes."""
+        self.hooks.append(hook)
+
+    def start_memory(self):
+        """Start tracemalloc on the first stage unless it is already running."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        """Stop tracemalloc if this profiler started it."""
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def stage(self, name, items=None):
+        """Return a context manager recording the stage name; it yields the stage record."""
+        if not self.enabled:
+            return DISABLED_STAGE
+        return self.record_stage(name, items)
+
+    @contextmanager
+    def record_stage(self, name, items):
+        """Record one stage; the caller may set record["items"] inside the block."""
+        self.start_memory()
+        parent = self.open_stages[-1] if self.open_stages else None
+        record = {
+            "name": name,
+            "parent": parent["name"] if parent else None,
+            "depth": len(self.open_stages),
+            "start_s": time.perf_counter() - self.started,
+            "items": items,
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                # reset_peak() below would lose the parent's peak so far
+                parent["peak_seen"] = max(parent["peak_seen"], peak)
+            tracemalloc.reset_peak()
+            record["memory_start"], record["peak_seen"] = current, current
+        profile = None
+        if name == self.cprofile_stage and self.cprofile_path and not self.cprofile_done:
+            profile = cProfile.Profile()
+            self.cprofile_done = True
+        self.open_stages.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self.cprofile_path)
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            self.open_stages.pop()
+            record["peak_bytes"] = None
+            if "memory_start" in record and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], record.pop("peak_seen"))
+                record["peak_bytes"] = peak - record.pop("memory_start")
+                if parent is not None:
+                    parent["peak_seen"] = max(parent["peak_seen"], peak)
+            self.records.append(record)
+            for hook in self.hooks:
+                hook(record)
+
+    def instrument(self, analysis, method_names=PROFILED_METHODS):
+        """
+        Record every call of the named methods of one analysis object as a
+        stage 'call:<method>' whose items is the size of the first argument.
+        """
+        if not self.enabled:
+            return analysis
+        for method_name in method_names:
+            method = getattr(analysis, method_name, None)
+            if method is not None:
+                setattr(analysis, method_name, self.wrap(method_name, method))
+        return analysis
+
+    def wrap(self, method_name, method):
+        """Return method wrapped in a 'call:<method_name>' stage."""
+        @functools.wraps(method)
+        def profiled(*args, **kwargs):
+            with self.record_stage(f"call:{method_name}",
+                                   count_items(args[0]) if args else None):
+                return method(*args, **kwargs)
+        return profiled
+
+    def trace(self):
+        """Return the recorded stages, in the order they finished, as a dictionary."""
+        return {
+            "total_wall_s": time.perf_counter() - self.started,
+            "trace_memory": self.trace_memory,
+            "cprofile_stage": self.cprofile_stage,
+            "stages": self.records,
+        }
+
+    def write(self, path):
+        """Write the trace to path as JSON."""
+        with open(path, 'w', encoding='utf-8') as trace_file:
+            json.dump(self.trace(), trace_file, indent=2)
+            trace_file.write("\n")
@@ -1,9 +1,93 @@
+"""Module for writing analysis reports to the screen or to a file."""
+
+import bz2
+import gzip
+import json
+import lzma
+import sys
+
+# Openers for compressed report files, chosen by file extension
+COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+# Headers and footers of the sections of a full analysis report, in order
+REPORT_HEADERS = [
+    "List of all sample names:",
+    "List of all gene names:",
+    "Mean dictionary of desired genes:",
+    "Median dictionary of desired genes:",
+    "Variance dictionary of desired genes:",
+    "Standard deviation of desired genes:",
+    "Ratio differential of desired genes:",
+    "Gene names with most expression differential:",
+    "N Gene names above the threshold:",
+    "Minimum expression list for each sample:",
+    "Maximum expression list for each sample:"
+]
+
+REPORT_FOOTERS = [
+    "End of sample names list",
+    "End of gene names list",
+    "End of mean of desired genes",
+    "End of median of desired genes",
+    "End of variance of desired genes",
+    "End of standard deviation of desired genes",
+    "End of differential ratios of desired genes",
+    "End of most differential genes",
+    "End of N genes above thershold",
+    "End of minimum expressions",
+    "End of maximum expressions"
+]
+
+
 class AnalysisReport:
-    """Class for generating formatted analysis reports."""
+    """
+    Class for generating formatted analysis reports.
+
+    The destination is opened once, on the first section, and every section
+    is written piece by piece as it is formatted, so a report never has to
+    fit in memory. Output formats are 'text' (the formatted tables), 'tsv'
+    and 'jsonl'; file destinations ending in .gz, .bz2 or .xz are compressed.
+    Use the report as a context manager (or call close) to finish the file.
+    """
 
-    def __init__(self, destination):
+    def __init__(self, destination, output_format='text'):
         """Initialize report generator with output destination('screen' or file path)."""
+        if output_format not in ('text', 'tsv', 'jsonl'):
+            raise ValueError(f"Unknown report format {output_format}")
         self.destination = destination
+        self.output_format = output_format
+        self.sink = None  # Open output stream, created on the first write
+
+    def __enter__(self):
+        """Return the report for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the destination when leaving a with statement."""
+        self.close()
+
+    def open(self):
+        """Open the destination once and returns the stream to write to."""
+        if self.sink is None:
+            if self.destination == 'screen':
+                self.sink = sys.stdout
+            else:
+                opener = next((opener for suffix, opener in COMPRESSED_OPENERS.items()
+                               if self.destination.endswith(suffix)), None)
+                if opener is None:
+                    self.sink = open(self.destination, 'w', encoding='utf-8')
+                else:
+                    self.sink = opener(self.destination, 'wt', encoding='utf-8')
+        return self.sink
+
+    def close(self):
+        """Flush the report and close the destination file."""
+        if self.sink is not None:
+            if self.sink is sys.stdout:
+                self.sink.flush()
+            else:
+                self.sink.close()
+            self.sink = None
 
     def create_header(self, text):
         """Create formatted header with asterisk border."""
@@ -15,53 +99,94 @@ class AnalysisReport:
         # Create and return the footer string
         return "\n" + "=" * 35 + end_words + "=" * 35 + "\n End of Report\n"
 
-    def report_dict(self, data_dic):
-        """Format dictionary data as table with centered columns."""
-        output = 112* "-" + "\n"
+    def iter_dict(self, data_dic):
+        """Yield the rows of a dictionary formatted as a table with centered columns."""
+        yield 112* "-" + "\n"
          # Iterate over each key-value pair in the provided dictionary
         for key, value in data_dic.items():
             # Add a formatted row for each key-value pair, centering the key and value
-            output += f"|{key.center(15, ' ')} | {str(value).center(97, ' ')} |\n{112 * '-'}\n"
-             # Return the formatted output string
-        return output
+            yield f"|{key.center(15, ' ')} | {str(value).center(97, ' ')} |\n{112 * '-'}\n"
 
-    def report_lst(self, data_lst):
-        """Format list with line breaks every 3 items."""
-        # Initialize an empty string to hold the formatted result
-        result = ""
+    def report_dict(self, data_dic):
+        """Format dictionary data as table with centered columns."""
+        return "".join(self.iter_dict(data_dic))
+
+    def iter_lst(self, data_lst):
+        """Yield the items of a list padded to 40 characters, with a line break every 3."""
         # Iterate over each item in the provided list with its index
         for idx, item in enumerate(data_lst):
-            # Add the item to the result followed by spaces to align to a width of 40 characters
-            result += item + (40-len(item))*" "
+            # Add the item followed by spaces to align to a width of 40 characters
+            yield item + (40-len(item))*" "
             # Check if the current index + 1 is a multiple of 3 to add a line break
             if (idx + 1) % 3 == 0:
-                result += '\n'
-                # Return the formatted result string
-        return result
+                yield '\n'
 
-    def write_content(self, content):
-        """Write content to the specified destination (screen or file)."""
-        # Check if the destination is set to 'screen'
-        if self.destination == 'screen':
-            # Print the content to the console
-            print(content)
-        else:
-            # Open the specified file in write mode with UTF-8 encoding
-            with open(self.destination, 'w', encoding='utf-8') as file:
-                # Write the content to the file, adding a newline at the end
-                file.write(content + "\n")
+    def report_lst(self, data_lst):
+        """Format list with line breaks every 3 items."""
+        return "".join(self.iter_lst(data_lst))
 
-    def generate_report(self, header, data, footer):
-        """Generate complete report with header, formatted data and footer."""
-        result = ""  # Initialize an empty string to store the report content
+    def iter_text(self, header, data, footer):
+        """Yield the formatted text report of one section."""
         # Check if the data is a dictionary
         if isinstance(data, dict):
             # Create the report with header, formatted dictionary data, and footer
-            result = f"{self.create_header(header)}\n{self.report_dict(data)}\n\
-                  {self.create_footer(footer)}"
+            yield f"{self.create_header(header)}\n"
+            yield from self.iter_dict(data)
+            yield f"\n{' ' * 18}{self.create_footer(footer)}\n"
         elif isinstance(data, list):
             # Create the report with header, formatted list data, and footer
-            result = f"{self.create_header(header)}\n{self.report_lst(data)}\n\
-            {self.create_footer(footer)}\n"
-        # Write the generated report content to the specified destination
-        self.write_content(result)
\ No newline at end of file
+            yield f"{self.create_header(header)}\n"
+            yield from self.iter_lst(data)
+            yield f"\n{' ' * 12}{self.create_footer(footer)}\n\n"
+        else:
+            yield "\n"
+
+    def iter_tsv(self, header, data):
+        """Yield one section as tab-separated rows after a '#' header line."""
+        yield f"# {header}\n"
+        if isinstance(data, dict):
+            for key, value in data.items():
+                yield f"{key}\t{value}\n"
+        elif isinstance(data, list):
+            for item in data:
+                yield f"{item}\n"
+        yield "\n"
+
+    def iter_jsonl(self, header, data):
+        """
+        Yield one section as JSON lines, one object per entry. A leading
+        title entry of a dictionary names the key and value fields.
+        """
+        if isinstance(data, dict):
+            key_name, value_name = "key", "value"
+            items = iter(data.items())
+            first = next(iter(data.items()), None)
+            if first is not None and isinstance(first[1], str):
+                key_name, value_name = next(items)
+            for key, value in items:
+                yield json.dumps({"section": header, key_name: key, value_name: value}) + "\n"
+        elif isinstance(data, list):
+            for item in data:
+                yield json.dumps({"section": header, "value": item}) + "\n"
+
+    def write_content(self, content):
+        """Write content to the specified destination (screen or file)."""
+        self.open().write(content + "\n")
+
+    def generate_report(self, header, data, footer):
+        """Generate complete report with header, formatted data and footer."""
+        if self.output_format == 'tsv':
+            chunks = self.iter_tsv(header, data)
+        elif self.output_format == 'jsonl':
+            chunks = self.iter_jsonl(header, data)
+        else:
+            chunks = self.iter_text(header, data, footer)
+        # Write the report piece by piece to the destination opened once
+        sink = self.open()
+        for chunk in chunks:
+            sink.write(chunk)
+
+    def generate_sections(self, data):
+        """Write the sections of a full analysis report, one per REPORT_HEADERS entry."""
+        for header, item, footer in zip(REPORT_HEADERS, data, REPORT_FOOTERS):
+            self.generate_report(header, item, footer)
@@ -0,0 +1,71 @@
+"""Module for the replicate helpers of the fold-change resampling engine."""
+
+import random
+from collections import Counter
+from operator import add
+
+# Resampling schemes of StatisticalAnalysis.resample_fold_changes
+RESAMPLING_KINDS = ('bootstrap', 'permutation')
+
+
+def replicate_random(seed, replicate):
+    """
+    Return the random generator of one replicate. Its seed depends only on
+    the run seed and the replicate number, so a replicate draws the same
+    samples whichever worker runs it.
+    """
+    return random.Random(f"{seed}:{replicate}")
+
+
+def replicate_weights(kind, rng, hcc_rows, normal_rows):
+    """
+    Return the HCC and normal row weights of one replicate as Counters of
+    row -> number of draws.
+
+    'bootstrap' draws each group's rows with replacement within the group;
+    'permutation' shuffles the HCC and normal labels over their rows.
+    """
+    if kind == 'bootstrap':
+        return (Counter(rng.choices(hcc_rows, k=len(hcc_rows))),
+                Counter(rng.choices(normal_rows, k=len(normal_rows))))
+    pooled = hcc_rows + normal_rows
+    rng.shuffle(pooled)
+    return Counter(pooled[:len(hcc_rows)]), Counter(pooled[len(hcc_rows):])
+
+
+def fold_change_scores(sums_hcc, sums_normal, n_hcc, n_normal):
+    """
+    Return the differential score of every gene from its group sums,
+    computed like compare_differential_numbers: the HCC/normal ratio of the
+    group means, both rounded to 3 decimals, rounded to 3 decimals and
+    inverted when below 1, so the observed ranking is its top-N order. A
+    gene with a non-positive rounded group mean scores 0 and ranks last.
+    """
+    scores = []
+    for total_hcc, total_normal in zip(sums_hcc, sums_normal):
+        mean_hcc = round(total_hcc / n_hcc, 3)
+        mean_normal = round(total_normal / n_normal, 3)
+        if mean_hcc > 0 and mean_normal > 0:
+            ratio = round(mean_hcc / mean_normal, 3)
+            scores.append(float(ratio) if ratio > 1 else round(1 / ratio, 3))
+        else:
+            scores.append(0.0)
+    return scores
+
+
+def score_ranks(scores):
+    """Return the 1-based rank of every score, highest first and ties in gene order."""
+    ranks = [0] * len(scores)
+    for rank, col in enumerate(sorted(range(len(scores)), key=scores.__getitem__,
+                                      reverse=True), start=1):
+        ranks[col] = rank
+    return ranks
+
+
+def merge_counts(parts):
+    """Add up the per-gene count lists of several replicate ranges, key by key."""
+    merged = {}
+    for part in parts:
+        for key, counts in part.items():
+            merged[key] = list(map(add, merged[key], counts)) if key in merged else counts
+    return merged
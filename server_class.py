@@ -0,0 +1,181 @@
+"""Module for serving analysis queries over HTTP from a dataset loaded once."""
+
+import json
+import math
+import os
+import stat
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+from urllib.parse import parse_qs, urlparse
+
+from except_class import InputError
+
+
+def strip_title(data_dict):
+    """Return a dictionary without its leading title entry, if it has one."""
+    items = list(data_dict.items())
+    if items and isinstance(items[0][1], str):
+        items = items[1:]
+    return dict(items)
+
+
+def json_safe(value):
+    """Return value with NaN and infinite floats replaced by None, which JSON allows."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    return value
+
+
+def remove_socket(address):
+    """Remove a stale Unix socket at address; refuse to touch any other kind of file."""
+    try:
+        mode = os.stat(address).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise InputError(f"{address} exists and is not a socket")
+    os.remove(address)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Request handler answering GET queries with JSON.
+
+    Paths are /genes, /samples, /mean, /median, /variance, /mean_hcc,
+    /mean_normal, /differential and /summary (with ?genes=a,b), /top and
+    /significance (with ?number=N, and test=welch or mannwhitney), /threshold (with ?value=T and optional mode and top_k) and
+    /minmax. Results are the dictionaries of StatisticalAnalysis without
+    their title entries; missing values (NaN) are sent as null. /median
+    uses calculate_median, the same value as the text report, while the
+    "median" of /summary is the exact median from summarize_genes; the
+    two can differ for the same gene.
+    """
+
+    def address_string(self):
+        """Return the client address; Unix sockets have no host name."""
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return 'unix-socket'
+
+    def send_json(self, status, body):
+        """Send a JSON response with the given HTTP status."""
+        payload = json.dumps(json_safe(body), allow_nan=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer one query."""
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        answer = self.server.query_server.queries.get(url.path.strip('/'))
+        if answer is None:
+            self.send_json(404, {"error": f"Unknown query {url.path}"})
+            return
+        try:
+            self.send_json(200, answer(query))
+        except (KeyError, ValueError, ZeroDivisionError) as error:
+            self.send_json(400, {"error": str(error)})
+
+
+class QueryServer:
+    """
+    Long-running server that keeps one dataset and its StatisticalAnalysis
+    loaded and answers analysis queries from concurrent clients.
+
+    Every request is handled on its own thread. The expression data is only
+    read; a ParallelAnalysis must be started before serving (serve_queries
+    in final_main does this) so that concurrent first queries do not each
+    start a process pool. Listens on TCP (host, port) or on a Unix socket
+    when given a socket path.
+    """
+
+    def __init__(self, statistical_analysis):
+        """Initialize with the analysis object of the loaded dataset."""
+        self.statistical_analysis = statistical_analysis
+        self.expression_obj = statistical_analysis.expression_obj
+        self.queries = {
+            "genes": lambda query: self.expression_obj.gene_names,
+            "samples": lambda query: list(self.expression_obj.dict_sample),
+            "mean": lambda query: strip_title(
+                statistical_analysis.calculate_mean(self.genes(query))),
+            "median": lambda query: strip_title(
+                statistical_analysis.calculate_median(self.genes(query))),
+            "variance": self.variance,
+            "mean_hcc": lambda query: strip_title(
+                statistical_analysis.calculate_mean_gene_hcc(self.genes(query))),
+            "mean_normal": lambda query: strip_title(
+                statistical_analysis.calculate_mean_gene_normal(self.genes(query))),
+            "differential": lambda query: strip_title(
+                statistical_analysis.calculate_differential(self.genes(query))),
+            "summary": lambda query: statistical_analysis.summarize_genes(self.genes(query)),
+            "top": lambda query: strip_title(statistical_analysis.compare_differential_numbers(
+                self.expression_obj.gene_names, int(query.get("number", 10)))),
+            "significance": lambda query: strip_title(
+                statistical_analysis.compare_significance_numbers(
+                    self.expression_obj.gene_names, int(query.get("number", 10)),
+                    query.get("test", "welch"))),
+            "threshold": lambda query: strip_title(statistical_analysis.get_high_threshold(
+                float(query["value"]), query.get("mode", "values"),
+                int(query["top_k"]) if "top_k" in query else None)),
+            "coexpression": lambda query: statistical_analysis.coexpression(
+                self.genes(query) if query.get("genes") else None, int(query.get("k", 10)),
+                query.get("method", "pearson"), int(query.get("number", 10))),
+            "groups": lambda query: statistical_analysis.compare_groups(
+                self.genes(query) if query.get("genes") else None,
+                query["groups"].split(',') if query.get("groups") else None),
+            "stability": lambda query: statistical_analysis.resample_fold_changes(
+                query.get("kind", "bootstrap"), int(query.get("replicates", 1000)),
+                int(query.get("number", 10)), int(query.get("seed", 0))),
+            "minmax": self.sample_min_max,
+            "qc": lambda query: self.expression_obj.dict_sample_profile(),
+        }
+
+    def genes(self, query):
+        """Return the list of gene names of a query."""
+        if not query.get("genes"):
+            raise ValueError("No gene names provided")
+        return [name.strip() for name in query["genes"].split(',')]
+
+    def variance(self, query):
+        """Return the variance and standard deviation of the queried genes."""
+        dict_var, dict_std_dev = (
+            self.statistical_analysis.calculate_standard_deviation_variance(self.genes(query)))
+        return {"variance": strip_title(dict_var), "std": strip_title(dict_std_dev)}
+
+    def sample_min_max(self, query):
+        """Return the minimum and maximum expression of every sample, from the sample profiles."""
+        dict_min, dict_max = self.statistical_analysis.sample_min_max()
+        return {"min": strip_title(dict_min), "max": strip_title(dict_max)}
+
+    def make_server(self, address):
+        """Create the socket server for 'host:port', 'port' or a Unix socket path."""
+        if os.sep in address or address.endswith('.sock'):
+            remove_socket(address)
+            server = ThreadingUnixStreamServer(address, QueryHandler)
+        else:
+            host, _, port = address.rpartition(':')
+            server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), QueryHandler)
+        server.daemon_threads = True
+        server.query_server = self
+        return server
+
+    def serve(self, address):
+        """Answer queries on address until interrupted."""
+        server = self.make_server(address)
+        print(f"Serving {len(self.expression_obj.gene_names)} genes and "
+              f"{len(self.expression_obj.sample_ids)} samples on {address}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if isinstance(server, ThreadingUnixStreamServer):
+                remove_socket(address)
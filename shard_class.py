@@ -0,0 +1,70 @@
+"""Module for finding and opening the shards of a data set, compressed or not."""
+
+import bz2
+import glob
+import gzip
+import lzma
+import os
+
+try:
+    from compression import zstd  # Python 3.14 and later
+except ImportError:
+    try:
+        import zstandard as zstd  # Optional: only needed for .zst shards
+    except ImportError:
+        zstd = None
+
+# Opener of every supported compression suffix; each decompresses while reading
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.zst': zstd.open if zstd is not None else None,
+}
+
+# File names taken from a shard directory
+SHARD_SUFFIXES = tuple('.csv' + suffix for suffix in ('', *OPENERS))
+
+
+def is_compressed(path):
+    """Check whether the path names a compressed file."""
+    return str(path).endswith(tuple(OPENERS))
+
+
+def open_shard(path):
+    """
+    Open a shard for reading text, decompressing .gz, .bz2, .xz and .zst
+    files on the fly, so no decompressed copy is written to disk.
+    """
+    path = str(path)
+    for suffix, opener in OPENERS.items():
+        if path.endswith(suffix):
+            if opener is None:
+                raise ValueError(f"Reading {path} needs the zstandard package")
+            return opener(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def resolve_shards(source):
+    """
+    Return the list of shard paths of a data source, in sample order.
+
+    The source is a list of paths (kept in its order), a comma-separated
+    string of paths, a directory (its .csv files, compressed or not, sorted
+    by name), a glob pattern (the sorted matches) or one file path.
+    """
+    if isinstance(source, (list, tuple)):
+        return [str(path) for path in source]
+    source = str(source)
+    if ',' in source and not os.path.exists(source):
+        return [path.strip() for path in source.split(',') if path.strip()]
+    if os.path.isdir(source):
+        shards = sorted(entry.path for entry in os.scandir(source)
+                        if entry.is_file() and entry.name.endswith(SHARD_SUFFIXES))
+    elif glob.has_magic(source):
+        shards = sorted(glob.glob(source))
+    else:
+        return [source]
+    if not shards:
+        raise FileNotFoundError(f"No data files match {source}")
+    return shards
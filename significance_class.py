@@ -0,0 +1,139 @@
+"""Module for the significance tests and multiple testing correction of gene comparisons."""
+
+import math
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import repeat
+
+# Convergence settings of the incomplete beta continued fraction
+BETA_EPSILON = 1e-15
+BETA_MAX_ITERATIONS = 300
+TINY = 1e-300
+
+
+def beta_fraction(a, b, x):
+    """Evaluate the continued fraction of the incomplete beta function (modified Lentz)."""
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c = 1.0
+    d = 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > TINY else TINY)
+    fraction = d
+    for m in range(1, BETA_MAX_ITERATIONS + 1):
+        m2 = 2 * m
+        # Even step
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > TINY else TINY)
+        c = 1.0 + aa / c
+        c = c if abs(c) > TINY else TINY
+        fraction *= d * c
+        # Odd step
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > TINY else TINY)
+        c = 1.0 + aa / c
+        c = c if abs(c) > TINY else TINY
+        delta = d * c
+        fraction *= delta
+        if abs(delta - 1.0) < BETA_EPSILON:
+            break
+    return fraction
+
+
+def regularized_beta(a, b, x):
+    """Return the regularized incomplete beta function I_x(a, b) for 0 <= x <= 1."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                 + a * math.log(x) + b * math.log1p(-x))
+    # The fraction converges fast for x below the mean of the distribution
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(log_front) * beta_fraction(a, b, x) / a
+    return 1.0 - math.exp(log_front) * beta_fraction(b, a, 1.0 - x) / b
+
+
+def student_t_two_sided(t_value, df):
+    """Return the two-sided p-value of a Student t statistic with df degrees of freedom."""
+    if math.isinf(t_value):
+        return 0.0
+    return regularized_beta(df / 2.0, 0.5, df / (df + t_value * t_value))
+
+
+def normal_two_sided(z_value):
+    """Return the two-sided p-value of a standard normal statistic."""
+    return math.erfc(abs(z_value) / math.sqrt(2.0))
+
+
+def welch_test(moments_a, moments_b):
+    """
+    Run Welch's unequal-variance t-test on two (count, mean, M2) triples and
+    returns (t statistic, degrees of freedom, two-sided p-value).
+
+    Both groups need at least 2 values. Two groups without any variance give
+    t = 0 and p = 1 when their means are equal, else an infinite t and p = 0.
+    """
+    count_a, mean_a, m2_a = moments_a
+    count_b, mean_b, m2_b = moments_b
+    if count_a < 2 or count_b < 2:
+        raise ValueError("Welch's t-test needs at least 2 values in each group")
+    error_a = m2_a / (count_a - 1) / count_a
+    error_b = m2_b / (count_b - 1) / count_b
+    error = error_a + error_b
+    difference = mean_a - mean_b
+    if error <= 0.0:
+        if difference == 0.0:
+            return 0.0, math.nan, 1.0
+        return math.copysign(math.inf, difference), math.nan, 0.0
+    t_value = difference / math.sqrt(error)
+    df = error * error / (error_a * error_a / (count_a - 1) + error_b * error_b / (count_b - 1))
+    return t_value, df, student_t_two_sided(t_value, df)
+
+
+def mann_whitney_test(values_a, values_b):
+    """
+    Run the two-sided Mann-Whitney U test of two lists of values and returns
+    (U of the first group, z statistic, p-value).
+
+    Both lists are ranked against one sorted copy of their values with
+    binary searches, which give tied values their average rank.
+    The p-value uses the normal approximation with tie and continuity
+    corrections, which suits groups of about 8 or more values.
+    """
+    count_a, count_b = len(values_a), len(values_b)
+    if not count_a or not count_b:
+        raise ValueError("The Mann-Whitney test needs values in both groups")
+    pooled = sorted(values_a + values_b)
+    count = count_a + count_b
+    # A value's average rank is the mean of its 1-based positions left+1..right
+    rank_sum_a = (sum(map(bisect_left, repeat(pooled), values_a))
+                  + sum(map(bisect_right, repeat(pooled), values_a)) + count_a) / 2.0
+    tie_term = 0.0
+    if len(set(pooled)) < count:
+        tie_term = sum(ties * ties * ties - ties for ties in Counter(pooled).values())
+    u_value = rank_sum_a - count_a * (count_a + 1) / 2.0
+    mean_u = count_a * count_b / 2.0
+    variance = count_a * count_b / 12.0 * ((count + 1) - tie_term / (count * (count - 1)))
+    if variance <= 0.0:
+        return u_value, 0.0, 1.0
+    shift = u_value - mean_u
+    z_value = math.copysign(max(abs(shift) - 0.5, 0.0), shift) / math.sqrt(variance)
+    return u_value, z_value, normal_two_sided(z_value)
+
+
+def benjamini_hochberg(p_values):
+    """
+    Return the Benjamini-Hochberg adjusted p-values (q-values) of a list of
+    p-values, in the same order; the false discovery rate of the genes with
+    q <= alpha is controlled at alpha.
+    """
+    count = len(p_values)
+    order = sorted(range(count), key=p_values.__getitem__, reverse=True)
+    q_values = [0.0] * count
+    running = 1.0
+    for position, index in enumerate(order):
+        rank = count - position
+        running = min(running, p_values[index] * count / rank)
+        q_values[index] = running
+    return q_values
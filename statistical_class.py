@@ -1,16 +1,123 @@
 """Module for statistical analysis of gene expression data."""
 
+import heapq
 import math
+from array import array
+from itertools import compress, repeat
+from operator import add, ge, mul, sub
+
+from coexpression_class import (
+    BLOCK_SIZE, COEXPRESSION_METHODS, push_partner, rank_transform, sumprod, unit_vector)
+from index_class import ThresholdIndex
+from memo_class import DEFAULT_CACHE_SIZE, StatisticsCache
+from resample_class import (
+    RESAMPLING_KINDS, fold_change_scores, replicate_random, replicate_weights, score_ranks)
+from significance_class import benjamini_hochberg, mann_whitney_test, welch_test
+from summary_class import StreamingSummary, merge_moments
+
+
+def select_kth(values, k):
+    """
+    Return the k-th smallest value (0-based) of a list with quickselect.
+
+    Each round keeps only the side of a median-of-three pivot that holds
+    the answer, so the expected cost is linear instead of a full sort.
+    """
+    while True:
+        pivot = sorted((values[0], values[len(values) // 2], values[-1]))[1]
+        lows = [value for value in values if value < pivot]
+        if k < len(lows):
+            values = lows
+            continue
+        n_not_high = len(values) - sum(1 for value in values if value > pivot)
+        if k < n_not_high:
+            return pivot
+        values = [value for value in values if value > pivot]
+        k -= n_not_high
+
+
+def select_median(values):
+    """Return the median of a non-empty list using quickselect."""
+    middle = len(values) // 2
+    if len(values) % 2:
+        return select_kth(values, middle)
+    return (select_kth(values, middle - 1) + select_kth(values, middle)) / 2
+
+
 #find_dict_desired_expression
 class StatisticalAnalysis:
     """
     A class for performing statistical analysis on gene expression data.
     Handles calculations for HCC (Hepatocellular Carcinoma) and normal tissue samples.
+
+    Per-gene results (means, medians, variances and group means) and the
+    genome-wide group sums are kept in a StatisticsCache of at most
+    cache_size entries, shared by all methods and emptied when the data
+    changes, so overlapping queries are only computed once.
     """
 
-    def __init__(self, expression_obj):
-        """Initialize with a gene expression data object."""
+    def __init__(self, expression_obj, cache_size=DEFAULT_CACHE_SIZE):
+        """Initialize with a gene expression data object and the size of the statistics cache."""
         self.expression_obj = expression_obj
+        self.stats_cache = StatisticsCache(cache_size)
+        self.threshold_index = None  # ThresholdIndex, built on the first threshold query
+        self.index_version = None  # data_version of the data the index was built from
+        self.scan_version = None  # data_version of the last full threshold scan
+        self.summary = None  # StreamingSummary kept current by append_samples
+        self.summary_version = None  # data_version the summary describes
+
+    def memo(self, gene_name, statistic, group, compute):
+        """Return the cached (gene_name, statistic, group) result, or compute() and cache it."""
+        self.stats_cache.validate(self.expression_obj.data_version)
+        return self.stats_cache.lookup((gene_name, statistic, group), compute)
+
+    def gene_values(self, gene_name):
+        """Return the HCC values of a gene followed by its normal values."""
+        return (self.expression_obj.dict_gene_hcc[gene_name]
+                + self.expression_obj.dict_gene_normal[gene_name])
+
+    def gene_mean(self, gene_name):
+        """Return the rounded mean of the HCC and normal values of a gene."""
+        def compute():
+            values = self.gene_values(gene_name)
+            if not values:
+                raise ValueError(f"No expressions for {gene_name}")
+            return round(sum(values) / len(values), 3)
+        return self.memo(gene_name, "mean", "all", compute)
+
+    def gene_median(self, gene_name):
+        """Return the rounded median of the HCC and normal values of a gene."""
+        def compute():
+            list_sort = sorted(self.gene_values(gene_name))
+            len_expression = len(list_sort)
+            # Calculate median based on odd/even length
+            if (len_expression % 2) == 0:
+                # For even length, average the two middle numbers
+                median = (list_sort[math.floor(len_expression / 2)] +
+                        list_sort[math.floor(len_expression / 2) + 1]) / 2
+            else:
+                # For odd length, take the middle number
+                median = list_sort[math.floor(len_expression/2) + 1]
+            return round(median, 3)
+        return self.memo(gene_name, "median", "all", compute)
+
+    def gene_variance(self, gene_name):
+        """Return the variance of the HCC and normal values of a gene around its rounded mean."""
+        def compute():
+            values = self.gene_values(gene_name)
+            mean = self.gene_mean(gene_name)
+            return sum((expr - mean)**2 for expr in values) / len(values)
+        return self.memo(gene_name, "variance", "all", compute)
+
+    def gene_group_mean(self, gene_name, group):
+        """Return the rounded mean of a gene over the samples of group ('HCC' or 'normal')."""
+        def compute():
+            if group == 'HCC':
+                values = self.expression_obj.dict_gene_hcc[gene_name]
+            else:
+                values = self.expression_obj.dict_gene_normal[gene_name]
+            return round(sum(values) / len(values), 3)
+        return self.memo(gene_name, "mean", group, compute)
 
     def calculate_mean(self, desired_gene):
         """
@@ -22,22 +129,14 @@ class StatisticalAnalysis:
         expressions_hcc = self.expression_obj.dict_gene_hcc
         expressions_normal = self.expression_obj.dict_gene_normal
 
-        dict_desired = {}
         mean_dict = {}
 
         # Calculate mean for each gene
         for gene_name in desired_gene:
             if gene_name not in expressions_hcc or gene_name not in expressions_normal:
                 raise ValueError(f"Gene {gene_name} not found")
-            # Combine expressions
-            dict_desired[gene_name] = expressions_hcc[gene_name] + expressions_normal[gene_name]
-
-            if not dict_desired[gene_name]:
-                raise ValueError(f"No expressions for {gene_name}")
-            # Calculate mean
-            total = sum(dict_desired[gene_name])
-            mean = total / len(dict_desired[gene_name])
-            mean_dict[gene_name] = round(mean, 3)
+            # Calculate mean of the combined expressions
+            mean_dict[gene_name] = self.gene_mean(gene_name)
 
             # Create a title dictionary for output formatting
             title_dict = {"Desired gene name": "Mean expression"}
@@ -54,7 +153,6 @@ class StatisticalAnalysis:
         expressions_hcc = self.expression_obj.dict_gene_hcc
         expressions_normal = self.expression_obj.dict_gene_normal
 
-        dict_desired = {}
         median_dict = {}
 
         # Calculate median for each gene
@@ -62,21 +160,8 @@ class StatisticalAnalysis:
             if gene_name not in expressions_hcc or gene_name not in expressions_normal:
                 raise ValueError(f"Gene {gene_name} not found")
 
-            # Get and sort expressions
-            dict_desired[gene_name] = expressions_hcc[gene_name] + expressions_normal[gene_name]
-            list_sort = sorted(dict_desired[gene_name])
-            len_expression = len(list_sort)
-
-            # Calculate median based on odd/even length
-            if (len_expression % 2) == 0:
-                # For even length, average the two middle numbers
-                median = (list_sort[math.floor(len_expression / 2)] +
-                        list_sort[math.floor(len_expression / 2) + 1]) / 2
-                median_dict[gene_name] = round(median, 3)
-            else:
-                # For odd length, take the middle number
-                median = list_sort[math.floor(len_expression/2) + 1]
-                median_dict[gene_name] = round(median, 3) 
+            # Calculate median of the sorted combined expressions
+            median_dict[gene_name] = self.gene_median(gene_name)
 
             # Create a title dictionary for output formatting
             title_dict = {"Desired gene name": "Median expression"}
@@ -92,26 +177,16 @@ class StatisticalAnalysis:
         expressions_hcc = self.expression_obj.dict_gene_hcc
         expressions_normal = self.expression_obj.dict_gene_normal
 
-        dict_desired = {}
         dict_std_dev = {}
         dict_var = {}
 
-        # Get means first
-        mean = self.calculate_mean(desired_gene)
-
         # Calculate variance and std dev for each gene
         for gene_name in desired_gene:
             if gene_name not in expressions_hcc or gene_name not in expressions_normal:
                 raise ValueError(f"Gene {gene_name} not found")
 
-            dict_desired[gene_name] = expressions_hcc[gene_name] + expressions_normal[gene_name]
-
-            # Calculate variance
-            try:
-                variance = sum((expr - mean[gene_name])**2
-                                for expr in dict_desired[gene_name]) / len(dict_desired[gene_name])
-            except ZeroDivisionError as error:
-                raise ValueError(f"No expressions for {gene_name}") from error
+            # Calculate variance around the mean
+            variance = self.gene_variance(gene_name)
 
             # Calculate standard deviation
             standard_deviation = math.sqrt(variance)
@@ -141,8 +216,7 @@ class StatisticalAnalysis:
             if gene_name not in expressions_hcc:
                 raise ValueError(f"Gene {gene_name} not found in HCC data")
 
-            mean = sum(expressions_hcc[gene_name]) / len(expressions_hcc[gene_name])
-            mean_dict_hcc[gene_name] = round(mean, 3)
+            mean_dict_hcc[gene_name] = self.gene_group_mean(gene_name, 'HCC')
 
         # Create a title dictionary for output formatting
         title_dict = {"Desired gene name": "Mean expression for HCC type"}
@@ -164,8 +238,7 @@ class StatisticalAnalysis:
             if gene_name not in expressions_normal:
                 raise ValueError(f"Gene {gene_name} not found in normal data")
 
-            mean = sum(expressions_normal[gene_name]) / len(expressions_normal[gene_name])
-            mean_dict_normal[gene_name] = round(mean, 3)
+            mean_dict_normal[gene_name] = self.gene_group_mean(gene_name, 'normal')
         # Create a title dictionary for output formatting
         title_dict = {"Desired gene name": "Mean expression for normal type"}
 
@@ -211,16 +284,179 @@ class StatisticalAnalysis:
             dict_differential = {**title_dict, **dict_differential}
         return dict_differential
      
+    def summarize_genes(self, desired_gene=None):
+        """
+        Calculate mean, median, variance and standard deviation of every
+        desired gene (all genes when None) plus the count, mean and variance
+        of its HCC and normal samples.
+
+        Returns a dictionary mapping gene names to dictionaries of statistics.
+        Each gene column is read once: one loop updates the Welford count,
+        mean and M2 of both groups and collects the values, the group moments
+        are merged with merge_moments and the median comes from quickselect
+        on the collected values, so the column is never sorted.
+        """
+        expression_obj = self.expression_obj
+        if desired_gene is None:
+            desired_gene = expression_obj.gene_names
+
+        summary = {}
+        for gene_name in desired_gene:
+            if gene_name not in expression_obj.gene_index:
+                raise ValueError(f"Gene {gene_name} not found")
+            column = expression_obj.gene_column(gene_name)
+            # [count, mean, M2] of the HCC and normal samples
+            moments = {True: [0, 0.0, 0.0], False: [0, 0.0, 0.0]}
+            values = []
+            for value, hcc, normal in zip(column, expression_obj.hcc_mask,
+                                          expression_obj.normal_mask):
+                if hcc or normal:
+                    group = moments[bool(hcc)]
+                    group[0] += 1
+                    delta = value - group[1]
+                    group[1] += delta / group[0]
+                    group[2] += delta * (value - group[1])
+                    values.append(value)
+            if not values:
+                raise ValueError(f"No expressions for {gene_name}")
+
+            count_hcc, mean_hcc, m2_hcc = moments[True]
+            count_normal, mean_normal, m2_normal = moments[False]
+            count, mean, m2 = merge_moments(moments[True], moments[False])
+            summary[gene_name] = {
+                "count": count,
+                "mean": mean,
+                "median": select_median(values),
+                "variance": m2 / count,
+                "std": math.sqrt(m2 / count),
+                "count_hcc": count_hcc,
+                "mean_hcc": mean_hcc if count_hcc else math.nan,
+                "variance_hcc": m2_hcc / count_hcc if count_hcc else math.nan,
+                "count_normal": count_normal,
+                "mean_normal": mean_normal if count_normal else math.nan,
+                "variance_normal": m2_normal / count_normal if count_normal else math.nan,
+            }
+        return summary
+
+    def stream_summary(self, thresholds=(), alpha=0.01):
+        """
+        Build a StreamingSummary by reading the data file row by row.
+
+        Rows are parsed one at a time and folded into per-gene, per-group
+        running moments, minimum, maximum, counts above each threshold and a
+        median sketch with relative error alpha, so peak memory depends on
+        the number of genes and not on the number of samples.
+        """
+        summary = StreamingSummary(self.expression_obj.gene_names,
+                                   thresholds=thresholds, alpha=alpha)
+        for _, gene_type, row in self.expression_obj.iter_rows():
+            summary.add_row(gene_type, row)
+        return summary
+
+    def build_summary(self, thresholds=(), alpha=0.01):
+        """
+        Build the mergeable per-gene, per-group summary of the loaded samples
+        (sums, moments, minimum, maximum, threshold counts and median
+        sketches) and keep it, so append_samples can update it from the new
+        rows only. Returns the StreamingSummary.
+        """
+        expression_obj = self.expression_obj
+        summary = StreamingSummary(expression_obj.gene_names,
+                                   thresholds=thresholds, alpha=alpha)
+        for row, gene_type in enumerate(expression_obj.sample_types):
+            summary.add_row(gene_type, expression_obj.sample_row(row))
+        self.summary = summary
+        self.summary_version = expression_obj.data_version
+        return summary
+
+    def current_summary(self):
+        """Return the kept summary if it still describes the loaded data, else None."""
+        if self.summary is not None and self.summary_version == self.expression_obj.data_version:
+            return self.summary
+        return None
+
+    def append_samples(self, path):
+        """
+        Append the samples of another CSV to the data and returns their number.
+
+        When a current summary is kept (see build_summary), only the new
+        rows are folded into it, so fold changes, the top differential genes
+        and the summary statistics are updated at a cost that grows with the
+        new samples and not with the whole cohort.
+        """
+        summary = self.current_summary()
+        rows = self.expression_obj.append_samples(path)
+        if summary is not None:
+            for _, gene_type, row in rows:
+                summary.add_row(gene_type, row)
+            self.summary_version = self.expression_obj.data_version
+        return len(rows)
+
+    def group_sums(self, mask, start=0, stop=None):
+        """
+        Sum the expression values of the genes in columns start..stop (all
+        genes by default) over the samples selected by mask and returns a
+        list of sums in gene column order.
+
+        The matrix is walked row by row, so each value is read once and the
+        sums are added in the same order as a per-gene sum() would.
+        """
+        n_genes = len(self.expression_obj.gene_names)
+        stop = n_genes if stop is None else stop
+        matrix = self.expression_obj.matrix
+        sums = [0.0] * (stop - start)
+        for row, selected in enumerate(mask):
+            if selected:
+                offset = row * n_genes
+                sums = list(map(add, sums, matrix[offset + start:offset + stop]))
+        return sums
+
+    def calculate_fold_changes(self, list_gene_names):
+        """
+        Calculate the differential expression of many genes in one pass and
+        returns a dictionary mapping gene names to the HCC/normal ratio.
+
+        Values are rounded exactly like calculate_differential.
+        """
+        expression_obj = self.expression_obj
+        n_hcc = sum(expression_obj.hcc_mask)
+        n_normal = sum(expression_obj.normal_mask)
+        if not n_hcc or not n_normal:
+            raise ValueError("Both HCC and normal samples are needed for the differential")
+
+        # A current summary holds the group sums, added in the same row order
+        summary = self.current_summary()
+        if summary is not None and {'HCC', 'normal'} <= set(summary.groups):
+            sums_hcc = summary.groups['HCC'].sums
+            sums_normal = summary.groups['normal'].sums
+        else:
+            sums_hcc = self.memo(None, "sums", "HCC",
+                                 lambda: self.group_sums(expression_obj.hcc_mask))
+            sums_normal = self.memo(None, "sums", "normal",
+                                    lambda: self.group_sums(expression_obj.normal_mask))
+
+        # Group means of every gene, rounded like the per-gene mean methods
+        means_hcc = [round(total / n_hcc, 3) for total in sums_hcc]
+        means_normal = [round(total / n_normal, 3) for total in sums_normal]
+
+        dict_fold_change = {}
+        for gene_name in list_gene_names:
+            if gene_name not in expression_obj.gene_index:
+                raise ValueError(f"Gene {gene_name} not found in both datasets")
+            col = expression_obj.gene_index[gene_name]
+            # Check for division by zero
+            if means_normal[col] == 0:
+                raise ZeroDivisionError(f"Normal expression is zero for gene {gene_name}")
+            dict_fold_change[gene_name] = round(means_hcc[col] / means_normal[col], 3)
+        return dict_fold_change
+
     def compare_differential_numbers(self, list_gene_names, number):
         """Compare and sort differential expressions, returning a 
         dictionary of ratio the mean expression ratios for HCC and 
         normal samples, focusing on potentially suspicious genes
         """
-        # Calculate differential expression for each gene
-        dict_compare_differential = {
-            gene_name: self.calculate_differential([gene_name])[gene_name]
-            for gene_name in list_gene_names
-        }
+        # Calculate differential expression for all genes in one pass
+        dict_compare_differential = self.calculate_fold_changes(list_gene_names)
 
         # Process differential values - use inverse for values < 1
         dict_differential_inv = {
@@ -230,53 +466,523 @@ class StatisticalAnalysis:
         # Create a title dictionary for output formatting
         title_dict = {"Gene name": "Differential value"}
 
-        # Sort the dictionary based on differential values in descending order
-        # Select the top 'number' genes with highest differential values
-        dict_differential_sorted = dict(sorted(
-            dict_differential_inv.items(),
-            key=lambda x: x[1],
-            reverse=True)[:number])
-                   
-            # Replace the sorted dictionary values with original differential values
+        # Select the top 'number' genes with highest differential values;
+        # nlargest keeps the order (and ties) of a full descending sort
+        top_genes = heapq.nlargest(number, dict_differential_inv,
+                                   key=dict_differential_inv.get)
+
+        # Replace the sorted values with original differential values
         dict_differential_sorted = {
             gene_name: dict_compare_differential[gene_name]
-            for gene_name in dict_differential_sorted}
+            for gene_name in top_genes}
         # Combine title dictionary with the sorted differential dictionary
         dict_differential_sorted = {**title_dict, **dict_differential_sorted}
         return dict_differential_sorted
 
 
-    def get_high_threshold(self, threshold):
-        """Get expression values above specified threshold for each gene."""
+    def weighted_sums(self, weights):
+        """
+        Sum every gene over the rows of a {row: weight} mapping, each row
+        counted weight times, and returns the list of sums in column order.
+        """
+        n_genes = len(self.expression_obj.gene_names)
+        matrix = self.expression_obj.matrix
+        sums = [0.0] * n_genes
+        for row in sorted(weights):
+            values = matrix[row * n_genes:(row + 1) * n_genes]
+            if weights[row] != 1:
+                values = map(mul, values, repeat(float(weights[row])))
+            sums = list(map(add, sums, values))
+        return sums
+
+    def replicate_counts(self, kind, seed, first, last, number, observed):
+        """
+        Run the resampling replicates first..last and returns per-gene
+        counts over them: for 'bootstrap', 'top' (replicates with the gene
+        in the top 'number') and 'rank_sum'; for 'permutation', 'exceed'
+        (replicates scoring at least the observed score).
+
+        Each replicate draws its row weights with its own seeded generator
+        and computes the fold-change score of every gene from weighted row
+        sums, so the counts do not depend on how replicates are split.
+        """
+        expression_obj = self.expression_obj
+        n_hcc, n_normal = self.group_counts()
+        n_genes = len(expression_obj.gene_names)
+        hcc_rows = [row for row, selected in enumerate(expression_obj.hcc_mask) if selected]
+        normal_rows = [row for row, selected in enumerate(expression_obj.normal_mask)
+                       if selected]
+        if kind == 'permutation':
+            # A permutation keeps the rows of both groups: normal sums are the rest of the total
+            totals = self.weighted_sums(dict.fromkeys(hcc_rows + normal_rows, 1))
+            counts = {"exceed": [0] * n_genes}
+        else:
+            counts = {"top": [0] * n_genes, "rank_sum": [0] * n_genes}
+        for replicate in range(first, last):
+            weights_hcc, weights_normal = replicate_weights(
+                kind, replicate_random(seed, replicate), hcc_rows, normal_rows)
+            sums_hcc = self.weighted_sums(weights_hcc)
+            if kind == 'permutation':
+                sums_normal = list(map(sub, totals, sums_hcc))
+                scores = fold_change_scores(sums_hcc, sums_normal, n_hcc, n_normal)
+                counts["exceed"] = list(map(add, counts["exceed"], map(ge, scores, observed)))
+            else:
+                sums_normal = self.weighted_sums(weights_normal)
+                ranks = score_ranks(fold_change_scores(sums_hcc, sums_normal, n_hcc, n_normal))
+                counts["rank_sum"] = list(map(add, counts["rank_sum"], ranks))
+                top = counts["top"]
+                for col, rank in enumerate(ranks):
+                    if rank <= number:
+                        top[col] += 1
+        return counts
+
+    def resample_fold_changes(self, kind='bootstrap', replicates=1000, number=10, seed=0):
+        """
+        Measure how stable the fold-change ranking is under resampling and
+        returns a dictionary mapping every gene to its statistics.
+
+        kind 'bootstrap' resamples the HCC and normal samples with
+        replacement: each gene gets its observed rank, 'top_frequency', the
+        fraction of replicates that put it in the top 'number', and its
+        'mean_rank'. kind 'permutation' shuffles the sample labels: each
+        gene gets its observed score, the empirical 'p_value' (1 + number of
+        replicates scoring at least as high) / (1 + replicates) and its
+        Benjamini-Hochberg 'q_value'. The same seed gives the same results
+        whatever the number of workers.
+        """
+        if kind not in RESAMPLING_KINDS:
+            raise ValueError(f"Unknown resampling kind {kind}")
+        if replicates <= 0 or number <= 0:
+            raise ValueError("Replicates and number must be positive")
+        expression_obj = self.expression_obj
+        n_hcc, n_normal = self.group_counts()
+        observed = fold_change_scores(self.group_sums(expression_obj.hcc_mask),
+                                      self.group_sums(expression_obj.normal_mask),
+                                      n_hcc, n_normal)
+        counts = self.replicate_counts(kind, seed, 0, replicates, number, observed)
+        if kind == 'permutation':
+            p_values = [(1 + exceed) / (1 + replicates) for exceed in counts["exceed"]]
+            q_values = benjamini_hochberg(p_values)
+            return {
+                gene_name: {"score": score, "p_value": p_value, "q_value": q_value}
+                for gene_name, score, p_value, q_value
+                in zip(expression_obj.gene_names, observed, p_values, q_values)
+            }
+        return {
+            gene_name: {"rank": rank, "top_frequency": top / replicates,
+                        "mean_rank": rank_sum / replicates}
+            for gene_name, rank, top, rank_sum
+            in zip(expression_obj.gene_names, score_ranks(observed), counts["top"],
+                   counts["rank_sum"])
+        }
+
+    def group_deviations(self, mask, means, start=0, stop=None):
+        """
+        Sum the squared deviations from means of the genes in columns
+        start..stop over the samples selected by mask and returns the list
+        of M2 values in gene column order, walking the matrix row by row.
+        """
+        n_genes = len(self.expression_obj.gene_names)
+        stop = n_genes if stop is None else stop
+        matrix = self.expression_obj.matrix
+        m2 = [0.0] * (stop - start)
+        for row, selected in enumerate(mask):
+            if selected:
+                offset = row * n_genes
+                deviations = list(map(sub, matrix[offset + start:offset + stop], means))
+                m2 = list(map(add, m2, map(mul, deviations, deviations)))
+        return m2
+
+    def group_counts(self):
+        """Return the number of HCC and normal samples, which must both be present."""
+        n_hcc = sum(self.expression_obj.hcc_mask)
+        n_normal = sum(self.expression_obj.normal_mask)
+        if not n_hcc or not n_normal:
+            raise ValueError("Both HCC and normal samples are needed for the comparison")
+        return n_hcc, n_normal
+
+    def group_moments(self, start=0, stop=None):
+        """
+        Compute the statistics of every sample group (see group_names) for
+        the genes in columns start..stop (all genes by default) in a single
+        pass over the rows, and returns one (count, sums, means, M2) tuple
+        per group in group_names order, the lists in gene column order.
+
+        Each row is folded into the running sums and Welford moments of its
+        group, picked with group_index, so adding groups adds no pass.
+        """
+        expression_obj = self.expression_obj
+        n_genes = len(expression_obj.gene_names)
+        stop = n_genes if stop is None else stop
+        matrix = expression_obj.matrix
+        n_columns = stop - start
+        counts = [0] * len(expression_obj.group_names)
+        sums = [[0.0] * n_columns for _ in counts]
+        means = [[0.0] * n_columns for _ in counts]
+        m2 = [[0.0] * n_columns for _ in counts]
+        for row, group in enumerate(expression_obj.group_index):
+            offset = row * n_genes
+            values = matrix[offset + start:offset + stop]
+            counts[group] += 1
+            sums[group] = list(map(add, sums[group], values))
+            delta = list(map(sub, values, means[group]))
+            means[group] = list(map(add, means[group],
+                                    map(mul, delta, repeat(1.0 / counts[group]))))
+            # M2 += (x - old mean) * (x - new mean)
+            m2[group] = list(map(add, m2[group],
+                                 map(mul, delta, map(sub, values, means[group]))))
+        return list(zip(counts, sums, means, m2))
+
+    def compare_groups(self, list_gene_names=None, groups=None):
+        """
+        Compare the sample groups for the given genes (all genes by default)
+        and returns a dictionary with, under "groups", the sample count and
+        the per-gene mean and variance of every group and, under
+        "fold_changes", the per-gene ratio of means of every pair of groups
+        keyed "A/B" (A before B in groups order; None where the mean of B is
+        zero). groups restricts the report to some sample types (all by
+        default). Values are rounded to 3 decimals like calculate_differential.
+
+        All statistics come from one group_moments pass over the matrix.
+        """
+        expression_obj = self.expression_obj
+        if list_gene_names is None:
+            list_gene_names = expression_obj.gene_names
+        groups = list(expression_obj.group_names if groups is None else groups)
+        for group in groups:
+            if group not in expression_obj.group_names:
+                raise ValueError(f"Unknown sample group {group}")
+        for gene_name in list_gene_names:
+            if gene_name not in expression_obj.gene_index:
+                raise ValueError(f"Gene {gene_name} not found")
+        moments = self.memo(None, "moments", "groups", self.group_moments)
+        columns = [expression_obj.gene_index[gene_name] for gene_name in list_gene_names]
+
+        report = {"groups": {}, "fold_changes": {}}
+        means = {}
+        for group in groups:
+            count, _, group_means, group_m2 = moments[expression_obj.group_names.index(group)]
+            means[group] = [round(group_means[col], 3) for col in columns]
+            report["groups"][group] = {
+                "count": count,
+                "mean": dict(zip(list_gene_names, means[group])),
+                "variance": {gene_name: round(group_m2[col] / count, 3)
+                             for gene_name, col in zip(list_gene_names, columns)},
+            }
+        for number, group_a in enumerate(groups):
+            for group_b in groups[number + 1:]:
+                report["fold_changes"][f"{group_a}/{group_b}"] = {
+                    gene_name: round(mean_a / mean_b, 3) if mean_b else None
+                    for gene_name, mean_a, mean_b
+                    in zip(list_gene_names, means[group_a], means[group_b])
+                }
+        return report
+
+    def welch_tests(self, start=0, stop=None):
+        """
+        Run Welch's t-test of HCC against normal for the genes in columns
+        start..stop (all genes by default) and returns a list of (t, degrees
+        of freedom, p-value) in gene column order.
+
+        Group means and M2 of all genes come from two row-wise passes over
+        the matrix per group, so no gene column is copied.
+        """
+        expression_obj = self.expression_obj
+        n_hcc, n_normal = self.group_counts()
+        moments = []
+        for mask, count in ((expression_obj.hcc_mask, n_hcc),
+                            (expression_obj.normal_mask, n_normal)):
+            means = [total / count for total in self.group_sums(mask, start, stop)]
+            moments.append((count, means, self.group_deviations(mask, means, start, stop)))
+        (_, means_hcc, m2_hcc), (_, means_normal, m2_normal) = moments
+        return [welch_test((n_hcc, mean_hcc, gene_m2_hcc), (n_normal, mean_normal, gene_m2_normal))
+                for mean_hcc, gene_m2_hcc, mean_normal, gene_m2_normal
+                in zip(means_hcc, m2_hcc, means_normal, m2_normal)]
+
+    def mann_whitney_tests(self, start=0, stop=None):
+        """
+        Run the Mann-Whitney U test of HCC against normal for the genes in
+        columns start..stop (all genes by default) and returns a list of
+        (U, z, p-value) in gene column order; each gene is ranked in one pass.
+        """
+        expression_obj = self.expression_obj
+        self.group_counts()
+        n_genes = len(expression_obj.gene_names)
+        stop = n_genes if stop is None else stop
+        tests = []
+        for col in range(start, stop):
+            column = expression_obj.matrix[col::n_genes]
+            tests.append(mann_whitney_test(list(compress(column, expression_obj.hcc_mask)),
+                                           list(compress(column, expression_obj.normal_mask))))
+        return tests
+
+    def significance_tests(self, list_gene_names, test='welch'):
+        """
+        Test every listed gene for a difference between HCC and normal with
+        test 'welch' (Welch's t-test) or 'mannwhitney' (Mann-Whitney U) and
+        returns a dictionary mapping gene names to their statistic, p-value
+        and Benjamini-Hochberg adjusted p-value over the listed genes.
+        """
+        if test == 'welch':
+            results = self.welch_tests()
+        elif test == 'mannwhitney':
+            results = self.mann_whitney_tests()
+        else:
+            raise ValueError(f"Unknown significance test {test}")
+        gene_index = self.expression_obj.gene_index
+        for gene_name in list_gene_names:
+            if gene_name not in gene_index:
+                raise ValueError(f"Gene {gene_name} not found")
+        selected = [results[gene_index[gene_name]] for gene_name in list_gene_names]
+        q_values = benjamini_hochberg([result[2] for result in selected])
+        return {
+            gene_name: {"statistic": statistic, "p_value": p_value, "q_value": q_value}
+            for gene_name, (statistic, _, p_value), q_value
+            in zip(list_gene_names, selected, q_values)
+        }
+
+    def compare_significance_numbers(self, list_gene_names, number, test='welch'):
+        """
+        Rank the listed genes by their adjusted p-value (then raw p-value)
+        and returns a dictionary of the 'number' most significant genes and
+        their adjusted p-values, the counterpart of compare_differential_numbers.
+        """
+        dict_significance = self.significance_tests(list_gene_names, test)
+        top_genes = heapq.nsmallest(
+            number, dict_significance,
+            key=lambda gene_name: (dict_significance[gene_name]["q_value"],
+                                   dict_significance[gene_name]["p_value"]))
+        # Create a title dictionary for output formatting
+        title_dict = {"Gene name": "Adjusted p-value"}
+        return {**title_dict,
+                **{gene_name: dict_significance[gene_name]["q_value"] for gene_name in top_genes}}
+
+    def group_mask(self, group):
+        """Return the sample mask of group 'HCC', 'normal' or another sample type."""
+        if group == 'HCC':
+            return self.expression_obj.hcc_mask
+        if group == 'normal':
+            return self.expression_obj.normal_mask
+        if group in self.expression_obj.group_names:
+            return self.expression_obj.group_mask(group)
+        raise ValueError(f"Unknown sample group {group}")
+
+    def group_block(self, mask, start, stop):
+        """
+        Return the gene columns start..stop over the samples selected by mask
+        as a list of tuples, read row by row and transposed with zip.
+        """
+        n_genes = len(self.expression_obj.gene_names)
+        matrix = self.expression_obj.matrix
+        rows = [matrix[row * n_genes + start:row * n_genes + stop]
+                for row, selected in enumerate(mask) if selected]
+        if not rows:
+            return [() for _ in range(start, stop)]
+        return list(zip(*rows))
+
+    def correlation_vectors(self, mask, method, start, stop):
+        """
+        Return the unit vectors (see unit_vector) of the gene columns
+        start..stop over the masked samples, ranked first for 'spearman'.
+        """
+        if method not in COEXPRESSION_METHODS:
+            raise ValueError(f"Unknown correlation method {method}")
+        columns = self.group_block(mask, start, stop)
+        if method == 'spearman':
+            columns = map(rank_transform, columns)
+        return [unit_vector(list(column)) for column in columns]
+
+    def coexpression_partners(self, query_genes, group, method, k, start=0, stop=None):
+        """
+        Find, for every query gene, its k most strongly correlated genes
+        among the columns start..stop (all genes by default) within the
+        samples of group, and returns one list per query gene of
+        (|r|, -column, r) entries, strongest first.
+
+        The columns are decoded BLOCK_SIZE at a time and each block's
+        correlations are folded into a streaming top-k heap per query gene,
+        so memory stays bounded whatever the number of genes.
+        """
+        gene_index = self.expression_obj.gene_index
+        stop = len(self.expression_obj.gene_names) if stop is None else stop
+        mask = self.group_mask(group)
+        query_cols = [gene_index[gene_name] for gene_name in query_genes]
+        query_vectors = [self.correlation_vectors(mask, method, col, col + 1)[0]
+                         for col in query_cols]
+        heaps = [[] for _ in query_cols]
+        for block_start in range(start, stop, BLOCK_SIZE):
+            block_stop = min(block_start + BLOCK_SIZE, stop)
+            vectors = self.correlation_vectors(mask, method, block_start, block_stop)
+            for query_col, query_vector, heap in zip(query_cols, query_vectors, heaps):
+                if query_vector is None:
+                    continue
+                for col, vector in enumerate(vectors, start=block_start):
+                    if vector is None or col == query_col:
+                        continue
+                    correlation = max(-1.0, min(1.0, sumprod(vector, query_vector)))
+                    push_partner(heap, k, (abs(correlation), -col, correlation))
+        return [sorted(heap, reverse=True) for heap in heaps]
+
+    def coexpression(self, query_genes=None, k=10, method='pearson', number=10,
+                     groups=('HCC', 'normal')):
+        """
+        Return the k genes most co-expressed with each query gene, separately
+        within each sample group, as {gene: {group: {partner: r}}} with the
+        partners ordered from the strongest absolute correlation down.
+
+        The query genes default to the top 'number' differential genes of
+        compare_differential_numbers. method is 'pearson' or 'spearman'
+        (Pearson on average ranks); a gene without variance in a group has
+        no partners there.
+        """
+        expression_obj = self.expression_obj
+        if query_genes is None:
+            top = self.compare_differential_numbers(expression_obj.gene_names, number)
+            query_genes = list(top)[1:]
+        query_genes = list(dict.fromkeys(query_genes))
+        for gene_name in query_genes:
+            if gene_name not in expression_obj.gene_index:
+                raise ValueError(f"Gene {gene_name} not found")
+        if k <= 0:
+            raise ValueError("The number of partners must be positive")
+        if method not in COEXPRESSION_METHODS:
+            raise ValueError(f"Unknown correlation method {method}")
+        dict_coexpression = {gene_name: {} for gene_name in query_genes}
+        for group in groups:
+            partners = self.coexpression_partners(query_genes, group, method, k)
+            for gene_name, entries in zip(query_genes, partners):
+                dict_coexpression[gene_name][group] = {
+                    expression_obj.gene_names[-negative_col]: correlation
+                    for _, negative_col, correlation in entries}
+        return dict_coexpression
+
+    def genes_above_threshold(self, threshold, list_gene_names):
+        """
+        Get the expression values above threshold of the listed genes and
+        returns a dictionary of the genes that have at least one such value.
+        """
         # Get expression data
         expressions_hcc = self.expression_obj.dict_gene_hcc
         expressions_normal = self.expression_obj.dict_gene_normal
         dict_above_threshold = {}
-        for gene_name in expressions_hcc:
+        for gene_name in list_gene_names:
             # Creare a dictionary with values above threshold.
             dict_above_threshold[gene_name] = [
                 expr for expr in expressions_hcc[gene_name] + expressions_normal[gene_name]
                 if expr > threshold
             ]
             # Check that the value list for each gene is not empty
-        dict_non_empty_genes = {
+        return {
             gene_name: exp_lst for gene_name, exp_lst in dict_above_threshold.items()
             if exp_lst
         }
-        # Create a title dictionary for output formatting
-        title_dict = {"Gene name": "Expressions value"}
+
+    def gene_maxima(self, start=0, stop=None):
+        """
+        Return the maximum HCC or normal value of the genes in columns
+        start..stop (all genes by default), in gene column order; a gene
+        without such values gets -inf. Missing (NaN) values are skipped, as
+        no threshold is below them. Nothing is sorted.
+        """
+        expression_obj = self.expression_obj
+        n_genes = len(expression_obj.gene_names)
+        stop = n_genes if stop is None else stop
+        matrix = expression_obj.matrix
+        mask = bytes(hcc or normal for hcc, normal in
+                     zip(expression_obj.hcc_mask, expression_obj.normal_mask))
+        maxima = []
+        for col in range(start, stop):
+            maximum = max(compress(matrix[col::n_genes], mask), default=-math.inf)
+            if maximum != maximum:
+                # max() keeps a leading NaN; a later NaN is already passed over
+                maximum = max((value for value in compress(matrix[col::n_genes], mask)
+                               if value == value), default=-math.inf)
+            maxima.append(maximum)
+        return maxima
+
+    def sorted_gene_values(self, list_gene_names):
+        """
+        Return, for each listed gene, an array of its HCC and normal values
+        sorted ascending; other sample types take no part, like the rest
+        of the analysis, and missing (NaN) values are left out.
+        """
+        expression_obj = self.expression_obj
+        mask = bytes(hcc or normal for hcc, normal in
+                     zip(expression_obj.hcc_mask, expression_obj.normal_mask))
+        return [array(expression_obj.typecode,
+                      sorted(value for value in compress(expression_obj.gene_column(gene_name),
+                                                         mask) if value == value))
+                for gene_name in list_gene_names]
+
+    def get_threshold_index(self):
+        """
+        Return the ThresholdIndex of all genes. It is built on first use
+        and again after the data changed (reload or set_matrix).
+        """
+        expression_obj = self.expression_obj
+        if self.threshold_index is None or self.index_version != expression_obj.data_version:
+            self.threshold_index = ThresholdIndex(
+                list(expression_obj.dict_gene_hcc), self.gene_maxima(), self.sorted_gene_values)
+            self.index_version = expression_obj.data_version
+        return self.threshold_index
+
+    def get_high_threshold(self, threshold, mode='values', top_k=None):
+        """
+        Get expression values above specified threshold for each gene.
+
+        mode 'values' returns every value above threshold (HCC, then normal),
+        'count' returns how many values are above it and 'top' returns the
+        top_k highest of them. Genes whose maximum is not above threshold
+        are skipped through the threshold index without reading their values;
+        'values' only reads the remaining genes and never sorts them. The
+        first 'values' query on new data is answered by a plain scan, which
+        is cheaper than building the index; the index is built from the
+        second threshold on, when a sweep starts to pay for it.
+        """
+        expression_obj = self.expression_obj
+        if mode == 'values':
+            if (self.scan_version == expression_obj.data_version
+                    or self.index_version == expression_obj.data_version):
+                list_gene_names = self.get_threshold_index().genes_above(threshold)
+            else:
+                self.scan_version = expression_obj.data_version
+                list_gene_names = list(expression_obj.dict_gene_hcc)
+            dict_non_empty_genes = self.genes_above_threshold(threshold, list_gene_names)
+            # Create a title dictionary for output formatting
+            title_dict = {"Gene name": "Expressions value"}
+        elif mode == 'count':
+            dict_non_empty_genes = self.get_threshold_index().counts_above(threshold)
+            title_dict = {"Gene name": "Number of values above threshold"}
+        elif mode == 'top':
+            if top_k is None or top_k <= 0:
+                raise ValueError("top_k must be a positive number for mode 'top'")
+            dict_non_empty_genes = self.get_threshold_index().top_values_above(threshold, top_k)
+            title_dict = {"Gene name": "Highest values above threshold"}
+        else:
+            raise ValueError(f"Unknown threshold mode {mode}")
         # Combine title dictionary with the top N gene dictionary
         dict_non_empty_genes = {**title_dict, **dict_non_empty_genes}
         return dict_non_empty_genes
        
-    def sample_min_max(self, expression_sample_dict):
-        """Get min and max expression values per sample."""
-        dict_min = {
-            sample: min(exp_lst) for sample, exp_lst in expression_sample_dict.items()
-        }
-        dict_max = {
-            sample: max(exp_lst) for sample, exp_lst in expression_sample_dict.items()
-        }
+    def sample_min_max(self, expression_sample_dict=None):
+        """
+        Get min and max expression values per sample.
+
+        Without expression_sample_dict they are read from the sample
+        profiles collected while the data was parsed, so the matrix is not
+        scanned again.
+        """
+        if expression_sample_dict is None:
+            profiles = self.expression_obj.dict_sample_profile()
+            dict_min = {sample: profile["min"] for sample, profile in profiles.items()}
+            dict_max = {sample: profile["max"] for sample, profile in profiles.items()}
+        else:
+            dict_min = {
+                sample: min(exp_lst) for sample, exp_lst in expression_sample_dict.items()
+            }
+            dict_max = {
+                sample: max(exp_lst) for sample, exp_lst in expression_sample_dict.items()
+            }
         # Create a title dictionary for output formatting
         title_dict_min = {"Sample ID": "Minimum expression"}
         title_dict_max = {"Sample ID": "Maximum expression"}
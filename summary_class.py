@@ -0,0 +1,347 @@
+"""Module for bounded-memory running summaries of gene expression data."""
+
+import json
+import math
+from array import array
+from itertools import repeat
+from operator import add, gt, mul, sub, truediv
+
+
+def merge_moments(moments_a, moments_b):
+    """
+    Merge two (count, mean, M2) triples into the triple of the combined data
+    with the pairwise update of Chan et al. (the parallel form of Welford).
+    """
+    count_a, mean_a, m2_a = moments_a
+    count_b, mean_b, m2_b = moments_b
+    count = count_a + count_b
+    if not count_a or not count_b:
+        return moments_a if count_a else moments_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+    return count, mean, m2
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a guaranteed relative error (DDSketch).
+
+    Every value x > 0 is counted in the bucket ceil(log(x) / log(gamma)) with
+    gamma = (1 + alpha) / (1 - alpha), negative values in a mirrored set of
+    buckets and zeros separately. A quantile is answered with the centre of
+    the bucket holding the requested rank, which is within a relative error
+    of alpha of the exact value of that rank: |estimate - x| <= alpha * |x|.
+    Memory depends on the spread of the values (about log(max/min) / alpha
+    buckets), never on the number of values added.
+    """
+
+    def __init__(self, alpha=0.01):
+        """Initialize an empty sketch with relative accuracy alpha."""
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        self.positive = [0, array('q')]  # [offset, counts] of a dense bucket store
+        self.negative = [0, array('q')]
+
+    def bucket_add(self, store, index, count=1):
+        """Add count to bucket index of a dense store, growing it when needed."""
+        offset, counts = store
+        if not counts:
+            store[0] = index
+            counts.append(count)
+            return
+        if index < offset:
+            store[1] = array('q', [0] * (offset - index)) + counts
+            store[0] = index
+            store[1][0] += count
+        elif index >= offset + len(counts):
+            counts.extend([0] * (index - offset - len(counts) + 1))
+            counts[index - offset] += count
+        else:
+            counts[index - offset] += count
+
+    def add(self, value):
+        """Add one value to the sketch."""
+        self.count += 1
+        if value > 1e-12:
+            self.bucket_add(self.positive, math.ceil(math.log(value) / self.log_gamma))
+        elif value < -1e-12:
+            self.bucket_add(self.negative, math.ceil(math.log(-value) / self.log_gamma))
+        else:
+            self.zero_count += 1
+
+    def merge(self, other):
+        """Add all values of another sketch with the same alpha to this one."""
+        if other.alpha != self.alpha:
+            raise ValueError("Sketches with different accuracy cannot be merged")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for store, other_store in ((self.positive, other.positive),
+                                   (self.negative, other.negative)):
+            offset, counts = other_store
+            for position, count in enumerate(counts):
+                if count:
+                    self.bucket_add(store, offset + position, count)
+
+    def copy(self):
+        """Return an independent copy of the sketch."""
+        sketch = QuantileSketch(self.alpha)
+        sketch.merge(self)
+        return sketch
+
+    def to_list(self):
+        """Return the sketch contents as a JSON-ready list."""
+        return [self.count, self.zero_count, self.positive[0], self.positive[1].tolist(),
+                self.negative[0], self.negative[1].tolist()]
+
+    @classmethod
+    def from_list(cls, contents, alpha):
+        """Create a sketch with accuracy alpha from the list of to_list."""
+        sketch = cls(alpha)
+        sketch.count, sketch.zero_count = contents[0], contents[1]
+        sketch.positive = [contents[2], array('q', contents[3])]
+        sketch.negative = [contents[4], array('q', contents[5])]
+        return sketch
+
+    def bucket_value(self, index):
+        """Return the representative value of a positive bucket."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def value_at_rank(self, rank):
+        """Return the estimated value of the given 0-based rank."""
+        if not 0 <= rank < self.count:
+            raise ValueError(f"Rank {rank} outside a sketch of {self.count} values")
+        seen = 0
+        # Most negative values first: the highest negative buckets
+        offset, counts = self.negative
+        for position in range(len(counts) - 1, -1, -1):
+            seen += counts[position]
+            if rank < seen:
+                return -self.bucket_value(offset + position)
+        seen += self.zero_count
+        if rank < seen:
+            return 0.0
+        offset, counts = self.positive
+        for position, count in enumerate(counts):
+            seen += count
+            if rank < seen:
+                return self.bucket_value(offset + position)
+        return self.bucket_value(offset + len(counts) - 1)
+
+    def quantile(self, fraction):
+        """Return the estimated value of the given quantile (0 <= fraction <= 1)."""
+        return self.value_at_rank(int(fraction * (self.count - 1)))
+
+    def median(self):
+        """Return the estimated median, averaging the two middle ranks if needed."""
+        if not self.count:
+            return math.nan
+        return (self.value_at_rank((self.count - 1) // 2)
+                + self.value_at_rank(self.count // 2)) / 2
+
+
+class GroupAccumulator:
+    """
+    Running per-gene statistics of the samples of one group.
+
+    Keeps, for every gene, the sum, the Welford mean and M2, the minimum,
+    the maximum, the number of values above each threshold and a
+    QuantileSketch. Each update walks one sample row with map() over the
+    gene vectors, and two accumulators of the same genes can be merged.
+    """
+
+    def __init__(self, n_genes, thresholds=(), alpha=0.01):
+        """Initialize empty statistics for n_genes genes."""
+        self.count = 0
+        self.sums = [0.0] * n_genes
+        self.mean = [0.0] * n_genes
+        self.m2 = [0.0] * n_genes
+        self.minimum = [math.inf] * n_genes
+        self.maximum = [-math.inf] * n_genes
+        self.above = {threshold: [0] * n_genes for threshold in thresholds}
+        self.sketches = [QuantileSketch(alpha) for _ in range(n_genes)]
+        self.inverse_log_gamma = 1 / math.log((1 + alpha) / (1 - alpha))
+
+    def add_row(self, row):
+        """Update every gene with the values of one sample."""
+        self.count += 1
+        self.sums = list(map(add, self.sums, row))
+        delta = list(map(sub, row, self.mean))
+        self.mean = list(map(add, self.mean, map(truediv, delta, repeat(self.count))))
+        # M2 += (x - old mean) * (x - new mean)
+        self.m2 = list(map(add, self.m2, map(mul, delta, map(sub, row, self.mean))))
+        self.minimum = list(map(min, self.minimum, row))
+        self.maximum = list(map(max, self.maximum, row))
+        for threshold, counts in self.above.items():
+            self.above[threshold] = list(map(add, counts, map(gt, row, repeat(threshold))))
+        if min(row) > 1e-12:
+            # Usual case: all values positive, bucket indices computed for the whole row
+            indices = map(math.ceil, map(mul, map(math.log, row), repeat(self.inverse_log_gamma)))
+            for sketch, index in zip(self.sketches, indices):
+                sketch.count += 1
+                offset, counts = sketch.positive
+                if 0 <= index - offset < len(counts):
+                    counts[index - offset] += 1
+                else:
+                    sketch.bucket_add(sketch.positive, index)
+        else:
+            for sketch, value in zip(self.sketches, row):
+                sketch.add(value)
+
+    def moments(self, col):
+        """Return (count, mean, M2) of the gene stored in column col."""
+        return self.count, self.mean[col], self.m2[col]
+
+    def merge(self, other):
+        """
+        Add the statistics of another accumulator of the same genes and
+        thresholds; the moments are combined like merge_moments.
+        """
+        if set(other.above) != set(self.above):
+            raise ValueError("Summaries with different thresholds cannot be merged")
+        if not other.count:
+            return
+        count_a, count_b = self.count, other.count
+        count = count_a + count_b
+        delta = list(map(sub, other.mean, self.mean))
+        self.count = count
+        self.sums = list(map(add, self.sums, other.sums))
+        self.mean = list(map(add, self.mean, map(mul, delta, repeat(count_b / count))))
+        self.m2 = list(map(add, map(add, self.m2, other.m2),
+                           map(mul, map(mul, delta, delta), repeat(count_a * count_b / count))))
+        self.minimum = list(map(min, self.minimum, other.minimum))
+        self.maximum = list(map(max, self.maximum, other.maximum))
+        for threshold, counts in other.above.items():
+            self.above[threshold] = list(map(add, self.above[threshold], counts))
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+
+    def to_dict(self):
+        """Return the accumulator contents as a JSON-ready dictionary."""
+        return {
+            "count": self.count,
+            "sums": self.sums,
+            "mean": self.mean,
+            "m2": self.m2,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "above": [[threshold, counts] for threshold, counts in self.above.items()],
+            "sketches": [sketch.to_list() for sketch in self.sketches],
+        }
+
+    @classmethod
+    def from_dict(cls, contents, alpha):
+        """Create an accumulator with sketch accuracy alpha from the dictionary of to_dict."""
+        accumulator = cls(0, alpha=alpha)
+        accumulator.count = contents["count"]
+        for field in ("sums", "mean", "m2", "minimum", "maximum"):
+            setattr(accumulator, field, contents[field])
+        accumulator.above = {threshold: counts for threshold, counts in contents["above"]}
+        accumulator.sketches = [QuantileSketch.from_list(sketch, alpha)
+                                for sketch in contents["sketches"]]
+        return accumulator
+
+
+class StreamingSummary:
+    """
+    Per-gene, per-group running summary built from a stream of sample rows.
+
+    Memory grows with the number of genes only: rows are folded into one
+    GroupAccumulator per sample type and then dropped. Medians come from
+    QuantileSketch and carry its relative error bound alpha. Summaries of
+    separate batches of samples can be merged, and saved to and loaded
+    from a JSON file.
+    """
+
+    def __init__(self, gene_names, groups=('HCC', 'normal'), thresholds=(), alpha=0.01):
+        """Initialize with gene names, tracked sample types, thresholds and alpha."""
+        self.gene_names = list(gene_names)
+        self.gene_index = {gene: col for col, gene in enumerate(self.gene_names)}
+        self.thresholds = tuple(thresholds)
+        self.alpha = alpha
+        self.groups = {
+            group: GroupAccumulator(len(self.gene_names), self.thresholds, alpha)
+            for group in groups
+        }
+
+    def add_row(self, gene_type, row):
+        """Fold one sample row into its group; other sample types are skipped."""
+        if gene_type in self.groups:
+            self.groups[gene_type].add_row(row)
+
+    def merge(self, other):
+        """Add the statistics of a summary of other samples with the same genes and settings."""
+        if (other.gene_names != self.gene_names or set(other.groups) != set(self.groups)
+                or other.thresholds != self.thresholds or other.alpha != self.alpha):
+            raise ValueError("Summaries of different genes or settings cannot be merged")
+        for group, accumulator in self.groups.items():
+            accumulator.merge(other.groups[group])
+        return self
+
+    def save(self, path):
+        """Write the summary to path as JSON."""
+        contents = {
+            "gene_names": self.gene_names,
+            "thresholds": list(self.thresholds),
+            "alpha": self.alpha,
+            "groups": {group: accumulator.to_dict()
+                       for group, accumulator in self.groups.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as summary_file:
+            json.dump(contents, summary_file)
+
+    @classmethod
+    def load(cls, path):
+        """Read a summary written by save."""
+        with open(path, 'r', encoding='utf-8') as summary_file:
+            contents = json.load(summary_file)
+        summary = cls(contents["gene_names"], groups=(), thresholds=contents["thresholds"],
+                      alpha=contents["alpha"])
+        summary.groups = {group: GroupAccumulator.from_dict(accumulator, summary.alpha)
+                          for group, accumulator in contents["groups"].items()}
+        return summary
+
+    def gene_table(self, desired_gene=None):
+        """
+        Return a dictionary mapping gene names (all genes when None) to their
+        statistics over all tracked groups and per group.
+        """
+        if desired_gene is None:
+            desired_gene = self.gene_names
+        table = {}
+        for gene_name in desired_gene:
+            if gene_name not in self.gene_index:
+                raise ValueError(f"Gene {gene_name} not found")
+            col = self.gene_index[gene_name]
+            moments = (0, 0.0, 0.0)
+            sketch = QuantileSketch(self.alpha)
+            for accumulator in self.groups.values():
+                moments = merge_moments(moments, accumulator.moments(col))
+                sketch.merge(accumulator.sketches[col])
+            count, mean, m2 = moments
+            if not count:
+                raise ValueError(f"No expressions for {gene_name}")
+            stats = {
+                "count": count,
+                "mean": mean,
+                "median": sketch.median(),
+                "variance": m2 / count,
+                "std": math.sqrt(m2 / count),
+                "min": min(group.minimum[col] for group in self.groups.values()),
+                "max": max(group.maximum[col] for group in self.groups.values()),
+            }
+            for threshold in self.thresholds:
+                stats[f"above_{threshold:g}"] = sum(
+                    group.above[threshold][col] for group in self.groups.values())
+            for group_name, group in self.groups.items():
+                group_count, group_mean, group_m2 = group.moments(col)
+                key = group_name.lower()
+                stats[f"count_{key}"] = group_count
+                stats[f"mean_{key}"] = group_mean if group_count else math.nan
+                stats[f"variance_{key}"] = group_m2 / group_count if group_count else math.nan
+                stats[f"median_{key}"] = group.sketches[col].median()
+            table[gene_name] = stats
+        return table
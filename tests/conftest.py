@@ -0,0 +1,29 @@
+"""Shared fixtures for the gene expression analysis tests."""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_expression_csv(path, sample_types, rows, gene_names=None):
+    """Write a CSV in the 'sample,type,gene...' layout and returns its path."""
+    if gene_names is None:
+        gene_names = [f"G{col}" for col in range(len(rows[0]))]
+    with open(path, 'w', encoding='utf-8') as csv_file:
+        csv_file.write("samples,type," + ",".join(gene_names) + "\n")
+        for number, (gene_type, row) in enumerate(zip(sample_types, rows)):
+            csv_file.write(f"S{number},{gene_type}," + ",".join(map(str, row)) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def small_csv(tmp_path):
+    """Nine samples (5 HCC, 3 normal, 1 other) x 6 genes with fixed random values."""
+    rng = random.Random(7)
+    sample_types = ['HCC', 'normal', 'HCC', 'HCC', 'normal', 'other', 'HCC', 'normal', 'HCC']
+    rows = [[round(rng.uniform(1, 15), 4) for _ in range(6)] for _ in sample_types]
+    return write_expression_csv(tmp_path / "small.csv", sample_types, rows)
@@ -0,0 +1,87 @@
+"""Tests for the batch job mode."""
+
+import json
+import sys
+
+import pytest
+
+import final_main
+from batch_class import BatchRunner, read_jobs
+from except_class import InputError
+from expression_class import GeneExpressionData
+from statistical_class import StatisticalAnalysis
+
+JOBS = [
+    {"genes": "G1,G2", "threshold": 9, "number": 2},
+    {"genes": ["G4"], "threshold": 12.5, "number": 4, "format": "tsv"},
+    {"genes": "G2,G0,G5", "threshold": 9, "number": 1, "format": "jsonl"},
+]
+
+
+def run_main(monkeypatch, capsys, *arguments):
+    """Run final_main.main() and returns what it printed."""
+    monkeypatch.setattr(sys, "argv", ["final_main.py", *arguments])
+    final_main.main()
+    return capsys.readouterr().out
+
+
+def single_run_report(monkeypatch, capsys, small_csv, tmp_path, job, number):
+    """Write the report of one job with a separate command line run and returns it."""
+    path = tmp_path / f"single{number}.out"
+    genes = job["genes"] if isinstance(job["genes"], str) else ",".join(job["genes"])
+    run_main(monkeypatch, capsys, small_csv, "file_path", genes, str(job["threshold"]),
+             str(job["number"]), str(path), "--format", job.get("format", "text"))
+    return path.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize("suffix", [".json", ".csv"])
+def test_batch_reports_equal_single_runs(small_csv, tmp_path, monkeypatch, capsys, suffix):
+    jobs = [{**job, "output": str(tmp_path / f"batch{number}.out")}
+            for number, job in enumerate(JOBS)]
+    job_path = tmp_path / f"jobs{suffix}"
+    if suffix == ".json":
+        job_path.write_text(json.dumps(jobs), encoding='utf-8')
+    else:
+        rows = ["genes,threshold,number,output,format"] + [
+            f'"{job["genes"] if isinstance(job["genes"], str) else ",".join(job["genes"])}",'
+            f'{job["threshold"]},{job["number"]},{job["output"]},{job.get("format", "")}'
+            for job in jobs]
+        job_path.write_text("\n".join(rows) + "\n", encoding='utf-8')
+    run_main(monkeypatch, capsys, small_csv, "--batch", str(job_path))
+    for number, job in enumerate(JOBS):
+        expected = single_run_report(monkeypatch, capsys, small_csv, tmp_path, job, number)
+        assert (tmp_path / f"batch{number}.out").read_text(encoding='utf-8') == expected
+
+
+def test_shared_statistics_are_computed_once(small_csv, monkeypatch, capsys):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    calls = []
+    for name in ("calculate_mean", "compare_differential_numbers", "get_high_threshold"):
+        method = getattr(analysis, name)
+        monkeypatch.setattr(analysis, name, lambda *args, method=method, name=name: (
+            calls.append((name, args)), method(*args))[1])
+    BatchRunner(analysis).run(JOBS * 5)
+    capsys.readouterr()
+    # The variance reuses the cached means instead of calling calculate_mean again
+    assert [name for name, _ in calls].count("calculate_mean") == 1
+    assert calls.count(("compare_differential_numbers",
+                        (analysis.expression_obj.gene_names, 4))) == 1
+    assert sorted(args for name, args in calls if name == "get_high_threshold") == [
+        (9.0,), (12.5,)]
+
+
+def test_invalid_jobs_are_reported(small_csv, tmp_path, monkeypatch, capsys):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    with pytest.raises(InputError, match="Job 2: gene missing not found"):
+        BatchRunner(analysis).run([JOBS[0], {"genes": "missing", "threshold": 1, "number": 1}])
+    with pytest.raises(InputError, match="misses number"):
+        BatchRunner(analysis).run([{"genes": "G1", "threshold": 1}])
+    (tmp_path / "jobs.json").write_text('{"jobs": 3}', encoding='utf-8')
+    output = run_main(monkeypatch, capsys, small_csv, "--batch", str(tmp_path / "jobs.json"))
+    assert output.startswith("Input Error: Job file")
+
+
+def test_read_jobs_accepts_a_jobs_object(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(json.dumps({"jobs": JOBS}), encoding='utf-8')
+    assert read_jobs(str(path)) == JOBS
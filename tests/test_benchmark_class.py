@@ -0,0 +1,62 @@
+"""Tests for the benchmark harness and its synthetic data generator."""
+
+import json
+import sys
+
+import pytest
+
+import benchmark_class
+from benchmark_class import Benchmark, compare_results, write_synthetic_csv
+from expression_class import GeneExpressionData
+
+
+def test_generator_is_deterministic_and_follows_the_layout(tmp_path):
+    first = write_synthetic_csv(str(tmp_path / "a.csv"), 30, 20, 0.5, 0.1, seed=4)
+    second = write_synthetic_csv(str(tmp_path / "b.csv"), 30, 20, 0.5, 0.1, seed=4)
+    third = write_synthetic_csv(str(tmp_path / "c.csv"), 30, 20, 0.5, 0.1, seed=5)
+    text = open(first, encoding='utf-8').read()
+    assert text == open(second, encoding='utf-8').read()
+    assert text != open(third, encoding='utf-8').read()
+    expression_obj = GeneExpressionData(first, use_cache=False)
+    assert expression_obj.gene_names[:2] == ["0_at", "1_at"]
+    assert len(expression_obj.sample_ids) == 20
+    assert expression_obj.sample_types.count('HCC') == 10
+    assert expression_obj.sample_types.count('other') == 2
+    with pytest.raises(ValueError):
+        write_synthetic_csv(str(tmp_path / "d.csv"), 3, 3, 0.8, 0.3)
+
+
+def test_benchmark_measures_every_stage(tmp_path):
+    path = write_synthetic_csv(str(tmp_path / "data.csv"), 40, 12)
+    results = Benchmark(path, ["0_at", "1_at"], number=3).run()
+    assert list(results["stages"]) == [
+        "load_csv", "write_cache", "load_cache", "gene_statistics", "differential_ranking",
+        "threshold_query", "sample_min_max", "write_report"]
+    for measured in results["stages"].values():
+        assert measured["wall_s"] >= 0 and measured["cpu_s"] >= 0
+        assert measured["peak_bytes"] > 0
+    assert results["stages"]["load_csv"]["items"] == 12
+    # The data file's own sidecar is never written or removed
+    assert not (tmp_path / "data.csv.d.gecache").exists()
+    json.dumps(results)
+
+
+def test_compare_flags_slower_stages():
+    previous = {"stages": {"load_csv": {"wall_s": 1.0}, "write_report": {"wall_s": 2.0}}}
+    current = {"stages": {"load_csv": {"wall_s": 1.5}, "write_report": {"wall_s": 2.1},
+                          "new_stage": {"wall_s": 1.0}}}
+    assert compare_results(previous, current) == [
+        ("load_csv", 1.0, 1.5, 1.5, True), ("write_report", 2.0, 2.1, 1.05, False)]
+
+
+def test_main_writes_json(tmp_path, monkeypatch, capsys):
+    output = tmp_path / "result.json"
+    monkeypatch.setattr(sys, "argv", ["benchmark_class.py", "--genes", "20", "--samples", "8",
+                                      "--no-memory", "--output", str(output)])
+    benchmark_class.main()
+    results = json.loads(output.read_text(encoding='utf-8'))
+    assert results["generator"]["genes"] == 20
+    assert results["stages"]["load_csv"]["peak_bytes"] is None
+    monkeypatch.setattr(sys, "argv", ["benchmark_class.py", "--size", "huge"])
+    benchmark_class.main()
+    assert capsys.readouterr().out.startswith("Input Error")
@@ -0,0 +1,51 @@
+"""Tests for the binary sidecar cache of parsed expression data."""
+
+import os
+import sys
+
+import final_main
+from cache_class import BinaryCache
+from expression_class import GeneExpressionData
+
+
+def test_second_load_maps_the_sidecar(small_csv):
+    first = GeneExpressionData(small_csv)
+    second = GeneExpressionData(small_csv)
+    assert os.path.exists(small_csv + ".d.gecache")
+    assert first.load_stats["source"] == "csv"
+    assert second.load_stats["source"] == "cache"
+    assert isinstance(second.matrix, memoryview)
+    assert second.matrix.tolist() == first.matrix.tolist()
+    assert second.sample_types == first.sample_types
+    assert dict(second.dict_gene_hcc) == dict(first.dict_gene_hcc)
+
+
+def test_changed_content_with_same_size_and_mtime_is_rebuilt(small_csv):
+    GeneExpressionData(small_csv)
+    stat = os.stat(small_csv)
+    text = open(small_csv, encoding='utf-8').read()
+    # Swap two digits: same size; then restore the mtime so only the hash differs
+    position = text.index("S1,normal,") + len("S1,normal,")
+    changed = text[:position] + ("9" if text[position] != "9" else "8") + text[position + 1:]
+    open(small_csv, 'w', encoding='utf-8').write(changed)
+    os.utime(small_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    reloaded = GeneExpressionData(small_csv)
+    assert reloaded.load_stats["source"] == "csv"
+    assert reloaded.dict_sample["S1"][1] == GeneExpressionData(
+        small_csv, use_cache=False).dict_sample["S1"][1]
+
+
+def test_typecodes_keep_separate_sidecars(small_csv):
+    GeneExpressionData(small_csv, typecode='d')
+    GeneExpressionData(small_csv, typecode='f')
+    assert GeneExpressionData(small_csv, typecode='d').load_stats["source"] == "cache"
+    assert GeneExpressionData(small_csv, typecode='f').load_stats["source"] == "cache"
+    assert BinaryCache(small_csv, 'f').cache_path == small_csv + ".f.gecache"
+
+
+def test_no_cache_option_writes_no_sidecar(small_csv, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv",
+                        ["final_main.py", small_csv, "screen", "G1", "5", "2", "--no-cache"])
+    final_main.main()
+    capsys.readouterr()
+    assert not os.path.exists(small_csv + ".d.gecache")
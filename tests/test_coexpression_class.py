@@ -0,0 +1,85 @@
+"""Tests for the blocked gene co-expression search."""
+
+import math
+import statistics
+
+import pytest
+
+import coexpression_class
+from conftest import write_expression_csv
+from coexpression_class import push_partner, rank_transform, unit_vector
+from expression_class import GeneExpressionData
+from statistical_class import StatisticalAnalysis
+
+
+def test_rank_transform_averages_ties():
+    assert rank_transform([3.0, 1.0, 3.0, 2.0]) == [2 * 3.5 - 1, 1, 2 * 3.5 - 1, 3]
+
+
+def test_unit_vector_of_constant_values_is_none():
+    assert unit_vector([2.0, 2.0, 2.0]) is None
+    assert unit_vector([]) is None
+    vector = unit_vector([1.0, 2.0, 6.0])
+    assert sum(vector) == pytest.approx(0.0, abs=1e-12)
+    assert math.fsum(value * value for value in vector) == pytest.approx(1.0)
+
+
+def test_streaming_top_k_keeps_the_strongest_entries():
+    heap = []
+    for entry in [(0.1, 0, 0.1), (0.9, -1, -0.9), (0.5, -2, 0.5), (0.7, -3, 0.7)]:
+        push_partner(heap, 2, entry)
+    assert sorted(heap, reverse=True) == [(0.9, -1, -0.9), (0.7, -3, 0.7)]
+
+
+@pytest.fixture
+def correlated_csv(tmp_path):
+    """Ten samples per group; G1 follows G0, G2 mirrors it and G3 is noise."""
+    rows, sample_types = [], []
+    for group, slope in (('HCC', 1.0), ('normal', -1.0)):
+        for step in range(10):
+            base = float(step)
+            rows.append([base, 2 * base + 1, slope * (10 - base) + 0.3 * (step % 3),
+                         [4.0, 1.0, 7.0, 3.0, 9.0, 2.0, 8.0, 5.0, 6.0, 0.5][step], 5.0])
+            sample_types.append(group)
+    return write_expression_csv(tmp_path / "corr.csv", sample_types, rows)
+
+
+def test_partners_match_statistics_correlation(correlated_csv, monkeypatch):
+    # Small blocks make the search cross several block boundaries
+    monkeypatch.setattr(coexpression_class, "BLOCK_SIZE", 2)
+    monkeypatch.setattr("statistical_class.BLOCK_SIZE", 2)
+    analysis = StatisticalAnalysis(GeneExpressionData(correlated_csv, use_cache=False))
+    result = analysis.coexpression(["G0"], k=3)
+    expression_obj = analysis.expression_obj
+    for group in ('HCC', 'normal'):
+        partners = result["G0"][group]
+        # G0 itself and the constant G4 are never partners
+        assert set(partners) == {"G1", "G2", "G3"}
+        assert list(partners)[0] == "G1" and partners["G1"] == pytest.approx(1.0)
+        view = expression_obj.dict_gene_hcc if group == 'HCC' else expression_obj.dict_gene_normal
+        for partner, correlation in partners.items():
+            assert correlation == pytest.approx(
+                statistics.correlation(view["G0"], view[partner]))
+    spearman = analysis.coexpression(["G0"], k=1, method='spearman')
+    assert spearman["G0"]["HCC"] == {"G1": pytest.approx(1.0)}
+
+
+def test_default_query_is_the_top_differential_genes(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    top = list(analysis.compare_differential_numbers(analysis.expression_obj.gene_names, 2))
+    assert list(analysis.coexpression(k=2, number=2)) == top[1:]
+    with pytest.raises(ValueError):
+        analysis.coexpression(["G0"], method='kendall')
+    with pytest.raises(ValueError):
+        analysis.coexpression(["missing"])
+    with pytest.raises(ValueError):
+        analysis.coexpression(["G0"], k=0)
+
+
+def test_group_without_samples_has_no_partners(tmp_path):
+    path = write_expression_csv(tmp_path / "hcc.csv", ['HCC'] * 3,
+                                [[1.0, 2.0, 0.5], [2.0, 4.1, 0.2], [3.0, 5.9, 0.9]])
+    analysis = StatisticalAnalysis(GeneExpressionData(path, use_cache=False))
+    result = analysis.coexpression(["G0"], k=5)
+    assert list(result["G0"]["HCC"]) == ["G1", "G2"]
+    assert result["G0"]["normal"] == {}
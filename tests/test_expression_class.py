@@ -0,0 +1,269 @@
+"""Tests for loading expression data into the matrix-backed GeneExpressionData."""
+
+import math
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+import pytest
+
+import expression_class
+from conftest import write_expression_csv
+from expression_class import GeneExpressionData
+
+
+def load_reference(path):
+    """Load the file the way the original dictionary-based loader did."""
+    dict_sample = {}
+    dict_gene_hcc = defaultdict(list)
+    dict_gene_normal = defaultdict(list)
+    with open(path, 'r', encoding='utf-8') as liver_file:
+        keys = [key.strip() for key in liver_file.readline().split(',')[2:]]
+        for line in liver_file:
+            words = line.split(',')
+            items = [float(value) for value in words[2:]]
+            dict_sample[words[0]] = [words[1], items]
+            for col, item in enumerate(items):
+                if words[1] == 'HCC':
+                    dict_gene_hcc[keys[col]].append(item)
+                if words[1] == 'normal':
+                    dict_gene_normal[keys[col]].append(item)
+    return dict_gene_hcc, dict_gene_normal, dict_sample
+
+
+def test_views_match_original_dictionaries(small_csv):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    dict_gene_hcc, dict_gene_normal, dict_sample = load_reference(small_csv)
+    assert dict(expression_obj.dict_gene_hcc) == dict(dict_gene_hcc)
+    assert dict(expression_obj.dict_gene_normal) == dict(dict_gene_normal)
+    assert dict(expression_obj.dict_sample) == dict_sample
+    assert list(expression_obj.dict_gene_hcc) == list(dict_gene_hcc)
+    assert "G0" in expression_obj.dict_gene_hcc
+    assert "missing" not in expression_obj.dict_gene_normal
+    # The 'other' sample is only in the sample dictionary
+    assert expression_obj.dict_sample["S5"][0] == 'other'
+    assert len(expression_obj.dict_gene_hcc["G0"]) == 5
+
+
+def test_matrix_is_one_typed_array(small_csv):
+    expression_obj = GeneExpressionData(small_csv, typecode='f', use_cache=False)
+    assert expression_obj.matrix.typecode == 'f'
+    assert len(expression_obj.matrix) == 9 * 6
+    assert expression_obj.gene_column("G2")[0] == pytest.approx(
+        expression_obj.dict_sample["S0"][1][2], rel=1e-6)
+
+
+def test_repeated_sample_keeps_first_position_and_last_row(tmp_path):
+    path = write_expression_csv(tmp_path / "dup.csv", ['HCC', 'normal', 'HCC'],
+                                [[1.0], [2.0], [3.0]])
+    path_rows = open(path, encoding='utf-8').read().replace("S2,", "S0,")
+    open(path, 'w', encoding='utf-8').write(path_rows)
+    expression_obj = GeneExpressionData(path, use_cache=False)
+    assert list(expression_obj.dict_sample) == ["S0", "S1"]
+    assert expression_obj.dict_sample["S0"] == ['HCC', [3.0]]
+    assert expression_obj.dict_gene_hcc["G0"] == [1.0, 3.0]
+
+
+def test_empty_group_view_has_no_genes(tmp_path):
+    path = write_expression_csv(tmp_path / "hcc.csv", ['HCC'], [[1.0, 2.0]])
+    expression_obj = GeneExpressionData(path, use_cache=False)
+    assert len(expression_obj.dict_gene_normal) == 0
+    assert "G0" not in expression_obj.dict_gene_normal
+
+
+def test_short_row_is_rejected(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("samples,type,G0,G1\nS0,HCC,1.0\n")
+    with pytest.raises(ValueError):
+        GeneExpressionData(str(path), use_cache=False)
+
+
+def test_file_is_parsed_once(small_csv, monkeypatch):
+    import expression_class
+    calls = []
+    original = expression_class.read_expression_stream
+    monkeypatch.setattr(expression_class, "read_expression_stream",
+                        lambda *args: calls.append(1) or original(*args))
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    assert expression_obj.load_data()[0] is expression_obj.dict_gene_hcc
+    assert len(calls) == 1
+    expression_obj.load_data(reload=True)
+    assert len(calls) == 2
+
+
+def test_load_statistics_have_the_same_keys_for_csv_and_cache(small_csv):
+    from_csv = GeneExpressionData(small_csv).load_stats
+    from_cache = GeneExpressionData(small_csv).load_stats
+    assert from_csv["source"] == "csv" and from_cache["source"] == "cache"
+    assert set(from_csv) == set(from_cache) == {
+        "rows", "bytes", "seconds", "rows_per_s", "mb_per_s", "source"}
+    assert from_csv["rows"] == from_cache["rows"] == 9
+    assert from_csv["bytes"] == len(open(small_csv, 'rb').read())
+
+
+def test_lazy_views_match_memory_views(small_csv):
+    memory_obj = GeneExpressionData(small_csv, use_cache=False)
+    lazy_obj = GeneExpressionData(small_csv, use_cache=False, mode='lazy')
+    assert lazy_obj.load_stats["source"] == "index"
+    assert dict(lazy_obj.dict_gene_hcc) == dict(memory_obj.dict_gene_hcc)
+    assert dict(lazy_obj.dict_gene_normal) == dict(memory_obj.dict_gene_normal)
+    assert dict(lazy_obj.dict_sample) == dict(memory_obj.dict_sample)
+    # Columns and rows are decoded without parsing the whole matrix
+    assert 'matrix' not in vars(lazy_obj)
+
+
+def test_lazy_columns_are_decoded_once(small_csv):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False, mode='lazy')
+    expression_obj.decode_columns(["G1", "G3"])
+    assert set(expression_obj.column_cache) == {"G1", "G3"}
+    column = expression_obj.column_cache["G3"]
+    assert expression_obj.gene_column("G3") is column
+    assert expression_obj.gene_column("G0") is expression_obj.column_cache["G0"]
+
+
+def test_lazy_matrix_is_parsed_on_first_use(small_csv):
+    memory_obj = GeneExpressionData(small_csv, use_cache=False)
+    expression_obj = GeneExpressionData(small_csv, use_cache=False, mode='lazy')
+    expression_obj.decode_columns(["G2"])
+    assert expression_obj.matrix == memory_obj.matrix
+    assert expression_obj.row_offsets is None and expression_obj.column_cache == {}
+    assert expression_obj.gene_column("G2") == memory_obj.gene_column("G2")
+
+
+def test_concurrent_lazy_loads_parse_the_file_once(small_csv, monkeypatch):
+    memory_obj = GeneExpressionData(small_csv, use_cache=False)
+    expression_obj = GeneExpressionData(small_csv, use_cache=False, mode='lazy')
+    parsed = []
+    original = expression_class.read_expression_stream
+
+    def slow_read(*args):
+        parsed.append(1)
+        time.sleep(0.05)  # Keep the first load running while the other threads arrive
+        return original(*args)
+
+    monkeypatch.setattr(expression_class, "read_expression_stream", slow_read)
+    results, errors = [], []
+
+    def query(number):
+        try:
+            if number % 2:
+                results.append(list(expression_obj.matrix))
+            else:
+                results.append(list(expression_obj.gene_column(f"G{number}")))
+        except Exception as error:  # Collected for the assertion below
+            errors.append(error)
+
+    threads = [threading.Thread(target=query, args=(number,)) for number in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(parsed) == 1
+    assert expression_obj.matrix == memory_obj.matrix
+    assert list(memory_obj.matrix) in results
+
+
+def test_lazy_mode_uses_a_valid_cache(small_csv):
+    GeneExpressionData(small_csv)
+    expression_obj = GeneExpressionData(small_csv, mode='lazy')
+    assert expression_obj.load_stats["source"] == "cache"
+    assert expression_obj.row_offsets is None
+
+
+def test_lazy_reload_indexes_the_rows_again(small_csv):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False, mode='lazy')
+    version = expression_obj.data_version
+    expression_obj.matrix
+    expression_obj.load_data(reload=True)
+    assert expression_obj.row_offsets is not None
+    assert expression_obj.data_version > version
+    assert 'matrix' not in vars(expression_obj)
+
+
+def split_csv(path, tmp_path, first_rows):
+    """Split a data file into a base file and a file of the later samples."""
+    lines = open(path, encoding='utf-8').read().splitlines(keepends=True)
+    base = tmp_path / "base.csv"
+    extra = tmp_path / "extra.csv"
+    base.write_text("".join(lines[:first_rows + 1]))
+    extra.write_text("".join(lines[:1] + lines[first_rows + 1:]))
+    return str(base), str(extra)
+
+
+def test_appended_samples_equal_the_whole_file(small_csv, tmp_path):
+    base, extra = split_csv(small_csv, tmp_path, 4)
+    whole = GeneExpressionData(small_csv, use_cache=False)
+    GeneExpressionData(base)
+    # The base data comes from the memory-mapped sidecar
+    expression_obj = GeneExpressionData(base)
+    assert expression_obj.load_stats["source"] == "cache"
+    version = expression_obj.data_version
+    rows = expression_obj.append_samples(extra)
+    assert [sample for sample, _, _ in rows] == ["S4", "S5", "S6", "S7", "S8"]
+    assert expression_obj.data_version > version
+    assert expression_obj.matrix == whole.matrix
+    assert dict(expression_obj.dict_gene_hcc) == dict(whole.dict_gene_hcc)
+    assert dict(expression_obj.dict_sample) == dict(whole.dict_sample)
+
+
+def test_appended_samples_need_the_same_genes(small_csv, tmp_path):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    other = write_expression_csv(tmp_path / "other.csv", ['HCC'], [[1.0, 2.0]])
+    with pytest.raises(ValueError):
+        expression_obj.append_samples(other)
+    with pytest.raises(ValueError):
+        GeneExpressionData(small_csv, mode='stream').append_samples(small_csv)
+
+
+def test_sample_profiles_are_collected_while_parsing(tmp_path):
+    rows = [[float(value) for value in range(1, 21)], [2.0, float('nan')] * 10]
+    path = write_expression_csv(tmp_path / "qc.csv", ['HCC', 'normal'], rows)
+    expression_obj = GeneExpressionData(path)
+    profiles = expression_obj.sample_profiles
+    assert profiles[0] == {"min": 1.0, "max": 20.0, "mean": 10.5, "missing": 0,
+                           "quantiles": [1.0, 5.0, 10.0, 15.0, 19.0]}
+    assert profiles[1]["missing"] == 10 and profiles[1]["mean"] == 2.0
+    # The profiles are saved in the sidecar and the lazy mode computes them itself
+    assert GeneExpressionData(path).sample_profiles[0] == profiles[0]
+    lazy_obj = GeneExpressionData(path, use_cache=False, mode='lazy')
+    assert lazy_obj.profile_samples()[0] == profiles[0]
+    assert 'matrix' not in vars(lazy_obj)
+
+
+def test_profile_min_max_skip_missing_values_in_any_position():
+    for row in ([math.nan, 1.0, 2.0], [1.0, math.nan, 2.0], [1.0, 2.0, math.nan]):
+        profile = expression_class.profile_row(array('d', row))
+        assert (profile["min"], profile["max"], profile["missing"]) == (1.0, 2.0, 1)
+    profile = expression_class.profile_row(array('d', [math.nan, math.nan]))
+    assert math.isnan(profile["min"]) and math.isnan(profile["max"])
+    assert profile["missing"] == 2
+
+
+def test_appended_samples_extend_the_profiles(small_csv, tmp_path):
+    base, extra = split_csv(small_csv, tmp_path, 4)
+    expression_obj = GeneExpressionData(base, use_cache=False)
+    expression_obj.append_samples(extra)
+    whole = GeneExpressionData(small_csv, use_cache=False)
+    assert expression_obj.sample_profiles == whole.sample_profiles
+    assert expression_obj.dict_sample_profile() == whole.dict_sample_profile()
+
+
+def test_every_sample_type_is_a_group(small_csv):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    assert expression_obj.group_names == ['HCC', 'normal', 'other']
+    assert list(expression_obj.group_index) == [0, 1, 0, 0, 1, 2, 0, 1, 0]
+    assert expression_obj.group_mask('HCC') == expression_obj.hcc_mask
+    assert expression_obj.group_mask('other') == bytes([0, 0, 0, 0, 0, 1, 0, 0, 0])
+    assert expression_obj.group_mask('cirrhosis') == bytes(9)
+
+
+@pytest.mark.parametrize("mode", ['memory', 'lazy'])
+def test_unknown_gene_raises_value_error(small_csv, mode):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False, mode=mode)
+    with pytest.raises(ValueError, match="Gene nope not found"):
+        expression_obj.decode_columns(["G1", "nope"])
+    with pytest.raises(ValueError, match="Gene nope not found"):
+        expression_obj.find_dict_desired_expression(["nope"])
+    with pytest.raises(ValueError):
+        expression_obj.gene_column("nope")
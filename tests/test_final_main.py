@@ -0,0 +1,38 @@
+"""Tests for the command line entry point."""
+
+import gzip
+import sys
+
+import final_main
+
+
+def run_main(monkeypatch, *arguments):
+    """Run final_main.main() with the given command line arguments."""
+    monkeypatch.setattr(sys, "argv", ["final_main.py", *arguments])
+    final_main.main()
+
+
+def test_split_options_accepts_flags_and_values():
+    arguments, options = final_main.split_options(
+        ["data.csv", "--workers", "2", "screen", "--verbose"])
+    assert arguments == ["data.csv", "screen"]
+    assert options == {"workers": "2", "verbose": True}
+
+
+def test_verbose_reports_load_throughput(small_csv, monkeypatch, capsys):
+    run_main(monkeypatch, small_csv, "screen", "G1", "5", "2", "--verbose")
+    captured = capsys.readouterr()
+    assert "Loaded 9 rows" in captured.err
+    assert "rows/s" in captured.err and "MB/s" in captured.err
+    assert "Loaded" not in captured.out
+
+
+def test_report_file_holds_every_section(small_csv, tmp_path, monkeypatch):
+    path = tmp_path / "report.tsv.gz"
+    run_main(monkeypatch, small_csv, "file_path", "G1,G2", "5", "2", str(path),
+             "--format", "tsv")
+    with gzip.open(path, 'rt', encoding='utf-8') as report_file:
+        headers = [line for line in report_file if line.startswith("# ")]
+    assert len(headers) == 11
+    assert headers[0] == "# List of all sample names:\n"
+    assert headers[-1] == "# Maximum expression list for each sample:\n"
@@ -0,0 +1,100 @@
+"""Tests for the threshold index behind get_high_threshold."""
+
+import math
+from array import array
+
+import pytest
+
+from conftest import write_expression_csv
+from expression_class import GeneExpressionData
+from statistical_class import StatisticalAnalysis
+
+
+def reference_high_threshold(expression_obj, threshold):
+    """Scan every gene the way the original get_high_threshold did."""
+    dict_above = {}
+    for gene_name in expression_obj.dict_gene_hcc:
+        values = [expr for expr in expression_obj.dict_gene_hcc[gene_name]
+                  + expression_obj.dict_gene_normal[gene_name] if expr > threshold]
+        if values:
+            dict_above[gene_name] = values
+    return {"Gene name": "Expressions value", **dict_above}
+
+
+@pytest.fixture
+def analysis(small_csv):
+    """Serial analysis of the small data set."""
+    return StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+
+
+def test_threshold_sweep_matches_full_scan(analysis):
+    for threshold in (0.0, 5.0, 10.0, 13.5, 14.9, 100.0):
+        assert analysis.get_high_threshold(threshold) == \
+            reference_high_threshold(analysis.expression_obj, threshold)
+
+
+def test_first_values_query_builds_no_index(analysis):
+    analysis.get_high_threshold(10.0)
+    assert analysis.threshold_index is None
+    analysis.get_high_threshold(12.0)
+    assert analysis.threshold_index is not None
+
+
+def test_counts_and_top_values(analysis):
+    reference = reference_high_threshold(analysis.expression_obj, 9.0)
+    counts = analysis.get_high_threshold(9.0, mode='count')
+    top = analysis.get_high_threshold(9.0, mode='top', top_k=2)
+    assert list(counts)[1:] == list(reference)[1:]
+    for gene_name, values in list(reference.items())[1:]:
+        assert counts[gene_name] == len(values)
+        assert top[gene_name] == sorted(values, reverse=True)[:2]
+    with pytest.raises(ValueError):
+        analysis.get_high_threshold(9.0, mode='top')
+
+
+def test_values_are_sorted_only_for_genes_above_threshold(analysis):
+    index = analysis.get_threshold_index()
+    assert index.sorted_values == {}
+    threshold = index.sorted_max[-2]
+    counts = analysis.get_high_threshold(threshold, mode='count')
+    top_position = index.order_by_max[-1]
+    assert list(counts)[1:] == [index.gene_names[top_position]]
+    assert list(index.sorted_values) == [top_position]
+    assert index.sorted_values[top_position][-1] == index.sorted_max[-1]
+
+
+def test_index_is_rebuilt_after_data_changes(analysis):
+    expression_obj = analysis.expression_obj
+    first_index = analysis.get_threshold_index()
+    assert analysis.get_high_threshold(14.0, mode='count') != {
+        "Gene name": "Number of values above threshold", "G0": 1}
+    expression_obj.set_matrix(array('d', [20.0, 1.0, 2.0, 1.0]), ["G0", "G1"],
+                              ["S0", "S1"], ["HCC", "normal"])
+    assert analysis.get_threshold_index() is not first_index
+    assert analysis.get_high_threshold(14.0, mode='count') == {
+        "Gene name": "Number of values above threshold", "G0": 1}
+    assert analysis.get_high_threshold(14.0) == {"Gene name": "Expressions value", "G0": [20.0]}
+    expression_obj.load_data(reload=True)
+    assert analysis.get_high_threshold(9.0, mode='count')["G0"] == sum(
+        value > 9.0 for value in expression_obj.dict_gene_hcc["G0"]
+        + expression_obj.dict_gene_normal["G0"])
+
+
+def test_sorted_values_keep_the_data_typecode(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, typecode='f', use_cache=False))
+    assert analysis.sorted_gene_values(["G0"])[0].typecode == 'f'
+
+
+def test_missing_values_do_not_hide_genes(tmp_path):
+    path = write_expression_csv(
+        tmp_path / "nan.csv", ['HCC', 'HCC', 'normal', 'normal'],
+        [[math.nan, 3.0], [50.0, math.nan], [1.0, 12.0], [2.0, 4.0]])
+    analysis = StatisticalAnalysis(GeneExpressionData(path, use_cache=False))
+    assert analysis.gene_maxima() == [50.0, 12.0]
+    for _ in range(2):
+        for threshold in (0.0, 3.5, 10.0, 20.0, 60.0):
+            assert analysis.get_high_threshold(threshold) == \
+                reference_high_threshold(analysis.expression_obj, threshold)
+    assert analysis.get_high_threshold(2.5, mode='count') == {
+        "Gene name": "Number of values above threshold", "G0": 1, "G1": 3}
+    assert analysis.get_high_threshold(2.5, mode='top', top_k=5)["G1"] == [12.0, 4.0, 3.0]
@@ -0,0 +1,67 @@
+"""Tests for the bounded statistics cache and its use by StatisticalAnalysis."""
+
+from array import array
+
+import pytest
+
+from expression_class import GeneExpressionData
+from memo_class import StatisticsCache
+from statistical_class import StatisticalAnalysis
+
+
+def test_least_recently_used_result_is_evicted():
+    cache = StatisticsCache(max_entries=2)
+    cache.lookup(("G0", "mean", "all"), lambda: 1.0)
+    cache.lookup(("G1", "mean", "all"), lambda: 2.0)
+    # Using G0 again makes G1 the oldest entry
+    assert cache.lookup(("G0", "mean", "all"), lambda: pytest.fail("recomputed")) == 1.0
+    cache.lookup(("G2", "mean", "all"), lambda: 3.0)
+    assert list(cache.entries) == [("G0", "mean", "all"), ("G2", "mean", "all")]
+    assert cache.statistics() == {"entries": 2, "max_entries": 2, "hits": 1, "misses": 3,
+                                  "evictions": 1}
+
+
+def test_failed_and_disabled_lookups_are_not_stored():
+    cache = StatisticsCache(max_entries=0)
+    assert cache.lookup("key", lambda: 5) == 5
+    assert len(cache) == 0
+
+    def fail():
+        raise ValueError("no values")
+
+    cache = StatisticsCache()
+    with pytest.raises(ValueError):
+        cache.lookup("key", fail)
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        StatisticsCache(-1)
+
+
+def test_overlapping_queries_reuse_cached_statistics(small_csv, monkeypatch):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    expected = StatisticalAnalysis(analysis.expression_obj, cache_size=0)
+    assert analysis.calculate_mean(["G0", "G1"]) == expected.calculate_mean(["G0", "G1"])
+    calls = []
+    original = analysis.gene_values
+    monkeypatch.setattr(analysis, "gene_values", lambda name: calls.append(name) or original(name))
+    assert (analysis.calculate_standard_deviation_variance(["G1", "G2"])
+            == expected.calculate_standard_deviation_variance(["G1", "G2"]))
+    # G1's mean is cached; G2 needs its values for the mean and the variance
+    assert calls == ["G1", "G2", "G2"]
+    assert analysis.calculate_differential(["G3"]) == expected.calculate_differential(["G3"])
+    assert analysis.calculate_differential(["G3"]) == expected.calculate_differential(["G3"])
+    assert analysis.stats_cache.statistics()["hits"] >= 3
+
+
+def test_cache_is_emptied_when_the_data_changes(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    expression_obj = analysis.expression_obj
+    genes = expression_obj.gene_names
+    before = analysis.calculate_mean(["G0"])
+    analysis.compare_differential_numbers(genes, 2)
+    doubled = array(expression_obj.typecode, (2 * value for value in expression_obj.matrix))
+    expression_obj.set_matrix(doubled, genes, expression_obj.sample_ids,
+                              expression_obj.sample_types)
+    assert analysis.calculate_mean(["G0"])["G0"] == pytest.approx(2 * before["G0"], abs=1e-3)
+    assert analysis.compare_differential_numbers(genes, 2) == StatisticalAnalysis(
+        expression_obj, cache_size=0).compare_differential_numbers(genes, 2)
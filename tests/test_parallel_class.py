@@ -0,0 +1,83 @@
+"""Tests for the gene-sharded process pool analysis."""
+
+import signal
+import threading
+from array import array
+
+import pytest
+
+from expression_class import GeneExpressionData
+from parallel_class import ParallelAnalysis
+from statistical_class import StatisticalAnalysis
+
+
+@pytest.fixture
+def analyses(small_csv):
+    """A serial and a 2-worker analysis of the same data."""
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    with ParallelAnalysis(expression_obj, 2) as parallel:
+        yield StatisticalAnalysis(expression_obj), parallel
+
+
+def test_parallel_results_equal_serial(analyses):
+    serial, parallel = analyses
+    genes = serial.expression_obj.gene_names
+    mask = serial.expression_obj.hcc_mask
+    assert parallel.group_sums(mask) == serial.group_sums(mask)
+    assert parallel.group_sums(mask, 1, 4) == serial.group_sums(mask, 1, 4)
+    assert parallel.calculate_fold_changes(genes) == serial.calculate_fold_changes(genes)
+    assert parallel.compare_differential_numbers(genes, 4) == \
+        serial.compare_differential_numbers(genes, 4)
+    assert parallel.summarize_genes() == serial.summarize_genes()
+    assert parallel.sorted_gene_values(genes) == serial.sorted_gene_values(genes)
+    for test in ('welch', 'mannwhitney'):
+        assert parallel.significance_tests(genes, test) == serial.significance_tests(genes, test)
+    for mode in ('values', 'count', 'top'):
+        assert parallel.get_high_threshold(9.0, mode, top_k=2) == \
+            serial.get_high_threshold(9.0, mode, top_k=2)
+    for method in ('pearson', 'spearman'):
+        assert parallel.coexpression(["G0", "G3"], 2, method) == \
+            serial.coexpression(["G0", "G3"], 2, method)
+    assert parallel.group_moments() == serial.group_moments()
+    assert parallel.compare_groups() == serial.compare_groups()
+    for kind in ('bootstrap', 'permutation'):
+        assert parallel.resample_fold_changes(kind, 20, 2, seed=5) == \
+            serial.resample_fold_changes(kind, 20, 2, seed=5)
+
+
+def test_concurrent_start_creates_one_pool(analyses):
+    _, parallel = analyses
+    threads = [threading.Thread(target=parallel.start) for _ in range(8)]
+    pools = []
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+        pools.append(parallel.pool)
+    assert len(set(map(id, pools))) == 1
+    assert parallel.shm is not None
+
+
+def test_workers_ignore_interrupts(analyses):
+    _, parallel = analyses
+    parallel.start()
+    assert parallel.pool.submit(signal.getsignal, signal.SIGINT).result() == signal.SIG_IGN
+
+
+def test_close_releases_the_pool(small_csv):
+    parallel = ParallelAnalysis(GeneExpressionData(small_csv, use_cache=False), 2)
+    parallel.summarize_genes(["G0"])
+    parallel.close()
+    assert parallel.pool is None and parallel.shm is None
+    parallel.close()
+
+
+def test_pool_follows_data_changes(analyses):
+    serial, parallel = analyses
+    first = parallel.get_high_threshold(5.0, mode='count')
+    assert first == serial.get_high_threshold(5.0, mode='count')
+    parallel.expression_obj.set_matrix(array('d', [20.0, 1.0, 2.0, 1.0]), ["G0", "G1"],
+                                       ["S0", "S1"], ["HCC", "normal"])
+    assert parallel.get_high_threshold(14.0, mode='count') == {
+        "Gene name": "Number of values above threshold", "G0": 1}
+    assert parallel.summarize_genes() == serial.summarize_genes()
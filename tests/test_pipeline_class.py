@@ -0,0 +1,139 @@
+"""Tests for the overlapped parse, compute and report pipeline."""
+
+import gzip
+import queue
+import shutil
+import sys
+import threading
+
+import pytest
+
+import final_main
+import pipeline_class
+from conftest import write_expression_csv
+from expression_class import GeneExpressionData
+from pipeline_class import AnalysisPipeline, StageThread, put_item, row_ranges
+from report_class import REPORT_HEADERS, AnalysisReport
+from statistical_class import StatisticalAnalysis
+
+
+def test_row_ranges_end_on_line_boundaries(small_csv):
+    header, ranges = row_ranges(small_csv, 50)
+    with open(small_csv, 'rb') as csv_file:
+        content = csv_file.read()
+    assert header.startswith("samples,type,G0")
+    assert ranges[0][0] == len(header) and ranges[-1][1] == len(content)
+    assert all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:]))
+    assert all(content[stop - 1:stop] == b"\n" for _, stop in ranges)
+
+
+@pytest.mark.parametrize("cpus, workers", [(1, 1), (4, 1), (4, 2)])
+def test_pipelined_load_equals_memory_load(small_csv, monkeypatch, cpus, workers):
+    # With one CPU the chunks are parsed in the main process, else in a pool
+    monkeypatch.setattr(pipeline_class, "available_cpus", lambda: cpus)
+    whole = GeneExpressionData(small_csv, use_cache=False)
+    pipeline = AnalysisPipeline(
+        GeneExpressionData(small_csv, use_cache=False, mode='stream', workers=workers),
+        depth=2, chunk_bytes=100)
+    loaded = pipeline.load()
+    assert loaded.matrix == whole.matrix
+    assert loaded.sample_ids == whole.sample_ids
+    assert loaded.sample_types == whole.sample_types
+    assert loaded.profile_samples() == whole.profile_samples()
+    assert loaded.load_stats["rows"] == 9 and loaded.load_stats["source"] == "pipeline"
+    analysis = StatisticalAnalysis(whole)
+    assert pipeline.sums_hcc == analysis.group_sums(whole.hcc_mask)
+    assert pipeline.sums_normal == analysis.group_sums(whole.normal_mask)
+
+
+def test_compressed_and_plain_shards_are_merged_in_order(small_csv, tmp_path):
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    shutil.copy(small_csv, shard_dir / "a.csv")
+    with open(small_csv, 'rb') as source, gzip.open(shard_dir / "b.csv.gz", 'wb') as target:
+        target.write(source.read())
+    whole = GeneExpressionData([small_csv, small_csv], use_cache=False)
+    loaded = AnalysisPipeline(GeneExpressionData(str(shard_dir), mode='stream'),
+                              chunk_bytes=100).load()
+    assert loaded.matrix == whole.matrix and loaded.sample_ids == whole.sample_ids
+
+
+def test_pipeline_writes_and_uses_the_sidecar(small_csv):
+    first = AnalysisPipeline(GeneExpressionData(small_csv, mode='stream')).load()
+    pipeline = AnalysisPipeline(GeneExpressionData(small_csv, mode='stream'))
+    cached = pipeline.load()
+    assert cached.load_stats["source"] == "cache"
+    assert list(cached.matrix) == list(first.matrix)
+    assert cached.profile_samples() == first.profile_samples()
+    analysis = StatisticalAnalysis(cached)
+    pipeline.seed_statistics(analysis)
+    assert len(analysis.stats_cache) == 0
+
+
+def test_pipeline_needs_a_streamed_data_set(small_csv):
+    with pytest.raises(ValueError):
+        AnalysisPipeline(GeneExpressionData(small_csv, use_cache=False))
+
+
+@pytest.mark.parametrize("cpus", [1, 4])
+def test_parse_errors_reach_the_caller(tmp_path, monkeypatch, cpus):
+    monkeypatch.setattr(pipeline_class, "available_cpus", lambda: cpus)
+    path = write_expression_csv(tmp_path / "short.csv", ['HCC', 'normal'], [[1.0, 2.0], [3.0]])
+    with pytest.raises(ValueError):
+        AnalysisPipeline(GeneExpressionData(path, use_cache=False, mode='stream'),
+                         chunk_bytes=10).load()
+
+
+def test_full_queue_holds_the_producer_back():
+    stage_queue = queue.Queue(1)
+    stopped = threading.Event()
+    assert put_item(stage_queue, 1, stopped)
+    producer = StageThread(put_item, stage_queue, 2, stopped)
+    producer.start()
+    producer.join(0.3)
+    assert producer.is_alive() and stage_queue.qsize() == 1
+    assert stage_queue.get() == 1
+    producer.join()
+    assert stage_queue.get() == 2
+    stopped.set()
+    assert not put_item(stage_queue, 3, stopped)
+
+
+def test_seeded_sums_are_skipped_after_appended_samples(small_csv, tmp_path):
+    pipeline = AnalysisPipeline(GeneExpressionData(small_csv, use_cache=False, mode='stream'))
+    expression_obj = pipeline.load()
+    analysis = StatisticalAnalysis(expression_obj)
+    pipeline.seed_statistics(analysis)
+    assert len(analysis.stats_cache) == 2
+    extra = write_expression_csv(tmp_path / "extra.csv", ['HCC'], [[1.0] * 6])
+    expression_obj.append_samples(extra)
+    analysis = StatisticalAnalysis(expression_obj)
+    pipeline.seed_statistics(analysis)
+    assert len(analysis.stats_cache) == 0
+
+
+def test_writer_errors_stop_the_sections(small_csv, tmp_path):
+    pipeline = AnalysisPipeline(GeneExpressionData(small_csv, mode='stream'))
+    report = AnalysisReport(str(tmp_path / "report.tsv"), 'tsv')
+    report.generate_report = lambda *section: 1 / 0
+    with pytest.raises(ZeroDivisionError):
+        pipeline.write_sections(report, iter([["S0"]] * len(REPORT_HEADERS)))
+
+
+@pytest.mark.parametrize("extra", [[], ["--no-cache"], ["--workers", "2"],
+                                   ["--format", "jsonl"]])
+def test_pipelined_report_equals_sequential_report(small_csv, monkeypatch, capsys, extra):
+    arguments = [small_csv, "screen", "G1,G2", "5", "3", *extra]
+    monkeypatch.setattr(sys, "argv", ["final_main.py", *arguments])
+    final_main.main()
+    sequential = capsys.readouterr().out
+    monkeypatch.setattr(sys, "argv", ["final_main.py", *arguments, "--pipeline"])
+    final_main.main()
+    assert capsys.readouterr().out == sequential
+
+
+def test_pipeline_and_lazy_are_rejected(small_csv, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["final_main.py", small_csv, "screen", "G1", "5", "3",
+                                      "--pipeline", "--lazy"])
+    final_main.main()
+    assert "Input Error" in capsys.readouterr().out
@@ -0,0 +1,79 @@
+"""Tests for the per-stage profiler."""
+
+import json
+import pstats
+import sys
+import tracemalloc
+
+import final_main
+from expression_class import GeneExpressionData
+from profile_class import DISABLED_STAGE, Profiler
+from statistical_class import StatisticalAnalysis
+
+
+def test_nested_stages_record_time_memory_and_items():
+    profiler = Profiler()
+    finished = []
+    profiler.add_hook(finished.append)
+    with profiler.stage("outer", 3) as outer:
+        with profiler.stage("inner") as inner:
+            block = bytearray(2_000_000)
+            inner["items"] = len(block)
+            del block
+        kept = bytearray(500_000)
+        assert outer["depth"] == 0 and inner["depth"] == 1
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+    inner, outer = profiler.records
+    assert finished == profiler.records
+    assert (inner["name"], inner["parent"], inner["items"]) == ("inner", "outer", 2_000_000)
+    assert inner["peak_bytes"] >= 2_000_000
+    # The outer peak includes the inner one even though the inner stage reset it
+    assert outer["peak_bytes"] >= 2_000_000 and outer["items"] == 3
+    assert outer["wall_s"] >= inner["wall_s"] >= 0
+    assert len(kept) == 500_000
+
+
+def test_disabled_profiler_records_nothing(small_csv):
+    profiler = Profiler(enabled=False)
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    assert profiler.stage("load") is DISABLED_STAGE
+    with profiler.stage("load"):
+        pass
+    assert profiler.instrument(analysis) is analysis
+    assert "calculate_mean" not in vars(analysis)
+    assert profiler.records == [] and not tracemalloc.is_tracing()
+
+
+def test_instrumented_calls_are_nested_stages(small_csv):
+    profiler = Profiler(trace_memory=False)
+    analysis = profiler.instrument(
+        StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False)))
+    result = analysis.calculate_differential(["G0", "G1"])
+    assert result == StatisticalAnalysis(analysis.expression_obj).\
+        calculate_differential(["G0", "G1"])
+    names = [(record["name"], record["parent"], record["items"]) for record in profiler.records]
+    assert names == [("call:calculate_mean_gene_hcc", "call:calculate_differential", 2),
+                     ("call:calculate_mean_gene_normal", "call:calculate_differential", 2),
+                     ("call:calculate_differential", None, 2)]
+    assert profiler.records[0]["peak_bytes"] is None
+
+
+def test_profile_option_writes_trace_and_cprofile_dump(small_csv, tmp_path, monkeypatch,
+                                                       capsys):
+    arguments = [small_csv, "screen", "G1,G2", "5", "2"]
+    monkeypatch.setattr(sys, "argv", ["final_main.py", *arguments])
+    final_main.main()
+    plain = capsys.readouterr().out
+    trace_path = tmp_path / "trace.json"
+    monkeypatch.setattr(sys, "argv", ["final_main.py", *arguments, "--profile", str(trace_path),
+                                      "--profile-stage", "report"])
+    final_main.main()
+    assert capsys.readouterr().out == plain
+    trace = json.loads(trace_path.read_text(encoding='utf-8'))
+    top_level = [record["name"] for record in trace["stages"] if record["depth"] == 0]
+    assert top_level == ["load", "prepare", "statistics", "report"]
+    assert "call:compare_differential_numbers" in [record["name"] for record in trace["stages"]]
+    assert trace["stages"][0]["items"] == 9
+    assert pstats.Stats(f"{trace_path}.prof").total_calls > 0
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,83 @@
+"""Tests for the report formats and destinations of AnalysisReport."""
+
+import gzip
+import json
+
+import pytest
+
+from report_class import AnalysisReport
+
+SECTIONS = [
+    ("List of all sample names:", ["S0", "S1", "S2", "S3"], "End of sample names list"),
+    ("Mean dictionary of desired genes:",
+     {"Desired gene name": "Mean expression", "G0": 1.5, "G1": 2.25}, "End of mean"),
+    ("N Gene names above the threshold:",
+     {"Gene name": "Expressions value", "G1": [9.5, 10.0]}, "End of N genes"),
+]
+
+
+def reference_section(report, header, data, footer):
+    """Format one section the way the original generate_report printed it."""
+    if isinstance(data, dict):
+        result = f"{report.create_header(header)}\n{report.report_dict(data)}\n\
+                  {report.create_footer(footer)}"
+    else:
+        result = f"{report.create_header(header)}\n{report.report_lst(data)}\n\
+            {report.create_footer(footer)}\n"
+    return result + "\n"
+
+
+def write_sections(destination, output_format='text'):
+    """Write every test section to destination and returns the report."""
+    with AnalysisReport(destination, output_format) as report:
+        for header, data, footer in SECTIONS:
+            report.generate_report(header, data, footer)
+    return report
+
+
+def test_text_screen_output_matches_original_format(capsys):
+    report = write_sections('screen')
+    expected = "".join(reference_section(report, *section) for section in SECTIONS)
+    assert capsys.readouterr().out == expected
+
+
+def test_file_keeps_every_section(tmp_path):
+    path = tmp_path / "report.txt"
+    report = write_sections(str(path))
+    expected = "".join(reference_section(report, *section) for section in SECTIONS)
+    assert path.read_text(encoding='utf-8') == expected
+    assert report.sink is None
+
+
+def test_gzip_report_has_the_text_content(tmp_path):
+    write_sections(str(tmp_path / "report.txt"))
+    write_sections(str(tmp_path / "report.txt.gz"))
+    with gzip.open(tmp_path / "report.txt.gz", 'rt', encoding='utf-8') as report_file:
+        assert report_file.read() == (tmp_path / "report.txt").read_text(encoding='utf-8')
+
+
+def test_tsv_sections(tmp_path):
+    path = tmp_path / "report.tsv"
+    write_sections(str(path), 'tsv')
+    assert path.read_text(encoding='utf-8') == (
+        "# List of all sample names:\nS0\nS1\nS2\nS3\n\n"
+        "# Mean dictionary of desired genes:\n"
+        "Desired gene name\tMean expression\nG0\t1.5\nG1\t2.25\n\n"
+        "# N Gene names above the threshold:\n"
+        "Gene name\tExpressions value\nG1\t[9.5, 10.0]\n\n")
+
+
+def test_jsonl_names_fields_from_the_title_entry(tmp_path):
+    path = tmp_path / "report.jsonl"
+    write_sections(str(path), 'jsonl')
+    records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert len(records) == 4 + 2 + 1
+    assert records[0] == {"section": "List of all sample names:", "value": "S0"}
+    assert records[4] == {"section": "Mean dictionary of desired genes:",
+                          "Desired gene name": "G0", "Mean expression": 1.5}
+    assert records[6]["Expressions value"] == [9.5, 10.0]
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        AnalysisReport('screen', 'xml')
@@ -0,0 +1,91 @@
+"""Tests for the bootstrap and permutation stability of fold-change rankings."""
+
+import pytest
+
+from conftest import write_expression_csv
+from expression_class import GeneExpressionData
+from resample_class import (
+    fold_change_scores, merge_counts, replicate_random, replicate_weights, score_ranks)
+from statistical_class import StatisticalAnalysis
+
+
+@pytest.fixture
+def shifted_csv(tmp_path):
+    """Eight samples per group; G0 is strongly up in HCC, the other genes barely move."""
+    rows, sample_types = [], []
+    for group, shift in (('HCC', 10.0), ('normal', 0.0)):
+        for step in range(8):
+            rows.append([20.0 + shift + step % 2, 5.0 + step % 3, 7.0 + step % 4, 9.0 - step % 2])
+            sample_types.append(group)
+    return write_expression_csv(tmp_path / "shifted.csv", sample_types, rows)
+
+
+def test_fold_change_scores_invert_ratios_below_one():
+    assert fold_change_scores([4.0, 1.0, 0.0], [1.0, 4.0, 2.0], 2, 2) == [4.0, 4.0, 0.0]
+    assert fold_change_scores([6.0], [2.0], 3, 1) == [1.0]
+    # Means and ratios are rounded like compare_differential_numbers
+    assert fold_change_scores([3.0], [1.0], 3, 3) == [3.003]
+    assert fold_change_scores([1.0], [3.0], 1, 1) == [3.003]
+
+
+def test_score_ranks_keep_gene_order_for_ties():
+    assert score_ranks([1.0, 3.0, 1.0, 2.0]) == [3, 1, 4, 2]
+
+
+def test_replicate_weights_keep_group_sizes():
+    hcc_rows, normal_rows = [0, 2, 3], [1, 4]
+    for kind in ('bootstrap', 'permutation'):
+        weights_hcc, weights_normal = replicate_weights(
+            kind, replicate_random(0, 5), hcc_rows, normal_rows)
+        assert sum(weights_hcc.values()) == 3
+        assert sum(weights_normal.values()) == 2
+    weights_hcc, weights_normal = replicate_weights(
+        'bootstrap', replicate_random(0, 5), hcc_rows, normal_rows)
+    assert set(weights_hcc) <= set(hcc_rows) and set(weights_normal) <= set(normal_rows)
+
+
+def test_merge_counts_adds_per_key():
+    assert merge_counts([{"top": [1, 0]}, {"top": [2, 3]}]) == {"top": [3, 3]}
+
+
+def test_weighted_sums_count_repeated_rows(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    matrix = analysis.expression_obj.matrix
+    sums = analysis.weighted_sums({0: 2, 3: 1})
+    assert sums == pytest.approx([2 * matrix[col] + matrix[18 + col] for col in range(6)])
+
+
+def test_bootstrap_is_reproducible_and_finds_the_stable_gene(shifted_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(shifted_csv, use_cache=False))
+    result = analysis.resample_fold_changes('bootstrap', replicates=50, number=1, seed=3)
+    assert result == analysis.resample_fold_changes('bootstrap', 50, 1, seed=3)
+    assert result["G0"]["rank"] == 1
+    assert result["G0"]["top_frequency"] == 1.0
+    assert result["G0"]["mean_rank"] == 1.0
+    assert sum(stats["top_frequency"] for stats in result.values()) == pytest.approx(1.0)
+
+
+def test_permutation_p_values(shifted_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(shifted_csv, use_cache=False))
+    result = analysis.resample_fold_changes('permutation', replicates=99, seed=1)
+    assert result["G0"]["p_value"] == pytest.approx(1 / 100)
+    for stats in result.values():
+        assert 1 / 100 <= stats["p_value"] <= 1.0
+        assert stats["q_value"] >= stats["p_value"]
+    assert result["G0"]["score"] == round(30.5 / 20.5, 3)
+
+
+def test_observed_ranks_follow_compare_differential_numbers(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    genes = analysis.expression_obj.gene_names
+    result = analysis.resample_fold_changes('bootstrap', replicates=5, number=3)
+    top = list(analysis.compare_differential_numbers(genes, len(genes)))[1:]
+    assert sorted(genes, key=lambda gene_name: result[gene_name]["rank"]) == top
+
+
+@pytest.mark.parametrize("kind, replicates, number", [
+    ('jackknife', 10, 10), ('bootstrap', 0, 10), ('permutation', 10, 0)])
+def test_invalid_resampling_arguments_raise(small_csv, kind, replicates, number):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    with pytest.raises(ValueError):
+        analysis.resample_fold_changes(kind, replicates, number)
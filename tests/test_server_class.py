@@ -0,0 +1,102 @@
+"""Tests for the persistent query server."""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import write_expression_csv
+from except_class import InputError
+from expression_class import GeneExpressionData
+from server_class import QueryServer
+from statistical_class import StatisticalAnalysis
+
+
+def start_server(path):
+    """Start a query server on a free local port and returns it with its base URL."""
+    analysis = StatisticalAnalysis(GeneExpressionData(path, use_cache=False))
+    server = QueryServer(analysis).make_server('127.0.0.1:0')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", analysis
+
+
+def get_json(url):
+    """Return the status and decoded JSON body of a GET request."""
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_queries_match_analysis(small_csv):
+    server, base, analysis = start_server(small_csv)
+    try:
+        status, body = get_json(f"{base}/mean?genes=G1,G2")
+        assert status == 200
+        assert body == {"G1": analysis.calculate_mean(["G1"])["G1"],
+                        "G2": analysis.calculate_mean(["G2"])["G2"]}
+        status, body = get_json(f"{base}/top?number=2")
+        assert list(body) == list(analysis.compare_differential_numbers(
+            analysis.expression_obj.gene_names, 2))[1:]
+        status, body = get_json(f"{base}/significance?number=3&test=mannwhitney")
+        assert body == dict(list(analysis.compare_significance_numbers(
+            analysis.expression_obj.gene_names, 3, 'mannwhitney').items())[1:])
+        status, body = get_json(f"{base}/coexpression?genes=G1&k=2&method=spearman")
+        assert body == analysis.coexpression(["G1"], 2, 'spearman')
+        status, body = get_json(f"{base}/groups?genes=G1,G4&groups=normal,HCC")
+        assert body == analysis.compare_groups(["G1", "G4"], ['normal', 'HCC'])
+        status, body = get_json(f"{base}/stability?kind=permutation&replicates=9&seed=2")
+        assert body == analysis.resample_fold_changes('permutation', 9, 10, 2)
+        assert get_json(f"{base}/mean?genes=nope")[0] == 400
+        assert get_json(f"{base}/unknown")[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_missing_group_is_sent_as_null(tmp_path):
+    path = write_expression_csv(tmp_path / "hcc.csv", ['HCC', 'HCC'], [[1.0, 2.0], [3.0, 4.0]])
+    server, base, _ = start_server(path)
+    try:
+        status, body = get_json(f"{base}/summary?genes=G0")
+        assert status == 200
+        assert body["G0"]["mean_normal"] is None
+        assert body["G0"]["mean_hcc"] == 2.0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_socket_address_never_removes_regular_files(small_csv, tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("keep me")
+    query_server = QueryServer(StatisticalAnalysis(GeneExpressionData(small_csv,
+                                                                      use_cache=False)))
+    with pytest.raises(InputError):
+        query_server.make_server(str(notes))
+    assert notes.read_text() == "keep me"
+
+    socket_path = str(tmp_path / "q.sock")
+    server = query_server.make_server(socket_path)
+    server.server_close()
+    # A stale socket left behind is replaced
+    query_server.make_server(socket_path).server_close()
+
+
+def test_sample_queries_come_from_the_profiles(small_csv):
+    server, base, analysis = start_server(small_csv)
+    try:
+        status, body = get_json(f"{base}/minmax")
+        assert status == 200
+        dict_min, dict_max = analysis.sample_min_max()
+        assert body == {"min": dict(list(dict_min.items())[1:]),
+                        "max": dict(list(dict_max.items())[1:])}
+        status, body = get_json(f"{base}/qc")
+        assert list(body) == list(analysis.expression_obj.dict_sample)
+        assert body["S0"]["max"] == dict_max["S0"]
+    finally:
+        server.shutdown()
+        server.server_close()
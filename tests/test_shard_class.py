@@ -0,0 +1,73 @@
+"""Tests for loading a data set from several, possibly compressed, shards."""
+
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from expression_class import GeneExpressionData
+from shard_class import open_shard, resolve_shards
+
+
+def write_shards(small_csv, folder):
+    """Split small_csv into 3 shards, compressed differently, and returns their paths."""
+    lines = open(small_csv, encoding='utf-8').read().splitlines(keepends=True)
+    header, rows = lines[0], lines[1:]
+    folder.mkdir()
+    paths = []
+    for number, (opener, suffix) in enumerate(
+            ((open, ''), (gzip.open, '.gz'), (bz2.open, '.bz2'))):
+        path = folder / f"part{number}.csv{suffix}"
+        with opener(path, 'wt', encoding='utf-8') as shard_file:
+            shard_file.write(header + "".join(rows[number * 3:number * 3 + 3]))
+        paths.append(str(path))
+    (folder / "notes.txt").write_text("not a shard")
+    return paths
+
+
+def test_shard_sources_are_resolved_in_order(small_csv, tmp_path):
+    paths = write_shards(small_csv, tmp_path / "shards")
+    assert resolve_shards(str(tmp_path / "shards")) == paths
+    assert resolve_shards(str(tmp_path / "shards" / "part*")) == paths
+    assert resolve_shards(",".join(reversed(paths))) == paths[::-1]
+    assert resolve_shards(paths[1]) == [paths[1]]
+    with pytest.raises(FileNotFoundError):
+        resolve_shards(str(tmp_path / "none*.csv"))
+
+
+def test_compressed_shards_equal_the_single_file(small_csv, tmp_path):
+    paths = write_shards(small_csv, tmp_path / "shards")
+    whole = GeneExpressionData(small_csv, use_cache=False)
+    for workers in (1, 2):
+        expression_obj = GeneExpressionData(str(tmp_path / "shards"), workers=workers)
+        assert expression_obj.sample_ids == whole.sample_ids
+        assert expression_obj.matrix == whole.matrix
+        assert expression_obj.sample_profiles == whole.sample_profiles
+        assert expression_obj.load_stats["source"] == "shards"
+    streamed = GeneExpressionData(paths, mode='stream')
+    assert [sample for sample, _, _ in streamed.iter_rows()] == whole.sample_ids
+    # A lazy data set of compressed shards is loaded completely
+    assert GeneExpressionData(paths, mode='lazy').row_offsets is None
+
+
+def test_single_compressed_file_uses_a_sidecar(small_csv, tmp_path):
+    path = tmp_path / "small.csv.xz"
+    with lzma.open(path, 'wt', encoding='utf-8') as compressed_file:
+        compressed_file.write(open(small_csv, encoding='utf-8').read())
+    assert GeneExpressionData(str(path)).load_stats["source"] == "csv"
+    expression_obj = GeneExpressionData(str(path))
+    assert expression_obj.load_stats["source"] == "cache"
+    assert expression_obj.matrix == GeneExpressionData(small_csv, use_cache=False).matrix
+    with open_shard(path) as shard_file:
+        assert shard_file.readline().startswith("samples,type,G0")
+
+
+def test_shards_with_other_genes_are_rejected(small_csv, tmp_path):
+    paths = write_shards(small_csv, tmp_path / "shards")
+    with gzip.open(paths[1], 'wt', encoding='utf-8') as shard_file:
+        shard_file.write("samples,type,X0\nS9,HCC,1.0\n")
+    with pytest.raises(ValueError, match="gene columns"):
+        GeneExpressionData(paths, use_cache=False)
+    with pytest.raises(ValueError, match="gene columns"):
+        list(GeneExpressionData(paths, mode='stream').iter_rows())
@@ -0,0 +1,97 @@
+"""Tests for the significance tests and the FDR correction."""
+
+import math
+import statistics
+
+import pytest
+
+from expression_class import GeneExpressionData
+from significance_class import (benjamini_hochberg, mann_whitney_test, regularized_beta,
+                                student_t_two_sided, welch_test)
+from statistical_class import StatisticalAnalysis
+
+# R's "sleep" data set: extra hours of sleep with two drugs
+SLEEP_1 = [0.7, -1.6, -0.2, -1.2, -0.1, 3.4, 3.7, 0.8, 0.0, 2.0]
+SLEEP_2 = [1.9, 0.8, 1.1, 0.1, -0.1, 4.4, 5.5, 1.6, 4.6, 3.4]
+
+
+def moments(values):
+    """Return (count, mean, M2) of a list of values."""
+    mean = statistics.fmean(values)
+    return len(values), mean, sum((value - mean) ** 2 for value in values)
+
+
+def test_regularized_beta_identities():
+    for x in (0.0, 0.1, 0.5, 0.93, 1.0):
+        assert regularized_beta(1, 1, x) == pytest.approx(x)
+        assert regularized_beta(2.5, 0.5, x) == pytest.approx(1 - regularized_beta(0.5, 2.5, 1 - x))
+
+
+@pytest.mark.parametrize("t_value", [0.0, 0.3, 1.0, 2.5, 12.0])
+def test_student_t_matches_closed_forms(t_value):
+    # df = 1 is the Cauchy distribution, df = 2 has a closed form too
+    assert student_t_two_sided(t_value, 1) == pytest.approx(
+        1 - 2 / math.pi * math.atan(t_value))
+    assert student_t_two_sided(t_value, 2) == pytest.approx(
+        1 - t_value / math.sqrt(t_value * t_value + 2))
+    assert student_t_two_sided(t_value, 1e7) == pytest.approx(
+        2 * (1 - statistics.NormalDist().cdf(t_value)), abs=1e-6)
+
+
+def test_welch_test_matches_r():
+    # t.test(extra ~ group, data = sleep): t = -1.8608, df = 17.776, p-value = 0.07939
+    t_value, df, p_value = welch_test(moments(SLEEP_1), moments(SLEEP_2))
+    assert t_value == pytest.approx(-1.8608, abs=1e-4)
+    assert df == pytest.approx(17.776, abs=1e-3)
+    assert p_value == pytest.approx(0.07939, abs=1e-5)
+    assert welch_test((3, 2.0, 0.0), (3, 2.0, 0.0))[2] == 1.0
+    assert welch_test((3, 2.0, 0.0), (3, 1.0, 0.0))[2] == 0.0
+    with pytest.raises(ValueError):
+        welch_test((1, 2.0, 0.0), (3, 1.0, 1.0))
+
+
+def test_mann_whitney_matches_r():
+    # wilcox.test(extra ~ group, data = sleep, exact = FALSE): W = 25.5, p-value = 0.06933
+    u_value, _, p_value = mann_whitney_test(SLEEP_1, SLEEP_2)
+    assert u_value == 25.5
+    assert p_value == pytest.approx(0.06933, abs=1e-5)
+    assert u_value == sum((a > b) + 0.5 * (a == b) for a in SLEEP_1 for b in SLEEP_2)
+    assert mann_whitney_test([1.0, 1.0], [1.0])[2] == 1.0
+
+
+def test_benjamini_hochberg_matches_r():
+    # p.adjust(c(0.01, 0.04, 0.03, 0.005), "BH")
+    assert benjamini_hochberg([0.01, 0.04, 0.03, 0.005]) == pytest.approx(
+        [0.02, 0.04, 0.04, 0.02])
+    assert benjamini_hochberg([0.5, 0.9]) == pytest.approx([0.9, 0.9])
+    assert benjamini_hochberg([]) == []
+
+
+def test_genome_wide_tests_equal_per_gene_tests(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    expression_obj = analysis.expression_obj
+    genes = expression_obj.gene_names
+    welch = analysis.significance_tests(genes)
+    ranks = analysis.significance_tests(genes, 'mannwhitney')
+    for gene_name in genes:
+        hcc = expression_obj.dict_gene_hcc[gene_name]
+        normal = expression_obj.dict_gene_normal[gene_name]
+        t_value, _, p_value = welch_test(moments(hcc), moments(normal))
+        assert welch[gene_name]["statistic"] == pytest.approx(t_value)
+        assert welch[gene_name]["p_value"] == pytest.approx(p_value)
+        assert ranks[gene_name]["p_value"] == mann_whitney_test(hcc, normal)[2]
+    assert [welch[gene_name]["q_value"] for gene_name in genes] == pytest.approx(
+        benjamini_hochberg([welch[gene_name]["p_value"] for gene_name in genes]))
+
+
+def test_compare_significance_numbers_ranks_by_adjusted_p(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    genes = analysis.expression_obj.gene_names
+    table = analysis.significance_tests(genes)
+    top = analysis.compare_significance_numbers(genes, 3)
+    expected = sorted(genes, key=lambda gene_name: (table[gene_name]["q_value"],
+                                                    table[gene_name]["p_value"]))[:3]
+    assert list(top) == ["Gene name"] + expected
+    assert top[expected[0]] == table[expected[0]]["q_value"]
+    with pytest.raises(ValueError):
+        analysis.compare_significance_numbers(genes, 3, test='anova')
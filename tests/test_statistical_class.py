@@ -0,0 +1,202 @@
+"""Tests for the genome-wide statistics of StatisticalAnalysis."""
+
+import math
+import statistics
+from itertools import compress
+
+import pytest
+
+from conftest import write_expression_csv
+from expression_class import GeneExpressionData
+from statistical_class import StatisticalAnalysis
+
+
+def reference_compare_differential(analysis, list_gene_names, number):
+    """Rank genes the way the original per-gene implementation did."""
+    dict_compare_differential = {
+        gene_name: analysis.calculate_differential([gene_name])[gene_name]
+        for gene_name in list_gene_names
+    }
+    dict_differential_inv = {
+        gene_name: float(diff) if diff > 1 else round(1/diff, 3)
+        for gene_name, diff in dict_compare_differential.items()
+    }
+    top = sorted(dict_differential_inv.items(), key=lambda x: x[1], reverse=True)[:number]
+    return {"Gene name": "Differential value",
+            **{gene_name: dict_compare_differential[gene_name] for gene_name, _ in top}}
+
+
+@pytest.fixture
+def tied_csv(tmp_path):
+    """Genes whose differentials tie: G0 and G3 are 2.0, G1 is 0.5 (inverse 2.0)."""
+    sample_types = ['HCC', 'normal', 'HCC', 'normal', 'other']
+    rows = [
+        [4.0, 1.0, 3.0, 4.0, 1.0],
+        [2.0, 2.0, 3.0, 2.0, 1.0],
+        [4.0, 1.0, 3.0, 4.0, 1.0],
+        [2.0, 2.0, 3.0, 2.0, 1.0],
+        [9.0, 9.0, 9.0, 9.0, 9.0],
+    ]
+    return write_expression_csv(tmp_path / "tied.csv", sample_types, rows)
+
+
+def test_fold_changes_match_calculate_differential(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    genes = analysis.expression_obj.gene_names
+    fold_changes = analysis.calculate_fold_changes(genes)
+    for gene_name in genes:
+        assert fold_changes[gene_name] == analysis.calculate_differential(
+            [gene_name])[gene_name]
+
+
+@pytest.mark.parametrize("number", [1, 2, 3, 5, 10])
+def test_top_differentials_keep_the_order_of_a_full_sort(tied_csv, number):
+    analysis = StatisticalAnalysis(GeneExpressionData(tied_csv, use_cache=False))
+    genes = analysis.expression_obj.gene_names
+    result = analysis.compare_differential_numbers(genes, number)
+    assert result == reference_compare_differential(analysis, genes, number)
+    assert list(result) == list(reference_compare_differential(analysis, genes, number))
+
+
+def test_tied_differentials_keep_gene_order(tied_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(tied_csv, use_cache=False))
+    result = analysis.compare_differential_numbers(analysis.expression_obj.gene_names, 3)
+    assert list(result) == ["Gene name", "G0", "G1", "G3"]
+    assert result["G1"] == 0.5
+
+
+def test_zero_normal_mean_raises(tmp_path):
+    path = write_expression_csv(tmp_path / "zero.csv", ['HCC', 'normal'], [[1.0], [0.0]])
+    analysis = StatisticalAnalysis(GeneExpressionData(path, use_cache=False))
+    with pytest.raises(ZeroDivisionError):
+        analysis.compare_differential_numbers(["G0"], 1)
+
+
+def test_summarize_genes_matches_statistics_module(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    expression_obj = analysis.expression_obj
+    summary = analysis.summarize_genes()
+    assert list(summary) == expression_obj.gene_names
+    for gene_name, stats in summary.items():
+        hcc = expression_obj.dict_gene_hcc[gene_name]
+        normal = expression_obj.dict_gene_normal[gene_name]
+        assert stats["count"] == len(hcc + normal) == 8
+        assert stats["mean"] == pytest.approx(statistics.fmean(hcc + normal))
+        assert stats["median"] == statistics.median(hcc + normal)
+        assert stats["variance"] == pytest.approx(statistics.pvariance(hcc + normal))
+        assert stats["std"] == pytest.approx(statistics.pstdev(hcc + normal))
+        assert (stats["count_hcc"], stats["count_normal"]) == (5, 3)
+        assert stats["mean_hcc"] == pytest.approx(statistics.fmean(hcc))
+        assert stats["variance_normal"] == pytest.approx(statistics.pvariance(normal))
+
+
+def test_summarize_genes_subset_and_missing_group(tmp_path):
+    path = write_expression_csv(tmp_path / "hcc.csv", ['HCC', 'HCC', 'other'],
+                                [[1.0, 5.0], [3.0, 5.0], [100.0, 100.0]])
+    analysis = StatisticalAnalysis(GeneExpressionData(path, use_cache=False))
+    summary = analysis.summarize_genes(["G1"])
+    assert list(summary) == ["G1"]
+    assert summary["G1"]["variance"] == 0.0
+    assert math.isnan(summary["G1"]["mean_normal"])
+    with pytest.raises(ValueError):
+        analysis.summarize_genes(["missing"])
+
+
+def test_summarize_genes_is_stable_for_large_offsets(tmp_path):
+    # The sum-of-squares formula loses every digit of this variance
+    rows = [[1e9 + offset] for offset in (4.0, 7.0, 13.0, 16.0)]
+    path = write_expression_csv(tmp_path / "offset.csv", ['HCC', 'normal'] * 2, rows)
+    analysis = StatisticalAnalysis(GeneExpressionData(path, use_cache=False))
+    assert analysis.summarize_genes()["G0"]["variance"] == pytest.approx(22.5)
+
+
+def test_appended_samples_update_the_summary_from_the_new_rows(small_csv, tmp_path):
+    lines = open(small_csv, encoding='utf-8').read().splitlines(keepends=True)
+    base, extra = tmp_path / "base.csv", tmp_path / "extra.csv"
+    base.write_text("".join(lines[:5]))
+    extra.write_text("".join(lines[:1] + lines[5:]))
+    whole = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    analysis = StatisticalAnalysis(GeneExpressionData(str(base), use_cache=False))
+    analysis.build_summary()
+    analysis.group_sums = None  # Fold changes must come from the summary
+    assert analysis.append_samples(str(extra)) == 5
+    assert analysis.current_summary() is analysis.summary
+    gene_names = whole.expression_obj.gene_names
+    assert analysis.calculate_fold_changes(gene_names) == whole.calculate_fold_changes(gene_names)
+    assert (analysis.compare_differential_numbers(gene_names, 3)
+            == whole.compare_differential_numbers(gene_names, 3))
+    table = analysis.summary.gene_table()
+    for gene_name, stats in whole.summarize_genes().items():
+        assert table[gene_name]["variance"] == pytest.approx(stats["variance"])
+        assert table[gene_name]["mean_hcc"] == pytest.approx(stats["mean_hcc"])
+
+
+def test_summary_is_not_used_after_other_changes(small_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    analysis.build_summary()
+    expression_obj = analysis.expression_obj
+    expression_obj.set_matrix(expression_obj.matrix, expression_obj.gene_names,
+                              expression_obj.sample_ids, expression_obj.sample_types)
+    assert analysis.current_summary() is None
+
+
+def test_sample_min_max_from_profiles_matches_the_rows(small_csv):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    analysis = StatisticalAnalysis(expression_obj)
+    assert analysis.sample_min_max() == analysis.sample_min_max(
+        expression_obj.expression_sample(expression_obj.dict_sample))
+    built = GeneExpressionData.from_matrix(expression_obj.matrix, expression_obj.gene_names,
+                                           expression_obj.sample_ids,
+                                           expression_obj.sample_types)
+    assert StatisticalAnalysis(built).sample_min_max() == analysis.sample_min_max()
+
+
+@pytest.fixture
+def grouped_csv(tmp_path):
+    """Twelve samples of four sample types, interleaved, x 3 genes."""
+    sample_types = ['HCC', 'cirrhosis', 'normal', 'adjacent'] * 3
+    rows = [[1.0 + row, 2.0 * (row % 4) + 1.0, 5.0 - row % 3] for row in range(12)]
+    return write_expression_csv(tmp_path / "grouped.csv", sample_types, rows)
+
+
+def test_group_moments_match_statistics_module(grouped_csv):
+    expression_obj = GeneExpressionData(grouped_csv, use_cache=False)
+    analysis = StatisticalAnalysis(expression_obj)
+    moments = analysis.group_moments()
+    assert expression_obj.group_names == ['HCC', 'cirrhosis', 'normal', 'adjacent']
+    for group, (count, sums, means, m2) in zip(expression_obj.group_names, moments):
+        assert count == 3
+        for col, gene_name in enumerate(expression_obj.gene_names):
+            values = list(compress(expression_obj.gene_column(gene_name),
+                                   expression_obj.group_mask(group)))
+            assert sums[col] == pytest.approx(sum(values))
+            assert means[col] == pytest.approx(statistics.mean(values))
+            assert m2[col] / count == pytest.approx(statistics.pvariance(values), abs=1e-12)
+    assert analysis.group_moments(1, 3) == [
+        (count, sums[1:3], means[1:3], m2[1:3]) for count, sums, means, m2 in moments]
+
+
+def test_compare_groups_reports_every_pair(grouped_csv):
+    analysis = StatisticalAnalysis(GeneExpressionData(grouped_csv, use_cache=False))
+    report = analysis.compare_groups()
+    assert list(report["groups"]) == ['HCC', 'cirrhosis', 'normal', 'adjacent']
+    assert len(report["fold_changes"]) == 6
+    assert report["groups"]["cirrhosis"]["count"] == 3
+    assert report["groups"]["HCC"]["mean"]["G0"] == 5.0
+    assert report["groups"]["HCC"]["variance"]["G1"] == 0.0
+    assert report["fold_changes"]["HCC/normal"] == \
+        analysis.calculate_fold_changes(analysis.expression_obj.gene_names)
+    subset = analysis.compare_groups(["G2"], groups=['adjacent', 'HCC'])
+    assert list(subset["fold_changes"]) == ["adjacent/HCC"]
+    assert subset["fold_changes"]["adjacent/HCC"]["G2"] == round(
+        subset["groups"]["adjacent"]["mean"]["G2"] / subset["groups"]["HCC"]["mean"]["G2"], 3)
+    with pytest.raises(ValueError):
+        analysis.compare_groups(groups=['tumor'])
+    with pytest.raises(ValueError):
+        analysis.compare_groups(["nope"])
+
+
+def test_zero_group_mean_gives_no_fold_change(tmp_path):
+    path = write_expression_csv(tmp_path / "zero.csv", ['A', 'B'], [[1.0], [0.0]])
+    report = StatisticalAnalysis(GeneExpressionData(path, use_cache=False)).compare_groups()
+    assert report["fold_changes"] == {"A/B": {"G0": None}}
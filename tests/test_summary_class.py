@@ -0,0 +1,101 @@
+"""Tests for the quantile sketch and the out-of-core streaming summary."""
+
+import math
+import random
+
+import pytest
+
+from expression_class import GeneExpressionData
+from statistical_class import StatisticalAnalysis
+from summary_class import QuantileSketch, StreamingSummary, merge_moments
+
+
+@pytest.mark.parametrize("alpha", [0.05, 0.01, 0.001])
+def test_sketch_quantiles_stay_within_relative_error(alpha):
+    rng = random.Random(11)
+    values = [rng.lognormvariate(0, 2) for _ in range(2000)]
+    values += [-value for value in values[:300]] + [0.0] * 50
+    sketch = QuantileSketch(alpha)
+    for value in values:
+        sketch.add(value)
+    ordered = sorted(values)
+    for rank in range(0, len(ordered), 37):
+        assert abs(sketch.value_at_rank(rank) - ordered[rank]) <= alpha * abs(ordered[rank])
+
+
+def test_merged_sketches_equal_one_sketch():
+    rng = random.Random(3)
+    values = [rng.uniform(-5, 20) for _ in range(500)]
+    whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for position, value in enumerate(values):
+        whole.add(value)
+        (first if position % 3 else second).add(value)
+    first.merge(second)
+    assert [first.value_at_rank(rank) for rank in range(500)] == \
+        [whole.value_at_rank(rank) for rank in range(500)]
+    with pytest.raises(ValueError):
+        first.merge(QuantileSketch(0.05))
+
+
+def test_merge_moments_equals_moments_of_all_values():
+    values_a, values_b = [1.0, 2.0, 4.0], [10.0, 12.0]
+
+    def moments(values):
+        mean = sum(values) / len(values)
+        return len(values), mean, sum((value - mean) ** 2 for value in values)
+
+    merged = merge_moments(moments(values_a), moments(values_b))
+    assert merged == pytest.approx(moments(values_a + values_b))
+    assert merge_moments((0, 0.0, 0.0), moments(values_b)) == moments(values_b)
+
+
+def test_stream_summary_matches_in_memory_summary(small_csv):
+    exact = StatisticalAnalysis(GeneExpressionData(small_csv, use_cache=False))
+    streamed = StatisticalAnalysis(GeneExpressionData(small_csv, mode='stream'))
+    alpha = 0.01
+    table = streamed.stream_summary(thresholds=(8.0,), alpha=alpha).gene_table()
+    summary = exact.summarize_genes()
+    assert list(table) == list(summary)
+    for gene_name, stats in table.items():
+        expected = summary[gene_name]
+        for key in ("count", "count_hcc", "count_normal"):
+            assert stats[key] == expected[key]
+        for key in ("mean", "variance", "std", "mean_hcc", "variance_normal"):
+            assert stats[key] == pytest.approx(expected[key])
+        assert abs(stats["median"] - expected["median"]) <= alpha * 1.01 * expected["median"]
+        values = (exact.expression_obj.dict_gene_hcc[gene_name]
+                  + exact.expression_obj.dict_gene_normal[gene_name])
+        assert (stats["min"], stats["max"]) == (min(values), max(values))
+        assert stats["above_8"] == sum(value > 8.0 for value in values)
+
+
+def test_stream_mode_keeps_no_rows(small_csv):
+    expression_obj = GeneExpressionData(small_csv, mode='stream')
+    assert len(expression_obj.matrix) == 0
+    assert expression_obj.gene_names == [f"G{col}" for col in range(6)]
+    assert math.isnan(QuantileSketch().median())
+
+
+def test_merged_batch_summaries_equal_one_summary(small_csv, tmp_path):
+    expression_obj = GeneExpressionData(small_csv, use_cache=False)
+    batches = [StreamingSummary(expression_obj.gene_names, thresholds=(8.0,)) for _ in range(3)]
+    whole = StreamingSummary(expression_obj.gene_names, thresholds=(8.0,))
+    for row, gene_type in enumerate(expression_obj.sample_types):
+        batches[row % 3].add_row(gene_type, expression_obj.sample_row(row))
+        whole.add_row(gene_type, expression_obj.sample_row(row))
+    # A batch is persisted and loaded again before the merge
+    batches[1].save(tmp_path / "batch.json")
+    merged = batches[0].merge(StreamingSummary.load(tmp_path / "batch.json")).merge(batches[2])
+    expected, table = whole.gene_table(), merged.gene_table()
+    for gene_name, stats in table.items():
+        for key, value in stats.items():
+            assert value == pytest.approx(expected[gene_name][key], nan_ok=True)
+    assert merged.groups['HCC'].sums == pytest.approx(whole.groups['HCC'].sums)
+
+
+def test_summaries_with_other_settings_are_not_merged():
+    summary = StreamingSummary(["G0", "G1"], thresholds=(1.0,))
+    with pytest.raises(ValueError):
+        summary.merge(StreamingSummary(["G0", "G1"], thresholds=(2.0,)))
+    with pytest.raises(ValueError):
+        summary.merge(StreamingSummary(["G0"], thresholds=(1.0,)))